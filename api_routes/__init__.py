@@ -1,8 +1,12 @@
-from api_routes.blueprint import api_bp
+from api_routes.blueprint import api_bp, lazy_route
 
 # Importa módulos para que se registren las rutas (decorators)
 from api_routes.gastos import *       # noqa: F401,F403
 from api_routes.resumen import *      # noqa: F401,F403
 from api_routes.sugerencias import *  # noqa: F401,F403
 from api_routes.categorias import *   # noqa: F401,F403
-from api_routes.import_csv import *   # noqa: F401,F403
\ No newline at end of file
+
+# Rutas poco usadas: el módulo se importa en la primera petición
+lazy_route("/import/csv", "api_routes.import_csv.api_import_csv", methods=["POST"])
+lazy_route("/import/csv/confirm", "api_routes.import_csv.api_import_csv_confirm", methods=["POST"])
+lazy_route("/import/jobs/<job_id>", "api_routes.import_csv.api_import_job", methods=["GET"])
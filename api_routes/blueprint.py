@@ -1,3 +1,38 @@
-from flask import Blueprint
+from flask import Blueprint, current_app, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import cached_property, import_string
 
 api_bp = Blueprint("api", __name__, url_prefix="/api")
+
+
+@api_bp.errorhandler(RequestEntityTooLarge)
+def _too_large(e):
+    # MAX_CONTENT_LENGTH (MAX_UPLOAD_MB): JSON como el resto de errores de la API
+    limit_mb = (current_app.config.get("MAX_CONTENT_LENGTH") or 0) / (1024 * 1024)
+    return jsonify({"ok": False, "error": f"File too large (max {limit_mb:g} MB)"}), 413
+
+
+class LazyView:
+    """
+    View that imports its module on first call (Flask "lazy loading views").
+    Used for rarely hit endpoints so their modules stay out of cold start.
+    """
+
+    def __init__(self, import_name: str):
+        self.__module__, self.__name__ = import_name.rsplit(".", 1)
+        self.import_name = import_name
+
+    @cached_property
+    def view(self):
+        return import_string(self.import_name)
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+
+def lazy_route(rule: str, import_name: str, **options):
+    """
+    Register `import_name` (module.function) on api_bp without importing it.
+    """
+    view = LazyView(import_name)
+    api_bp.add_url_rule(rule, endpoint=view.__name__, view_func=view, **options)
@@ -126,8 +126,8 @@ BASE_CATEGORIES = {
 }
 
 
-def _has_column(table: str, col: str) -> bool:
-    rows = db_all(f"PRAGMA table_info({table})", ())
+def _has_column(table: str, col: str, user_id=None) -> bool:
+    rows = db_all(f"PRAGMA table_info({table})", (), user_id=user_id)
     for r in rows:
         name = r[1] if isinstance(r, (tuple, list)) else r["name"]
         if name == col:
@@ -154,28 +154,28 @@ def api_get_categorias():
     user_id = int(session.get("user_id"))
     q = (request.args.get("q") or "").strip().lower()
 
-    has_sub = _has_column("gastos", "subcategoria")
-    has_con = _has_column("gastos", "concepto")
-
-    if has_sub:
-        sub_expr = "COALESCE(subcategoria,'')"
-    elif has_con:
-        sub_expr = "COALESCE(concepto,'')"
-    else:
-        sub_expr = "''"
+    has_sub = _has_column("gastos", "subcategoria", user_id)
 
     # 1) Conteo SOLO para parejas que existan en BASE_CATEGORIES
     #    (primero traemos lo usado por el usuario y luego filtramos por base)
-    sql_used = (
-        "SELECT COALESCE(categoria,'') AS categoria, "
-        f"{sub_expr} AS subcategoria, "
-        "COUNT(*) AS n "
-        "FROM gastos "
-        "WHERE user_id = ? "
-        "GROUP BY COALESCE(categoria,''), "
-        f"{sub_expr}"
-    )
-    rows = db_all(sql_used, (user_id,))
+    if has_sub:
+        sql_used = (
+            "SELECT COALESCE(categoria,'') AS categoria, "
+            "COALESCE(subcategoria,'') AS subcategoria, "
+            "COUNT(*) AS n "
+            "FROM gastos "
+            "WHERE user_id = ? "
+            "GROUP BY COALESCE(categoria,''), COALESCE(subcategoria,'')"
+        )
+    else:
+        # concepto hace de subcategoria: los conteos ya están en gastos_rollup
+        sql_used = (
+            "SELECT categoria, concepto AS subcategoria, SUM(n) AS n "
+            "FROM gastos_rollup "
+            "WHERE user_id = ? "
+            "GROUP BY categoria, concepto"
+        )
+    rows = db_all(sql_used, (user_id,), user_id=user_id)
 
     used_counts = {}
     for r in rows:
@@ -1,14 +1,27 @@
 from flask import request, jsonify, session
 from auth import login_required
-from db import db_exec, db_all
+from db import db_exec, db_one, db_all, query_budget
 from api_routes.blueprint import api_bp
-from api_routes.utils import rows_to_dicts
+from api_routes.utils import rows_to_dicts, busy_response, month_filter, escape_like, fts_match
+from money import from_cents, to_cents
+import categorizer
+import nota_index
 
 from datetime import datetime, timezone
 
 
+def _has_fts(user_id: int) -> bool:
+    # gastos_fts no existe si la build de SQLite no trae FTS5 (ver schema._m004)
+    row = db_one(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'gastos_fts'",
+        user_id=user_id,
+    )
+    return row is not None
+
+
 @api_bp.get("/gastos")
 @login_required
+@query_budget("gastos", on_timeout=busy_response)
 def api_get_gastos():
     user_id = int(session.get("user_id"))
 
@@ -16,30 +29,43 @@ def api_get_gastos():
     categoria = (request.args.get("categoria") or "").strip()
     q = (request.args.get("q") or "").strip()
 
-    where = ["user_id = ?"]
+    where = ["g.user_id = ?"]
     params = [user_id]
+    source = "gastos g"
+    order = "g.fecha DESC, g.id DESC"
 
     if mes:
-        where.append("substr(fecha, 1, 7) = ?")
-        params.append(mes)
+        cond, mes_params = month_filter(mes, column="g.fecha")
+        where.append(cond)
+        params.extend(mes_params)
 
     if categoria:
-        where.append("categoria = ?")
+        where.append("g.categoria = ?")
         params.append(categoria)
 
-    if q:
-        where.append("COALESCE(nota,'') LIKE ?")
-        params.append(f"%{q}%")
+    match = fts_match(q) if q else None
+    if match and _has_fts(user_id):
+        # Índice FTS5 sobre nota/concepto: prefijos, sin acentos, por relevancia
+        source = "gastos_fts JOIN gastos g ON g.id = gastos_fts.rowid"
+        where.insert(0, "gastos_fts MATCH ?")
+        params.insert(0, match)
+        order = f"bm25(gastos_fts), {order}"
+    elif q:
+        where.append("(COALESCE(g.nota,'') LIKE ? ESCAPE '\\' OR COALESCE(g.concepto,'') LIKE ? ESCAPE '\\')")
+        params.extend([f"%{escape_like(q)}%"] * 2)
 
     sql = (
-        "SELECT id, fecha, categoria, COALESCE(concepto,'') AS concepto, nota, importe "
-        "FROM gastos "
+        "SELECT g.id, g.fecha, g.categoria, COALESCE(g.concepto,'') AS concepto, g.nota, g.importe_cents "
+        f"FROM {source} "
         f"WHERE {' AND '.join(where)} "
-        "ORDER BY fecha DESC, id DESC"
+        f"ORDER BY {order}"
     )
 
-    rows = db_all(sql, tuple(params))
-    return jsonify(rows_to_dicts(rows))
+    rows = db_all(sql, tuple(params), user_id=user_id)
+    out = rows_to_dicts(rows)
+    for g in out:
+        g["importe"] = from_cents(g.pop("importe_cents"))
+    return jsonify(out)
 
 
 @api_bp.post("/gastos")
@@ -58,17 +84,20 @@ def api_post_gasto():
         return jsonify({"ok": False, "error": "Faltan campos: fecha, categoria, importe"}), 400
 
     try:
-        importe = float(importe)
-    except Exception:
+        importe_cents = to_cents(importe)
+    except ValueError:
         return jsonify({"ok": False, "error": "importe debe ser numérico"}), 400
 
     created_at = datetime.now(timezone.utc).isoformat()
 
-    db_exec(
-        "INSERT INTO gastos (user_id, fecha, categoria, concepto, nota, importe, created_at) "
-        "VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (user_id, fecha, categoria, concepto, nota, importe, created_at)
+    cur = db_exec(
+        "INSERT INTO gastos (user_id, fecha, categoria, concepto, nota, importe, importe_cents, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (user_id, fecha, categoria, concepto, nota, from_cents(importe_cents), importe_cents, created_at),
+        user_id=user_id,
     )
+    nota_index.on_insert(user_id, cur.lastrowid, nota, categoria, concepto)
+    categorizer.on_insert(user_id, cur.lastrowid, nota, categoria, concepto)
     return jsonify({"ok": True})
 
 
@@ -77,8 +106,21 @@ def api_post_gasto():
 def api_delete_gasto(gasto_id: int):
     user_id = int(session.get("user_id"))
 
-    db_exec(
+    # Solo si el índice de notas o el modelo del usuario están en memoria hace falta la fila
+    row = None
+    if nota_index.is_cached(user_id) or categorizer.is_cached(user_id):
+        row = db_one(
+            "SELECT id, nota, categoria, COALESCE(concepto, '') AS concepto FROM gastos WHERE id = ? AND user_id = ?",
+            (gasto_id, user_id),
+            user_id=user_id,
+        )
+
+    cur = db_exec(
         "DELETE FROM gastos WHERE id = ? AND user_id = ?",
-        (gasto_id, user_id)
+        (gasto_id, user_id),
+        user_id=user_id,
     )
+    if cur.rowcount:
+        nota_index.on_delete(user_id, row)
+        categorizer.on_delete(user_id, row)
     return jsonify({"ok": True})
@@ -1,111 +1,397 @@
 import csv
 import io
+import os
+import sqlite3
 from datetime import datetime, timezone
+from itertools import chain, islice
 from flask import request, jsonify, session
 from auth import login_required
-from db import db_exec, db_all, get_db
-from api_routes.blueprint import api_bp
-from api_routes.utils import escape_like
+import categorizer
+import csv_format
+from csv_format import parse_date
+import db
+from db import db_exec, db_all
+import import_jobs
+import import_previews
+import nota_index
+import schema
+import trigram_index
+from money import from_cents, to_cents
+
+
+# Filas por transacción al importar en streaming (memoria ~ proporcional a esto)
+IMPORT_CHUNK_ROWS = int(os.environ.get("IMPORT_CHUNK_ROWS", "1000"))
+
+
+def _chunks(iterable, size: int):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
 
 
 def suggest_category_for_concept(user_id: int, concept: str):
     """
     Suggest category and subcategory based on concept text.
-    Uses the same logic as /api/sugerir but simplified for import.
+    Same lookup as /api/sugerir: the notas table for a note seen before,
+    else the user's Naive Bayes model (categorizer) when confident, else
+    the trigram index (trigram_index).
     Returns (categoria, concepto) or (None, None) if no match.
     """
     if not concept or len(concept.strip()) < 3:
         return None, None
-    
-    concept = concept.strip()
-    esc = escape_like(concept)
-    like = f"%{esc}%"
-    
-    rows = db_all(
-        """
-        SELECT
-          categoria,
-          COALESCE(concepto,'') AS concepto,
-          COUNT(*) AS n,
-          MAX(id) AS last_id
-        FROM gastos
-        WHERE user_id = ?
-          AND COALESCE(nota,'') LIKE ? ESCAPE '\\'
-        GROUP BY categoria, COALESCE(concepto,'')
-        ORDER BY n DESC, last_id DESC
-        LIMIT 1
-        """,
-        (user_id, like)
-    )
-    
-    if rows:
-        return rows[0]["categoria"], rows[0]["concepto"]
-    
+
+    exact = nota_index.exact_match(user_id, concept.strip())
+    if exact is not None:
+        return exact["categoria"], exact["concepto"]
+
+    predicted = categorizer.predict_many(user_id, [concept.strip()])
+    if predicted:
+        best = predicted[concept.strip()]
+        return best["categoria"], best["concepto"]
+
+    matches, _truncated = trigram_index.suggest(user_id, concept.strip(), limit=1)
+    if matches:
+        return matches[0]["categoria"], matches[0]["concepto"]
+
     return None, None
 
 
-def check_duplicate(user_id: int, fecha: str, concepto: str, importe: float) -> bool:
+def check_duplicate(user_id: int, fecha: str, concepto: str, importe_cents: int) -> bool:
     """
     Check if a transaction already exists (same user, date, concept, and amount).
     Returns True if duplicate exists.
     Note: 'concepto' parameter is the description text stored in the 'nota' column.
+    Looked up by gastos.fingerprint (schema.fingerprint_sql: amount in cents,
+    note compared like notas.clave) on its unique index.
     """
     rows = db_all(
-        """
+        f"""
         SELECT id FROM gastos
         WHERE user_id = ?
-          AND fecha = ?
-          AND nota = ?
-          AND importe = ?
+          AND fingerprint = {schema.fingerprint_sql("?", "?", "?")}
         LIMIT 1
         """,
-        (user_id, fecha, concepto, importe)
+        (user_id, fecha, importe_cents, concepto),
+        user_id=user_id,
     )
     return len(rows) > 0
 
 
+_STAGING_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS import_staging (
+      seq INTEGER PRIMARY KEY,
+      fecha TEXT NOT NULL,
+      nota TEXT NOT NULL,
+      importe_cents INTEGER NOT NULL,
+      dup INTEGER NOT NULL DEFAULT 0,
+      categoria TEXT,
+      concepto TEXT,
+      fingerprint TEXT
+    )
+"""
+
+_FINGERPRINT_STAGING_SQL = (
+    "UPDATE temp.import_staging SET fingerprint = "
+    + schema.fingerprint_sql("fecha", "nota", "importe_cents")
+)
+
+# Para la vista previa (la importación no los marca: INSERT OR IGNORE).
+# Duplicado: su huella ya está en gastos, o repite una fila anterior del
+# mismo fichero (que se habría insertado antes de llegar a esta)
+_MARK_DUPLICATES_SQL = """
+    UPDATE import_staging SET dup = 1
+    WHERE EXISTS (
+            SELECT 1 FROM gastos g
+            WHERE g.user_id = ? AND g.fingerprint = import_staging.fingerprint
+          )
+       OR EXISTS (
+            SELECT 1 FROM import_staging p
+            WHERE p.fingerprint = import_staging.fingerprint AND p.seq < import_staging.seq
+          )
+"""
+
+# Notas ya usadas: categoria/concepto desde la tabla notas (como nota_index.exact_match).
+# INDEXED BY: sin ANALYZE el planificador prefiere la PK (user_id) y recorre
+# todas las notas del usuario por cada fila
+_CATEGORIZE_EXACT_SQL = """
+    UPDATE import_staging SET (categoria, concepto) = (
+      SELECT n.categoria, n.concepto FROM notas n INDEXED BY idx_notas_user_clave
+      WHERE n.user_id = ? AND n.clave = lower(trim(import_staging.nota))
+      ORDER BY n.n DESC, n.last_id DESC
+      LIMIT 1
+    )
+    WHERE dup = 0 AND categoria IS NULL AND length(trim(nota)) >= 3
+"""
+
+# Un duplicado choca con idx_gastos_user_fingerprint y se ignora
+_INSERT_SQL = (
+    "INSERT OR IGNORE INTO gastos "
+    "(user_id, fecha, categoria, concepto, nota, importe, importe_cents, source, created_at, fingerprint) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, 'csv_import', ?, ?)"
+)
+
+
+def _stage(conn, user_id: int, transactions, mark_duplicates: bool = False) -> None:
+    """
+    Load `transactions` into temp.import_staging with their fingerprints,
+    optionally mark duplicates (dup = 1) and categorize the rest (one
+    UPDATE against notas + the categorizer / trigram index once per
+    distinct unseen note). Rows that already carry a categoria (confirmed
+    previews) keep it. Runs inside the caller's transaction.
+    """
+    conn.execute(_STAGING_DDL)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS temp.idx_import_staging_fingerprint "
+        "ON import_staging(fingerprint, seq)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS temp.idx_import_staging_nota ON import_staging(nota)")
+    conn.execute("DELETE FROM temp.import_staging")
+    conn.executemany(
+        "INSERT INTO temp.import_staging (fecha, nota, importe_cents, categoria, concepto) VALUES (?, ?, ?, ?, ?)",
+        ((tx["fecha"], tx["concepto"], tx["importe_cents"], tx.get("categoria"), tx.get("subconcepto"))
+         for tx in transactions),
+    )
+    conn.execute(_FINGERPRINT_STAGING_SQL)
+    if mark_duplicates:
+        conn.execute(_MARK_DUPLICATES_SQL, (user_id,))
+    conn.execute(_CATEGORIZE_EXACT_SQL, (user_id,))
+
+    # Notas nuevas: una predicción en memoria por nota distinta, no por fila
+    # (Naive Bayes si está seguro; si no, trigramas)
+    pending = [nota for (nota,) in conn.execute(
+        "SELECT DISTINCT nota FROM temp.import_staging "
+        "WHERE dup = 0 AND categoria IS NULL AND length(trim(nota)) >= 3"
+    )]
+    predicted = categorizer.predict_many(user_id, pending)
+    updates = [(best["categoria"], best["concepto"], nota) for nota, best in predicted.items()]
+    found = trigram_index.suggest_many(user_id, [n for n in pending if n not in predicted], limit=1)
+    updates += [
+        (matches[0]["categoria"], matches[0]["concepto"], nota)
+        for nota, matches in found.items() if matches
+    ]
+    conn.executemany(
+        "UPDATE temp.import_staging SET categoria = ?, concepto = ? "
+        "WHERE nota = ? AND dup = 0 AND categoria IS NULL",
+        updates,
+    )
+
+
+def preview_transactions(user_id: int, transactions: list) -> list:
+    """
+    Dry run of import_transactions(): same staging, duplicate detection
+    and categorization, rolled back instead of inserted. Returns one
+    (fecha, nota, importe_cents, dup, categoria, concepto) per transaction,
+    in order; duplicates within the file are marked too.
+    """
+    conn = db.get_db(user_id)
+    if conn.in_transaction:
+        raise RuntimeError("preview_transactions() called with a transaction already open")
+
+    # Solo escribe en la tabla temporal: BEGIN diferido, sin bloquear a los escritores
+    conn.execute("BEGIN")
+    try:
+        _stage(conn, user_id, transactions, mark_duplicates=True)
+        return conn.execute(
+            "SELECT fecha, nota, importe_cents, dup, COALESCE(categoria, ''), COALESCE(concepto, '') "
+            "FROM temp.import_staging ORDER BY seq"
+        ).fetchall()
+    finally:
+        conn.rollback()
+
+
+def import_transactions(user_id: int, transactions: list, created_at: str):
+    """
+    Insert parsed transactions in ONE transaction, set-based:
+    stage them in a temp table, categorize with one UPDATE against notas
+    (+ the categorizer / trigram index once per distinct unseen note) and
+    insert with executemany + INSERT OR IGNORE: duplicates (same
+    fingerprint as a gasto or an earlier row of the file) are the rows
+    ignored by the unique index.
+    Returns (imported, skipped, duplicates), same counters as the old
+    row-by-row loop.
+    """
+    conn = db.get_db(user_id)
+    if conn.in_transaction:
+        raise RuntimeError("import_transactions() called with a transaction already open")
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _stage(conn, user_id, transactions)
+        rows = [
+            (user_id, fecha, categoria, concepto, nota, from_cents(cents), cents, created_at, fingerprint)
+            for fecha, nota, cents, categoria, concepto, fingerprint in conn.execute(
+                "SELECT fecha, nota, importe_cents, COALESCE(categoria, ''), COALESCE(concepto, ''), fingerprint "
+                "FROM temp.import_staging ORDER BY seq"
+            )
+        ]
+        skipped = 0
+        conn.execute("SAVEPOINT import_rows")
+        try:
+            imported = conn.executemany(_INSERT_SQL, rows).rowcount
+        except sqlite3.DatabaseError:
+            # Alguna fila no entra: fila a fila para contarla como skipped,
+            # igual que antes (cada INSERT fallido se deshace solo)
+            conn.execute("ROLLBACK TO import_rows")
+            imported = 0
+            for row in rows:
+                try:
+                    imported += conn.execute(_INSERT_SQL, row).rowcount
+                except sqlite3.DatabaseError:
+                    skipped += 1
+        conn.execute("RELEASE import_rows")
+        conn.execute("DELETE FROM temp.import_staging")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    # Los inserts no pasan por on_insert: se relee de notas en la próxima consulta
+    nota_index.invalidate(user_id)
+    categorizer.expire(user_id)
+    return imported, skipped, len(rows) - imported - skipped
+
+
+def run_import(user_id: int, lines, progress=None) -> dict:
+    """
+    Stream-import `lines` (text stream over a CSV): sniff its format, parse
+    lazily and commit every IMPORT_CHUNK_ROWS rows. Returns {seen,
+    imported, skipped, duplicates, format}; progress(counters) is called
+    after each chunk.
+    """
+    fmt, lines = sniff_csv(lines)
+    return _import_chunks(user_id, iter_csv_transactions(lines, fmt), fmt, progress)
+
+
+def _import_chunks(user_id: int, transactions, fmt: dict, progress=None) -> dict:
+    counters = {"seen": 0, "imported": 0, "skipped": 0, "duplicates": 0, "format": fmt}
+    created_at = datetime.now(timezone.utc).isoformat()
+    # Un commit por bloque de IMPORT_CHUNK_ROWS filas
+    for chunk in _chunks(transactions, IMPORT_CHUNK_ROWS):
+        i, s, d = import_transactions(user_id, chunk, created_at)
+        counters["seen"] += len(chunk)
+        counters["imported"] += i
+        counters["skipped"] += s
+        counters["duplicates"] += d
+        if progress is not None:
+            progress(dict(counters))
+    return counters
+
+
+def preview_import(user_id: int, lines):
+    """
+    Dry run over `lines` (text stream over a CSV): parse, mark duplicates
+    and categorize without writing, and store the result for
+    confirm_import(). Returns the JSON body of the preview, or None if the
+    file has more than IMPORT_PREVIEW_MAX_ROWS transactions.
+    """
+    fmt, lines = sniff_csv(lines)
+    transactions = list(islice(iter_csv_transactions(lines, fmt), import_previews.PREVIEW_MAX_ROWS + 1))
+    if len(transactions) > import_previews.PREVIEW_MAX_ROWS:
+        return None
+
+    rows = preview_transactions(user_id, transactions)
+    # Los duplicados se guardan sin categoría: si al confirmar ya no lo son, se categorizan entonces
+    token = import_previews.save(user_id, fmt, [
+        [fecha, nota, cents, None if dup else categoria, None if dup else concepto]
+        for fecha, nota, cents, dup, categoria, concepto in rows
+    ])
+    return {
+        "ok": True,
+        "token": token,
+        "expires_in": int(import_previews.PREVIEW_TTL_S),
+        "format": fmt,
+        "total": len(rows),
+        "duplicates": sum(1 for r in rows if r[3]),
+        # Compacto: una lista por fila en vez de un objeto
+        "columns": ["fecha", "nota", "importe", "duplicate", "categoria", "concepto"],
+        "rows": [
+            [fecha, nota, from_cents(cents), bool(dup), categoria, concepto]
+            for fecha, nota, cents, dup, categoria, concepto in rows
+        ],
+    }
+
+
+def confirm_import(user_id: int, preview: dict, edits=()) -> dict:
+    """
+    Import a stored preview (import_previews.claim) with the categories
+    shown, after applying `edits` ({i, categoria, concepto} by row index).
+    Duplicates are checked again. Same counters as run_import().
+    Raises ValueError for an edit outside the preview.
+    """
+    rows = preview["rows"]
+    for edit in edits:
+        i = edit.get("i")
+        if isinstance(i, bool) or not isinstance(i, int) or not 0 <= i < len(rows):
+            raise ValueError(f"invalid row index: {i!r}")
+        rows[i][3] = str(edit.get("categoria") or "").strip()
+        rows[i][4] = str(edit.get("concepto") or "").strip()
+
+    transactions = (
+        {"fecha": fecha, "concepto": nota, "importe_cents": cents, "categoria": categoria, "subconcepto": concepto}
+        for fecha, nota, cents, categoria, concepto in rows
+    )
+    return _import_chunks(user_id, transactions, preview["format"])
+
+
+def mark_imported(user_id: int) -> None:
+    """
+    users.has_imported_csv = 1 (onboarding); never fails the import.
+    """
+    try:
+        db_exec(
+            "UPDATE users SET has_imported_csv = 1 WHERE id = ?",
+            (user_id,)
+        )
+    except Exception:
+        pass  # Don't fail import if flag update fails
+
+
 def parse_csv_file(file_content: str):
     """
     Parse CSV content and extract transactions.
     Expected columns: date, description/concept, amount
-    Supports flexible column names (case-insensitive).
+    Supports flexible column names (case-insensitive), delimiters, date
+    formats and decimal conventions (sniffed per file, see csv_format).
     
-    Returns list of dicts: [{fecha, concepto, importe}, ...]
+    Returns list of dicts: [{fecha, concepto, importe, importe_cents}, ...]
     """
-    transactions = []
-    reader = csv.DictReader(io.StringIO(file_content))
-    
-    if not reader.fieldnames:
-        return transactions
-    
-    # Normalize column names (case-insensitive mapping)
-    fieldnames_lower = {name.lower(): name for name in reader.fieldnames}
-    
-    # Try to find date column
-    date_col = None
-    for candidate in ['date', 'fecha', 'fecha_transaccion', 'transaction_date', 'datum']:
-        if candidate in fieldnames_lower:
-            date_col = fieldnames_lower[candidate]
-            break
-    
-    # Try to find description/concept column
-    desc_col = None
-    for candidate in ['description', 'descripcion', 'concepto', 'concept', 'memo', 'nota']:
-        if candidate in fieldnames_lower:
-            desc_col = fieldnames_lower[candidate]
-            break
+    return list(iter_csv_transactions(io.StringIO(file_content)))
+
+
+def sniff_csv(lines):
+    """
+    (format, lines) for a CSV text stream: the format sniffed from its
+    first CSV_SNIFF_LINES lines (csv_format.sniff) and an iterator over
+    all the lines, sample included.
+    """
+    it = iter(lines)
+    sample = list(islice(it, csv_format.CSV_SNIFF_LINES))
+    return csv_format.sniff(sample), chain(sample, it)
+
+
+def iter_csv_transactions(lines, fmt=None):
+    """
+    Same as parse_csv_file() but lazy: `lines` is any iterable of CSV lines
+    (a text stream over the upload) and transactions are yielded one by
+    one, so memory doesn't grow with the file. `fmt` is the sniffed format
+    (sniff_csv); sniffed here if not given.
+    """
+    if fmt is None:
+        fmt, lines = sniff_csv(lines)
     
-    # Try to find amount column
-    amount_col = None
-    for candidate in ['amount', 'importe', 'monto', 'cantidad', 'value', 'valor']:
-        if candidate in fieldnames_lower:
-            amount_col = fieldnames_lower[candidate]
-            break
+    columns = fmt["columns"]
+    if not all(columns.values()):
+        return  # Missing required columns
+    date_col, desc_col, amount_col = columns["date"], columns["description"], columns["amount"]
     
-    if not date_col or not desc_col or not amount_col:
-        return transactions  # Missing required columns
+    # Un parser fijo por fichero; si una fila no encaja se prueban todos los formatos
+    parse_fecha = csv_format.date_parser(fmt["date_format"]) if fmt["date_format"] else parse_date
+    parse_importe = csv_format.amount_parser(fmt["decimal"], fmt["thousands"])
     
-    for row in reader:
+    for row in csv.DictReader(lines, delimiter=fmt["delimiter"]):
         try:
             fecha_raw = (row.get(date_col) or "").strip()
             concepto_raw = (row.get(desc_col) or "").strip()
@@ -114,70 +400,55 @@ def parse_csv_file(file_content: str):
             if not fecha_raw or not concepto_raw or not importe_raw:
                 continue  # Skip empty rows
             
-            # Parse date (support multiple formats)
-            fecha = parse_date(fecha_raw)
+            fecha = parse_fecha(fecha_raw) or parse_date(fecha_raw)
             if not fecha:
                 continue  # Skip invalid dates
             
             # Parse amount (handle negative for expenses, positive for income)
-            importe = float(importe_raw.replace(',', '.').replace(' ', ''))
+            importe_cents = to_cents(parse_importe(importe_raw))
             
-            transactions.append({
+            yield {
                 'fecha': fecha,
                 'concepto': concepto_raw,
-                'importe': importe
-            })
+                'importe': from_cents(importe_cents),
+                'importe_cents': importe_cents,
+            }
         except (ValueError, TypeError):
             continue  # Skip invalid rows
-    
-    return transactions
 
 
-def parse_date(date_str: str) -> str:
-    """
-    Parse date string and return YYYY-MM-DD format.
-    Supports multiple date formats: YYYY-MM-DD, DD/MM/YYYY, DD-MM-YYYY, etc.
-    """
-    date_str = date_str.strip()
-    
-    # Try common formats
-    formats = [
-        '%Y-%m-%d',      # 2026-01-30
-        '%d/%m/%Y',      # 30/01/2026
-        '%d-%m-%Y',      # 30-01-2026
-        '%m/%d/%Y',      # 01/30/2026 (US format)
-        '%Y/%m/%d',      # 2026/01/30
-        '%d.%m.%Y',      # 30.01.2026
-        '%Y%m%d',        # 20260130
-    ]
-    
-    for fmt in formats:
-        try:
-            dt = datetime.strptime(date_str, fmt)
-            return dt.strftime('%Y-%m-%d')
-        except ValueError:
-            continue
-    
-    return None
+def _flag(name: str) -> bool:
+    return (request.args.get(name) or "").strip() in ("1", "true", "yes")
 
 
-@api_bp.post("/import/csv")
 @login_required
 def api_import_csv():
     """
+    POST /api/import/csv (registrada de forma perezosa en api_routes/__init__.py)
+
     Import bank transactions from CSV file.
     
     Expected CSV format:
     - Columns: date, description, amount (flexible names)
     - One transaction per row
     - Negative amounts = expenses, positive = income
+    - Delimiter (, ; TAB |), date format and decimal separator ("1.234,56")
+      are sniffed from the first rows and reported back as `format`
+    
+    The upload is decoded and parsed as a stream and committed every
+    IMPORT_CHUNK_ROWS rows; requests over MAX_UPLOAD_MB get a 413.
+    With ?async=1 the file is queued as a background job instead
+    (202 {job_id, status_url}); poll GET /api/import/jobs/<job_id>.
+    With ?dry_run=1 nothing is written: the response is a preview
+    (preview_import) whose token POST /api/import/csv/confirm imports.
     
     Returns:
     {
       ok: true,
       imported: number,
       skipped: number,
-      duplicates: number
+      duplicates: number,
+      format: {delimiter, date_format, decimal, thousands, columns}
     }
     """
     user_id = int(session.get("user_id"))
@@ -194,78 +465,118 @@ def api_import_csv():
     if not file.filename.endswith('.csv'):
         return jsonify({"ok": False, "error": "File must be CSV"}), 400
     
+    # Importación en segundo plano: 202 + id del trabajo (ver import_jobs.py)
+    if _flag("async"):
+        job_id = import_jobs.create_job(user_id, file)
+        return jsonify({
+            "ok": True,
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/api/import/jobs/{job_id}",
+        }), 202
+    
     try:
-        # Read and decode file content
-        file_content = file.read().decode('utf-8-sig')  # utf-8-sig handles BOM
+        # Decodifica y parsea en streaming desde el upload (en disco si es grande)
+        text = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')  # utf-8-sig handles BOM
+        try:
+            if _flag("dry_run"):
+                preview = preview_import(user_id, text)
+            else:
+                counters = run_import(user_id, text)
+        finally:
+            text.detach()
         
-        # Parse CSV
-        transactions = parse_csv_file(file_content)
+        if _flag("dry_run"):
+            if preview is None:
+                return jsonify({
+                    "ok": False,
+                    "too_large": True,
+                    "error": f"More than {import_previews.PREVIEW_MAX_ROWS} transactions: import the file without preview"
+                }), 413
+            return jsonify(preview)
         
-        if not transactions:
+        if not counters["seen"]:
             return jsonify({
                 "ok": True,
                 "imported": 0,
                 "skipped": 0,
                 "duplicates": 0,
+                "format": counters["format"],
                 "message": "No valid transactions found in CSV"
             })
         
-        # Process transactions
-        imported = 0
-        skipped = 0
-        duplicates = 0
-        
-        conn = get_db()
-        created_at = datetime.now(timezone.utc).isoformat()
-        
-        for tx in transactions:
-            fecha = tx['fecha']
-            concepto = tx['concepto']
-            importe = tx['importe']
-            
-            # Check for duplicates
-            if check_duplicate(user_id, fecha, concepto, importe):
-                duplicates += 1
-                continue
-            
-            # Get category suggestion
-            categoria, subconcepto = suggest_category_for_concept(user_id, concepto)
-            
-            # Use suggested category or default to empty
-            if not categoria:
-                categoria = ''
-                subconcepto = ''
-            
-            try:
-                # Insert transaction with source='csv_import' to track CSV imports
-                db_exec(
-                    "INSERT INTO gastos (user_id, fecha, categoria, concepto, nota, importe, source, created_at) "
-                    "VALUES (?, ?, ?, ?, ?, ?, 'csv_import', ?)",
-                    (user_id, fecha, categoria, subconcepto, concepto, importe, created_at)
-                )
-                imported += 1
-            except Exception:
-                skipped += 1
-                continue
-        
         # Mark user as having imported CSV (for onboarding)
-        if imported > 0:
-            try:
-                db_exec(
-                    "UPDATE users SET has_imported_csv = 1 WHERE id = ?",
-                    (user_id,)
-                )
-            except Exception:
-                pass  # Don't fail import if flag update fails
+        if counters["imported"] > 0:
+            mark_imported(user_id)
         
         return jsonify({
             "ok": True,
-            "imported": imported,
-            "skipped": skipped,
-            "duplicates": duplicates
+            "imported": counters["imported"],
+            "skipped": counters["skipped"],
+            "duplicates": counters["duplicates"],
+            "format": counters["format"]
         })
     
     except UnicodeDecodeError:
         return jsonify({"ok": False, "error": "File encoding not supported. Use UTF-8."}), 400
     except Exception as e:
         return jsonify({"ok": False, "error": f"Import failed: {str(e)}"}), 500
+
+
+@login_required
+def api_import_job(job_id: str):
+    """
+    GET /api/import/jobs/<job_id> (registrada de forma perezosa)
+
+    Status of a background import: queued | running | done | failed,
+    rows processed so far and the same counters as the synchronous import.
+    """
+    user_id = int(session.get("user_id"))
+    job = import_jobs.get_job(job_id, user_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Import job not found"}), 404
+    return jsonify({"ok": True, "job": job})
+
+
+@login_required
+def api_import_csv_confirm():
+    """
+    POST /api/import/csv/confirm (registrada de forma perezosa)
+
+    Import a ?dry_run=1 preview without uploading the file again:
+    {"token": "...", "edits": [{"i": 3, "categoria": "...", "concepto": "..."}]}
+    (edits optional, by row index of the preview). The token works once;
+    if the import fails it can be retried. Same response as the import.
+    """
+    user_id = int(session.get("user_id"))
+    data = request.get_json(silent=True) or {}
+    edits = data.get("edits") or []
+    if not isinstance(edits, list) or not all(isinstance(e, dict) for e in edits):
+        return jsonify({"ok": False, "error": "edits must be a list of objects"}), 400
+
+    token = data.get("token")
+    preview = import_previews.claim(token, user_id)
+    if preview is None:
+        return jsonify({"ok": False, "error": "Preview not found or expired. Upload the file again."}), 404
+
+    try:
+        counters = confirm_import(user_id, preview, edits)
+    except ValueError as e:
+        import_previews.release(token)
+        return jsonify({"ok": False, "error": str(e)}), 400
+    except Exception as e:
+        # Lo ya importado sale como duplicado al reintentar
+        import_previews.release(token)
+        return jsonify({"ok": False, "error": f"Import failed: {str(e)}"}), 500
+    import_previews.discard(token)
+
+    if counters["imported"] > 0:
+        mark_imported(user_id)
+
+    return jsonify({
+        "ok": True,
+        "imported": counters["imported"],
+        "skipped": counters["skipped"],
+        "duplicates": counters["duplicates"],
+        "format": counters["format"]
+    })
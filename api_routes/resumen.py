@@ -1,39 +1,41 @@
 from flask import request, jsonify, session
 from auth import login_required
-from db import db_all, db_one
+from db import db_all, query_budget
 from api_routes.blueprint import api_bp
-from api_routes.utils import rows_to_dicts
+from api_routes.utils import busy_response
+from money import from_cents
 
 
 @api_bp.get("/resumen")
 @login_required
+@query_budget("resumen", on_timeout=busy_response)
 def api_get_resumen():
     user_id = int(session.get("user_id"))
     mes = (request.args.get("mes") or "").strip()
 
+    # gastos_rollup (mantenida por triggers) ya tiene las sumas por mes/categoría:
+    # una sola consulta por PK en vez de dos GROUP BY sobre gastos
     params = [user_id]
     where_mes = ""
     if mes:
-        where_mes = " AND substr(fecha, 1, 7) = ? "
+        where_mes = " AND mes = ? "
         params.append(mes)
 
     por_categoria = db_all(
-        "SELECT categoria, ROUND(SUM(importe), 2) AS total "
-        "FROM gastos "
+        "SELECT categoria, SUM(total_cents) AS total_cents "
+        "FROM gastos_rollup "
         "WHERE user_id = ? " + where_mes +
         "GROUP BY categoria "
-        "ORDER BY total DESC",
-        tuple(params)
-    )
-
-    total = db_one(
-        "SELECT ROUND(COALESCE(SUM(importe), 0), 2) AS total "
-        "FROM gastos "
-        "WHERE user_id = ? " + where_mes,
-        tuple(params)
+        "ORDER BY total_cents DESC",
+        tuple(params),
+        user_id=user_id,
     )
 
+    # Sumas enteras exactas en SQL; a euros solo al serializar
     return jsonify({
-        "total": (total["total"] if total else 0),
-        "por_categoria": rows_to_dicts(por_categoria),
+        "total": from_cents(sum(r["total_cents"] for r in por_categoria or [])),
+        "por_categoria": [
+            {"categoria": r["categoria"], "total": from_cents(r["total_cents"])}
+            for r in por_categoria or []
+        ],
     })
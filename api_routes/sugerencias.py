@@ -1,17 +1,71 @@
+import os
+
 from flask import request, jsonify, session
 from auth import login_required
-from db import db_all
+from db import query_budget
 from api_routes.blueprint import api_bp
-from api_routes.utils import escape_like
+import categorizer
+import nota_index
+import trigram_index
+
+
+# Notas distintas por petición a /api/sugerir/batch
+SUGGEST_BATCH_MAX = int(os.environ.get("SUGGEST_BATCH_MAX", "5000"))
+
+
+def suggest_batch(user_id: int, notas) -> dict:
+    """
+    {nota: sugerencia or None} for many notes, same order of sources as
+    /api/sugerir: one query on notas for all of them, then the categorizer
+    and the trigram index (in memory) for the rest.
+    """
+    out = {nota: None for nota in notas}
+    keys = {}
+    for nota in notas:
+        key = (nota or "").strip()
+        if len(key) >= 3:
+            keys.setdefault(key, []).append(nota)
+
+    found = {}
+    for key, row in nota_index.exact_matches(user_id, keys).items():
+        found[key] = (row["categoria"], row["concepto"], row["n"])
+
+    pending = [key for key in keys if key not in found]
+    for key, best in categorizer.predict_many(user_id, pending).items():
+        found[key] = (best["categoria"], best["concepto"], best["n"])
+
+    pending = [key for key in pending if key not in found]
+    for key, matches in trigram_index.suggest_many(user_id, pending, limit=1).items():
+        if matches:
+            found[key] = (matches[0]["categoria"], matches[0]["concepto"], matches[0]["n"])
+
+    for key, (cat, con, n) in found.items():
+        for nota in keys[key]:
+            out[nota] = {"categoria": cat, "concepto": con, "score": n}
+    return out
+
+
+def _sugerir_degraded():
+    # Sin sugerencias antes que bloquear el worker: el cliente lo reintenta en la siguiente tecla
+    return jsonify({"ok": True, "sugerencia": None, "matches": [], "degraded": True})
+
+
+def _sugerir_nota_degraded():
+    return jsonify({"ok": True, "matches": [], "degraded": True})
 
 
 @api_bp.get("/sugerir")
 @login_required
+@query_budget("sugerir", on_timeout=_sugerir_degraded)
 def api_sugerir():
     """
-    Sugiere categoria + concepto a partir de la nota (modo "contiene"):
-    - Busca en gastos anteriores del usuario donde nota LIKE %texto%
-    - Devuelve combinaciones (categoria, concepto) más repetidas (top 5)
+    Sugiere categoria + concepto a partir de la nota:
+    - Si la nota ya se ha usado, la categoria/concepto de su último uso (tabla notas)
+    - Si no, el modelo Naive Bayes del usuario (categorizer) cuando está seguro:
+      acierta con palabras de notas distintas (p = probabilidad)
+    - Si no, busca en las notas anteriores del usuario con el índice de trigramas
+      (trigram_index): tolera erratas y sufijos tipo "MERCADONA 123"
+    - Devuelve combinaciones (categoria, concepto) más parecidas y repetidas (top 5)
     - Incluye sugerencia principal (top 1)
     """
     user_id = int(session.get("user_id"))
@@ -20,33 +74,15 @@ def api_sugerir():
     if len(nota) < 3:
         return jsonify({"ok": True, "sugerencia": None, "matches": []})
 
-    esc = escape_like(nota)
-    like = f"%{esc}%"
-
-    rows = db_all(
-        """
-        SELECT
-          categoria,
-          COALESCE(concepto,'') AS concepto,
-          COUNT(*) AS n,
-          MAX(id) AS last_id
-        FROM gastos
-        WHERE user_id = ?
-          AND COALESCE(nota,'') LIKE ? ESCAPE '\\'
-        GROUP BY categoria, COALESCE(concepto,'')
-        ORDER BY n DESC, last_id DESC
-        LIMIT 5
-        """,
-        (user_id, like)
-    )
-
-    matches = []
-    for r in rows or []:
-        matches.append({
-            "categoria": r["categoria"],
-            "concepto": r["concepto"],
-            "n": r["n"],
-        })
+    # Nota ya usada antes: basta la tabla notas; si no, el modelo o parecidas por trigramas
+    exact = nota_index.exact_match(user_id, nota)
+    truncated = False
+    if exact is not None:
+        matches = [{"categoria": exact["categoria"], "concepto": exact["concepto"], "n": exact["n"], "similarity": 1.0}]
+    else:
+        matches = categorizer.predict(user_id, nota, limit=5)
+        if not matches or matches[0]["p"] < categorizer.CATEGORIZER_MIN_PROB:
+            matches, truncated = trigram_index.suggest(user_id, nota, limit=5)
 
     sugerencia = None
     if matches:
@@ -56,11 +92,38 @@ def api_sugerir():
             "score": matches[0]["n"],
         }
 
-    return jsonify({"ok": True, "sugerencia": sugerencia, "matches": matches})
+    out = {"ok": True, "sugerencia": sugerencia, "matches": matches}
+    if truncated:
+        out["degraded"] = True
+    return jsonify(out)
+
+
+@api_bp.post("/sugerir/batch")
+@login_required
+def api_sugerir_batch():
+    """
+    Sugerencias para muchas notas a la vez (vista previa del import CSV):
+    - Body: {"notas": ["MERCADONA 123", ...]}
+    - Devuelve {"sugerencias": {nota: {categoria, concepto, score} | null}}
+      con una entrada por nota distinta (las repetidas se resuelven una vez)
+    """
+    user_id = int(session.get("user_id"))
+    data = request.get_json(silent=True) or {}
+    notas = data.get("notas")
+
+    if not isinstance(notas, list) or not all(isinstance(n, str) for n in notas):
+        return jsonify({"ok": False, "error": "notas must be a list of strings"}), 400
+
+    distinct = list(dict.fromkeys(notas))
+    if len(distinct) > SUGGEST_BATCH_MAX:
+        return jsonify({"ok": False, "error": f"Too many notes (max {SUGGEST_BATCH_MAX})"}), 400
+
+    return jsonify({"ok": True, "sugerencias": suggest_batch(user_id, distinct)})
 
 
 @api_bp.get("/sugerir_nota")
 @login_required
+@query_budget("sugerir_nota", on_timeout=_sugerir_nota_degraded)
 def api_sugerir_nota():
     """
     Autocompletar de NOTAS por prefijo:
@@ -68,6 +131,7 @@ def api_sugerir_nota():
       (ej. 'late ron').
     - Devuelve top 8 notas distintas (más frecuentes y recientes).
     - También devuelve la categoria/concepto más reciente asociada a esa nota (para autopoblar).
+    Se responde desde el índice en memoria del usuario (nota_index), sin SQL por tecla.
     """
     user_id = int(session.get("user_id"))
     pref = (request.args.get("pref") or "").strip()
@@ -75,48 +139,4 @@ def api_sugerir_nota():
     if len(pref) < 1:
         return jsonify({"ok": True, "matches": []})
 
-    esc = escape_like(pref)
-    like = f"{esc}%"
-
-    rows = db_all(
-        """
-        SELECT
-          nota,
-          MAX(id) AS last_id,
-          COUNT(*) AS n
-        FROM gastos
-        WHERE user_id = ?
-          AND COALESCE(nota,'') LIKE ? ESCAPE '\\'
-          AND TRIM(COALESCE(nota,'')) <> ''
-        GROUP BY nota
-        ORDER BY n DESC, last_id DESC
-        LIMIT 8
-        """,
-        (user_id, like)
-    )
-
-    matches = []
-    for r in rows or []:
-        nota_txt = r["nota"]
-        # Para cada nota sugerida, sacamos la categoría/concepto del registro más reciente con esa nota
-        meta = db_all(
-            """
-            SELECT categoria, COALESCE(concepto,'') AS concepto
-            FROM gastos
-            WHERE user_id = ? AND nota = ?
-            ORDER BY id DESC
-            LIMIT 1
-            """,
-            (user_id, nota_txt)
-        )
-        cat = meta[0]["categoria"] if meta else ""
-        con = meta[0]["concepto"] if meta else ""
-
-        matches.append({
-            "nota": nota_txt,
-            "n": r["n"],
-            "categoria": cat,
-            "concepto": con,
-        })
-
-    return jsonify({"ok": True, "matches": matches})
+    return jsonify({"ok": True, "matches": nota_index.lookup(user_id, pref, limit=8)})
@@ -1,3 +1,10 @@
+import re
+
+from flask import jsonify
+
+RETRY_AFTER_S = 2
+
+
 def rows_to_dicts(rows):
     out = []
     for r in rows or []:
@@ -11,3 +18,60 @@ def rows_to_dicts(rows):
 def escape_like(s: str) -> str:
     # Escapa % y _ para usar LIKE de forma segura (también escapa \)
     return (s or "").replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+_MES_RE = re.compile(r"^(\d{4})-(\d{2})$")
+
+
+def month_range(mes: str):
+    """
+    'YYYY-MM' -> ('YYYY-MM-01', first day of next month) for a
+    `fecha >= ? AND fecha < ?` filter, which uses idx_gastos_user_fecha
+    (substr(fecha, 1, 7) = ? can't). None if mes isn't a valid month.
+    """
+    m = _MES_RE.match(mes or "")
+    if not m:
+        return None
+    year, month = int(m.group(1)), int(m.group(2))
+    if not 1 <= month <= 12:
+        return None
+    nxt = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year:04d}-{month:02d}-01", f"{nxt[0]:04d}-{nxt[1]:02d}-01"
+
+
+def month_filter(mes: str, column: str = "fecha"):
+    """
+    SQL condition + params selecting one month of `column`.
+    Falls back to the old substr() match for values that aren't YYYY-MM.
+    """
+    rng = month_range(mes)
+    if rng is None:
+        return f"substr({column}, 1, 7) = ?", [mes]
+    return f"{column} >= ? AND {column} < ?", list(rng)
+
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_match(q: str):
+    """
+    Free text -> FTS5 MATCH expression: every word as a prefix term, all
+    required ("super merc" -> '"super"* "merc"*'). Operators and quotes in
+    q are dropped. None if q has no words.
+    """
+    words = _WORD_RE.findall(q or "")
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def busy_response(retry_after: int = RETRY_AFTER_S):
+    # 503 + Retry-After cuando una consulta agota su presupuesto de tiempo
+    resp = jsonify({
+        "ok": False,
+        "error": "La consulta está tardando demasiado. Reintenta en unos segundos.",
+        "retry_after": retry_after,
+    })
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(retry_after)
+    return resp
@@ -1,9 +1,14 @@
 import os
 from flask import Flask, redirect, url_for, session, render_template
 
+import db
+import replication
 import schema
+import startup_profile
 from auth import auth_bp
+from commands import register_commands
 from gastos_api import api_bp
+from metrics_routes import metrics_bp
 from static_routes import static_bp
 
 
@@ -14,9 +19,14 @@ def create_app():
     # Secrets (Fly) / fallback local
     app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev")
     app.config["APP_PIN"] = os.environ.get("APP_PIN", "")
+    # Tamaño máximo de una petición (subida de CSV incluida): 413 si se supera
+    app.config["MAX_CONTENT_LENGTH"] = int(float(os.environ.get("MAX_UPLOAD_MB", "20")) * 1024 * 1024)
+
+    # Devuelve la conexión al pool al cerrar cada request / app context
+    app.teardown_appcontext(db.close_db)
 
     # DB schema init
-    with app.app_context():
+    with startup_profile.phase("schema"), app.app_context():
         # intenta funciones típicas; ajusta si tu schema usa otro nombre
         if hasattr(schema, "init_db"):
             schema.init_db()
@@ -31,9 +41,14 @@ def create_app():
             )
 
     # Blueprints
-    app.register_blueprint(auth_bp)
-    app.register_blueprint(api_bp)
-    app.register_blueprint(static_bp)
+    with startup_profile.phase("blueprints"):
+        app.register_blueprint(auth_bp)
+        app.register_blueprint(api_bp)
+        app.register_blueprint(static_bp)
+        app.register_blueprint(metrics_bp)
+
+    register_commands(app)
+    replication.init_app(app)
 
     @app.get("/")
     def root():
@@ -0,0 +1,201 @@
+"""
+Online backups of the SQLite files with the backup API.
+
+- Same copy as replication (replication.copy_database): BACKUP_PAGES_PER_STEP
+  pages per step, sleeping BACKUP_STEP_SLEEP_S between steps, and a single
+  pass if concurrent commits keep restarting it. In WAL mode writers keep
+  committing while a backup runs.
+- Each snapshot is written as <name>-<UTC timestamp>.db.partial, checked
+  with PRAGMA integrity_check and only then renamed to <name>-<timestamp>.db.
+- The newest BACKUP_KEEP snapshots per DB file are kept.
+- Status (last run, result, sizes) goes to BACKUP_DIR/status.json so the
+  CLI and /_internal/stats see it from any process.
+
+Background service: BACKUP_INTERVAL_S > 0 starts it in one worker per machine.
+CLI: flask --app app backup run | status | verify <file>
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import db
+import replication
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.environ.get("BACKUP_DIR") or str(Path(db.DB_PATH).parent / "backups")
+BACKUP_KEEP = int(os.environ.get("BACKUP_KEEP", "7"))
+BACKUP_INTERVAL_S = float(os.environ.get("BACKUP_INTERVAL_S", "0"))
+PAGES_PER_STEP = int(os.environ.get("BACKUP_PAGES_PER_STEP", "128"))
+STEP_SLEEP_S = float(os.environ.get("BACKUP_STEP_SLEEP_S", "0.01"))
+
+STATUS_FILE = "status.json"
+
+
+def _stem(path: str) -> str:
+    return Path(path).stem
+
+
+def list_backups(backup_dir: str = None, stem: str = None) -> list:
+    """
+    Snapshots in backup_dir (newest first), optionally only for one DB stem.
+    """
+    d = Path(backup_dir or BACKUP_DIR)
+    if not d.is_dir():
+        return []
+    pattern = f"{stem}-*.db" if stem else "*-*.db"
+    return sorted((str(p) for p in d.glob(pattern)), reverse=True)
+
+
+def verify_backup(path: str) -> list:
+    """
+    PRAGMA integrity_check on a snapshot (read-only). ["ok"] means healthy.
+    """
+    uri = Path(path).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        return [r[0] for r in conn.execute("PRAGMA integrity_check").fetchall()]
+    finally:
+        conn.close()
+
+
+def rotate(backup_dir: str, stem: str, keep: int) -> list:
+    """
+    Delete all but the newest `keep` snapshots of `stem`. Returns deleted paths.
+    """
+    deleted = []
+    for old in list_backups(backup_dir, stem)[max(0, keep):]:
+        os.remove(old)
+        deleted.append(old)
+    return deleted
+
+
+def read_status(backup_dir: str = None) -> dict:
+    try:
+        with open(Path(backup_dir or BACKUP_DIR) / STATUS_FILE, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_status(backup_dir: str, status: dict) -> None:
+    path = Path(backup_dir) / STATUS_FILE
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(status, fh, indent=2)
+    os.replace(tmp, path)
+
+
+def run_backup(backup_dir: str = None, keep: int = None, pages: int = None, sleep: float = None) -> dict:
+    """
+    Back up every DB file once. Returns the run status (also persisted).
+    """
+    backup_dir = backup_dir or BACKUP_DIR
+    keep = BACKUP_KEEP if keep is None else keep
+    pages = PAGES_PER_STEP if pages is None else pages
+    sleep = STEP_SLEEP_S if sleep is None else sleep
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    t0 = time.perf_counter()
+    files = []
+    errors = []
+
+    for src_path in replication.source_paths():
+        if not os.path.exists(src_path):
+            continue
+        dest = str(Path(backup_dir) / f"{_stem(src_path)}-{stamp}.db")
+        partial = dest + ".partial"
+        t1 = time.perf_counter()
+        # Conexión propia: no ocupa una del pool de los requests
+        src = sqlite3.connect(src_path)
+        try:
+            replication.copy_database(src, partial, pages=pages, sleep=sleep)
+            result = verify_backup(partial)
+            if result != ["ok"]:
+                os.remove(partial)
+                raise sqlite3.DatabaseError(f"integrity_check failed: {'; '.join(result[:5])}")
+            os.replace(partial, dest)
+            rotated = rotate(backup_dir, _stem(src_path), keep)
+            files.append({
+                "source": src_path,
+                "path": dest,
+                "bytes": os.path.getsize(dest),
+                "ms": round((time.perf_counter() - t1) * 1000, 3),
+                "rotated": len(rotated),
+            })
+        except Exception as e:
+            logger.exception("backup of %s failed", src_path)
+            errors.append(f"{src_path}: {e}")
+        finally:
+            src.close()
+
+    prev = read_status(backup_dir)
+    status = {
+        "ok": not errors,
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "duration_ms": round((time.perf_counter() - t0) * 1000, 3),
+        "files": files,
+        "errors": errors,
+        "runs": int(prev.get("runs", 0)) + 1,
+        "failures": int(prev.get("failures", 0)) + (1 if errors else 0),
+        "last_ok_at": (datetime.now(timezone.utc).isoformat() if not errors else prev.get("last_ok_at")),
+    }
+    Path(backup_dir).mkdir(parents=True, exist_ok=True)
+    _write_status(backup_dir, status)
+    return status
+
+
+class BackupService:
+    """
+    Background thread running run_backup() every `interval` seconds.
+    """
+
+    def __init__(self, interval: float = BACKUP_INTERVAL_S, backup_dir: str = None):
+        self.interval = interval
+        self.backup_dir = backup_dir or BACKUP_DIR
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                run_backup(self.backup_dir)
+            except Exception:
+                logger.exception("backup run failed")
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="db-backups", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+_service = None
+_leader_fh = None
+
+
+def start_background_backups():
+    """
+    Start the backup service in one worker per machine (if BACKUP_INTERVAL_S > 0).
+    """
+    global _service, _leader_fh
+    if BACKUP_INTERVAL_S <= 0 or db.DB_ROLE != "primary" or _service is not None:
+        return _service
+    fh = replication.leader_lock(str(Path(BACKUP_DIR) / ".backups.lock"))
+    if fh is None:
+        return None
+    _leader_fh = fh
+    _service = BackupService()
+    _service.start()
+    return _service
@@ -0,0 +1,108 @@
+"""
+Cold start: time until a new worker answers its first real request.
+
+    python bench/bench_cold_start.py [--runs 7]
+
+Every sample is a fresh Python process (like a Fly machine waking up),
+with a seeded DB so the first query reads real pages. It reports:
+- boot_ms: `import wsgi` (imports + schema + warmup when enabled)
+- first_ms: first GET /api/gastos?mes=... of a logged-in user after boot
+- import_ms: first POST /api/import/csv (lazy route: its module is only
+  imported here; the "eager" config imports it at boot instead)
+
+Configs: warmup on/off x lazy import route on/off. Medians of --runs.
+
+Reference run (--runs 9, 20k rows, local SSD, warm OS page cache):
+    config                   boot_ms  first_ms  import_ms
+    warmup=off eager           289.5       7.6       11.5
+    warmup=off lazy            310.3       8.1       14.9
+    warmup=on eager            334.3       5.6       10.6
+    warmup=on lazy             351.7       6.7       14.6
+Boot is ~90% imports (flask/werkzeug, see STARTUP_PROFILE=1). Warmup
+moves ~2ms off the first request but adds ~40ms to boot. The lazy CSV route
+is within noise: import_csv only adds ~2ms of its own imports.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = r"""
+import io, json, os, sys, time
+sys.path.insert(0, os.environ["BENCH_ROOT"])
+t0 = time.perf_counter()
+if os.environ.get("BENCH_EAGER") == "1":
+    import api_routes.import_csv  # noqa: F401
+import wsgi
+boot = time.perf_counter() - t0
+
+client = wsgi.app.test_client()
+with client.session_transaction() as sess:
+    sess["user_id"] = 1
+t1 = time.perf_counter()
+r = client.get("/api/gastos?mes=2026-01")
+first = time.perf_counter() - t1
+assert r.status_code == 200, r.status_code
+
+csv = b"fecha,importe,categoria,concepto,nota\n2026-01-03,1.5,Otros,Varios,bench\n"
+t2 = time.perf_counter()
+r = client.post("/api/import/csv", data={"file": (io.BytesIO(csv), "g.csv")},
+                content_type="multipart/form-data")
+imp = time.perf_counter() - t2
+print(json.dumps({"boot_ms": boot * 1000, "first_ms": first * 1000, "import_ms": imp * 1000,
+                  "status": r.status_code}))
+"""
+
+
+def _seed(path, rows=20000):
+    sys.path.insert(0, ROOT)
+    import schema
+
+    conn = sqlite3.connect(path)
+    schema.migrate(conn)
+    conn.execute("INSERT INTO users (id, username, email, password_hash, is_confirmed) "
+                 "VALUES (1, 'bench', 'bench@example.com', 'x', 1)")
+    conn.executemany(
+        "INSERT INTO gastos (user_id, fecha, categoria, concepto, importe, nota) VALUES (1, ?, 'Otros', 'Varios', 1, ?)",
+        [(f"2025-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}", f"nota {i}") for i in range(rows)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _sample(db_path, warmup, eager):
+    env = dict(os.environ, BENCH_ROOT=ROOT, DB_PATH=db_path, WARMUP="1" if warmup else "0",
+               BENCH_EAGER="1" if eager else "0", SECRET_KEY="bench")
+    # Vaciar la page cache del SO no es posible sin root: se mide el coste de Python + SQLite
+    out = subprocess.run([sys.executable, "-c", _CHILD], env=env, cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=7)
+    args = ap.parse_args()
+
+    d = tempfile.mkdtemp(prefix="bench_cold_")
+    db_path = os.path.join(d, "gastos.db")
+    _seed(db_path)
+
+    print(f"{'config':<22}{'boot_ms':>10}{'first_ms':>10}{'import_ms':>11}")
+    for warmup in (False, True):
+        for eager in (True, False):
+            samples = [_sample(db_path, warmup, eager) for _ in range(args.runs)]
+            med = {k: statistics.median(s[k] for s in samples) for k in ("boot_ms", "first_ms", "import_ms")}
+            name = f"warmup={'on' if warmup else 'off'} {'eager' if eager else 'lazy'}"
+            print(f"{name:<22}{med['boot_ms']:>10.1f}{med['first_ms']:>10.1f}{med['import_ms']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Write throughput of DB_WRITE_MODE=direct vs group under the production
+process layout: WORKERS processes (gunicorn -w) with THREADS request
+threads each (gunicorn --threads).
+
+    python bench/bench_group_commit.py [--workers 2] [--threads 4] [--writes 200]
+
+Each thread inserts `writes` rows. "direct" commits every row on the
+thread's own connection (what db_exec does per request); "group" submits
+through one GroupCommitWriter per process. Reports rows/s, "database is
+locked" errors and, for group, the batch sizes the writer achieved.
+
+Reference run (2 workers, 4 threads, local SSD):
+    synchronous=NORMAL  direct ~22k rows/s   group ~5.5k rows/s (avg_batch 4.0)
+    synchronous=FULL    direct ~4.1k rows/s  group ~4.8k rows/s (avg_batch 4.0)
+    1 thread (sync workers): avg_batch 1.0, group only adds a thread handoff
+No "database is locked" in any mode: busy_timeout already serializes the
+two workers.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+_INSERT = "INSERT INTO gastos (user_id, fecha, categoria, nota, importe) VALUES (?, '2026-01-01', 'Otros', ?, 1)"
+
+
+def _worker(mode, path, threads, writes, out):
+    errors = []
+    writer = db.GroupCommitWriter(path) if mode == "group" else None
+
+    def run(tid):
+        conn = None
+        if writer is None:
+            conn = sqlite3.connect(path, timeout=db.PRAGMA_PROFILE["busy_timeout"] / 1000.0)
+            db.apply_pragmas(conn, db.PRAGMA_PROFILE)
+        for i in range(writes):
+            try:
+                if writer is not None:
+                    writer.submit(_INSERT, (tid, f"n{i}"))
+                else:
+                    conn.execute(_INSERT, (tid, f"n{i}"))
+                    conn.commit()
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+                if conn is not None and conn.in_transaction:
+                    conn.rollback()
+        if conn is not None:
+            conn.close()
+
+    ts = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    out.put({"errors": len(errors), "writer": writer.stats() if writer else None})
+
+
+def bench(mode, workers, threads, writes):
+    d = tempfile.mkdtemp(prefix="bench_gc_")
+    path = os.path.join(d, "gastos.db")
+    conn = sqlite3.connect(path)
+    db.apply_pragmas(conn, db.PRAGMA_PROFILE)
+    conn.execute("CREATE TABLE gastos (id INTEGER PRIMARY KEY, user_id INTEGER, fecha TEXT, "
+                 "categoria TEXT, nota TEXT, importe REAL)")
+    conn.commit()
+    conn.close()
+
+    out = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_worker, args=(mode, path, threads, writes, out))
+             for _ in range(workers)]
+    t0 = time.perf_counter()
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - t0
+
+    total = workers * threads * writes
+    line = f"{mode:>6}: {total / elapsed:9.0f} rows/s  {elapsed:6.2f}s  locked={sum(r['errors'] for r in results)}"
+    if mode == "group":
+        st = [r["writer"] for r in results]
+        line += (f"  avg_batch={sum(s['avg_batch'] for s in st) / len(st):.1f}"
+                 f"  max_batch={max(s['max_batch'] for s in st)}"
+                 f"  batches={sum(s['batches'] for s in st)}")
+    print(line)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--writes", type=int, default=200)
+    args = ap.parse_args()
+    print(f"workers={args.workers} threads={args.threads} writes/thread={args.writes}")
+    for mode in ("direct", "group"):
+        bench(mode, args.workers, args.threads, args.writes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+CSV import throughput: the old row-by-row loop vs the set-based pipeline
+(api_routes.import_csv.import_transactions).
+
+    python bench/bench_import_csv.py [--rows 5000] [--history 20000]
+
+Both run inside the app on a WAL file DB with the production pragmas, for
+a user with --history gastos, importing --rows parsed transactions of
+which ~10% are duplicates. The old loop is check_duplicate +
+suggest_category_for_concept + db_exec (one commit) per row.
+
+Reference run (5000 rows, 20k history, local SSD):
+    pipeline           ms  imported skipped duplicates
+    row-by-row       7784  (4500, 0, 500)
+    set-based        1089  (4500, 0, 500)
+Row by row is ~14k statements and 4500 commits; set-based is ~15
+statements and one commit. What is left is mostly the trigram lookups
+of the unseen notes and the gastos triggers (rollup, FTS, notas).
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp(prefix="bench_import_")
+os.environ["DB_PATH"] = os.path.join(_tmp, "gastos.db")
+
+import db  # noqa: E402
+from app import create_app  # noqa: E402
+from api_routes import import_csv  # noqa: E402
+from money import from_cents  # noqa: E402
+
+USER = 1
+_NOTES = ["MERCADONA", "CARREFOUR EXPRESS", "REPSOL", "CINE YELMO", "FARMACIA", "AMAZON EU", "BAR PACO"]
+
+
+def _seed(conn, history: int) -> list:
+    rnd = random.Random(1)
+    rows = []
+    for i in range(history):
+        rows.append((USER, f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+                     rnd.choice(["Alimentación", "Transporte", "Ocio"]), "x",
+                     f"{rnd.choice(_NOTES)} {rnd.randint(1, 999)}", -rnd.randint(100, 9000)))
+    conn.executemany(
+        "INSERT INTO gastos (user_id, fecha, categoria, concepto, nota, importe_cents) VALUES (?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    return rows
+
+
+def _transactions(history_rows: list, n: int, seed: int) -> list:
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        if i % 10 == 0:
+            _u, fecha, _c, _co, nota, cents = rnd.choice(history_rows)
+        else:
+            fecha = f"2026-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"
+            nota = f"{rnd.choice(_NOTES)} {rnd.randint(1, 99999)}"
+            cents = -rnd.randint(100, 9000)
+        out.append({"fecha": fecha, "concepto": nota, "importe": from_cents(cents), "importe_cents": cents})
+    return out
+
+
+def _row_by_row(txs: list, created_at: str):
+    imported = duplicates = 0
+    for tx in txs:
+        if import_csv.check_duplicate(USER, tx["fecha"], tx["concepto"], tx["importe_cents"]):
+            duplicates += 1
+            continue
+        categoria, concepto = import_csv.suggest_category_for_concept(USER, tx["concepto"])
+        db.db_exec(
+            import_csv._INSERT_SQL,
+            (USER, tx["fecha"], categoria or "", concepto or "", tx["concepto"],
+             tx["importe"], tx["importe_cents"], created_at, None),
+            user_id=USER,
+        )
+        imported += 1
+    return imported, 0, duplicates
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--history", type=int, default=20000)
+    args = ap.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        history = _seed(db.get_db(), args.history)
+        print(f"{'pipeline':<12} {'ms':>8}  imported skipped duplicates")
+        for name, fn, seed in (("row-by-row", _row_by_row, 2),
+                               ("set-based", lambda t, c: import_csv.import_transactions(USER, t, c), 3)):
+            txs = _transactions(history, args.rows, seed)
+            t0 = time.perf_counter()
+            counters = fn(txs, "bench")
+            ms = (time.perf_counter() - t0) * 1000
+            print(f"{name:<12} {ms:>8.0f}  {counters}")
+
+
+if __name__ == "__main__":
+    main()
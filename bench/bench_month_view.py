@@ -0,0 +1,89 @@
+"""
+Month view latency (GET /api/gastos?mes= and /api/resumen?mes= queries)
+as a user's history grows.
+
+    python bench/bench_month_view.py [--per-month 300] [--repeat 50]
+
+For 1, 3, 10 and 20 years of history it times the old substr(fecha, 1, 7)
+filter and the range filter used now (api_routes.utils.month_filter),
+on the real schema and indexes. The range filter should stay flat: it
+reads one month through idx_gastos_user_fecha whatever the history size.
+
+Reference run (300 rows/month, median ms):
+    years     rows | list substr list range | resumen substr resumen range
+        1     3600 |        1.64       0.84 |           0.85          0.24
+       10    36000 |        9.82       0.83 |           8.23          0.18
+       20    72000 |       19.16       0.58 |          14.58          0.18
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import schema  # noqa: E402
+from api_routes.utils import month_filter  # noqa: E402
+
+USER = 1
+MES = "2026-01"
+
+_LIST = ("SELECT id, fecha, categoria, COALESCE(concepto,'') AS concepto, nota, importe "
+         "FROM gastos WHERE user_id = ? AND {cond} ORDER BY fecha DESC, id DESC")
+_RESUMEN = ("SELECT categoria, ROUND(SUM(importe), 2) AS total FROM gastos "
+            "WHERE user_id = ? AND {cond} GROUP BY categoria ORDER BY total DESC")
+
+
+def _build(years: int, per_month: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    schema.migrate(conn)
+    rnd = random.Random(years)
+    rows = []
+    for m in range(years * 12):
+        # m meses antes de enero de 2026
+        y, mo = divmod(2026 * 12 - m, 12)
+        mo += 1
+        for _ in range(per_month):
+            rows.append((USER, f"{y:04d}-{mo:02d}-{rnd.randint(1, 28):02d}",
+                         rnd.choice(["Alimentación", "Transporte", "Otros"]), "x", rnd.random() * 50))
+    conn.executemany("INSERT INTO gastos (user_id, fecha, categoria, nota, importe) VALUES (?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.execute("ANALYZE")
+    return conn
+
+
+def _time(conn, sql, params, repeat) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--per-month", type=int, default=300)
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    cond, mes_params = month_filter(MES)
+    print(f"{'years':>5} {'rows':>8} | {'list substr':>11} {'list range':>10} | {'resumen substr':>14} {'resumen range':>13}  (median ms)")
+    for years in (1, 3, 10, 20):
+        conn = _build(years, args.per_month)
+        rows = conn.execute("SELECT COUNT(*) FROM gastos").fetchone()[0]
+        old = ("substr(fecha, 1, 7) = ?", [MES])
+        res = []
+        for tmpl in (_LIST, _RESUMEN):
+            for c, p in (old, (cond, mes_params)):
+                res.append(_time(conn, tmpl.format(cond=c), [USER] + p, args.repeat))
+        print(f"{years:>5} {rows:>8} | {res[0]:>11.2f} {res[1]:>10.2f} | {res[2]:>14.2f} {res[3]:>13.2f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Offline accuracy of the Naive Bayes categorizer (categorizer.NaiveBayes)
+against the old LIKE lookup ("most frequent categoria among earlier notes
+containing this text").
+
+    python bench/eval_categorizer.py [--db gastos.db] [--user-id N] [--test-frac 0.2]
+
+Per user, gastos are split by id: the oldest (1 - test_frac) are the
+history, each of the newest is categorized from that history only. With
+--db it reads a copy of a real DB (read-only); without it, a synthetic
+history (recurring merchants plus new ones that share words with them).
+
+Columns: covered = rows with a suggestion; accuracy = right categoria over
+all test rows; precision = right categoria over covered rows. "pair" is
+categoria + concepto. "nb >= min_prob" is what /api/sugerir and the import
+actually use before falling back to trigrams.
+
+Reference run (synthetic, 3 users x 1500 gastos, 5% mislabeled):
+    method             covered  accuracy  precision  pair acc
+    like                 49.8%     46.2%      92.9%     46.2%
+    nb                  100.0%     93.2%      93.2%     92.9%
+    nb >= min_prob       96.9%     91.3%      94.3%     91.0%
+LIKE only finds notes whose full text appeared before ("MERCADONA 4411"
+never does); the model generalizes from the words. Predictions take
+~10 us for a few classes and ~0.2 ms for 120 classes sharing a word.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import categorizer  # noqa: E402
+
+_LIKE_SQL = """
+    SELECT categoria, COALESCE(concepto, '') AS concepto, COUNT(*) AS n, MAX(id) AS last_id
+    FROM gastos
+    WHERE user_id = ? AND id <= ?
+      AND COALESCE(nota, '') LIKE ? ESCAPE '\\'
+    GROUP BY categoria, COALESCE(concepto, '')
+    ORDER BY n DESC, last_id DESC
+    LIMIT 1
+"""
+
+_MERCHANTS = {
+    ("Alimentación", "Supermercado"): ["MERCADONA", "CARREFOUR EXPRESS", "LIDL", "SUPERMERCADO DIA", "ALCAMPO"],
+    ("Alimentación", "Panadería"): ["PANADERIA LA ESPIGA", "HORNO SAN ONOFRE", "PANADERIA PAQUI"],
+    ("Transporte", "Gasolina"): ["GASOLINERA REPSOL", "ESTACION CEPSA", "GASOLINERA BP", "PLENOIL"],
+    ("Transporte", "Transporte público"): ["METRO MADRID", "RENFE CERCANIAS", "EMT BUS", "BICIMAD"],
+    ("Ocio", "Bares"): ["BAR MANOLO", "CERVECERIA LA PLAZA", "BAR EL RINCON", "TABERNA PEPE"],
+    ("Ocio", "Cine"): ["CINE YELMO", "CINES CALLAO", "CINESA"],
+    ("Salud", "Farmacia"): ["FARMACIA CENTRO", "FARMACIA LDO GARCIA", "PARAFARMACIA"],
+    ("Hogar", "Suministros"): ["IBERDROLA LUZ", "NATURGY GAS", "CANAL ISABEL II AGUA"],
+}
+# Comercios que aparecen en varias clases (ambiguos a propósito)
+_SHARED = {
+    ("Alimentación", "Supermercado"): ["AMAZON EU", "CARREFOUR"],
+    ("Transporte", "Gasolina"): ["CARREFOUR GASOLINERA"],
+    ("Hogar", "Suministros"): ["AMAZON EU"],
+    ("Ocio", "Cine"): ["AMAZON PRIME"],
+}
+_NEW_WORDS = ["NORTE", "SUR", "PLAZA", "CENTRO", "NUEVO", "MAYOR", "SOL", "LUNA"]
+
+
+def _escape_like(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _synthetic(users: int, rows: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        "CREATE TABLE gastos (id INTEGER PRIMARY KEY, user_id INTEGER, categoria TEXT, concepto TEXT, nota TEXT)"
+    )
+    rnd = random.Random(7)
+    classes = list(_MERCHANTS)
+    for user_id in range(1, users + 1):
+        weights = [rnd.random() + 0.2 for _ in classes]
+        for _ in range(rows):
+            cat, con = rnd.choices(classes, weights)[0]
+            merchant = rnd.choice(_MERCHANTS[(cat, con)] + _SHARED.get((cat, con), []))
+            if rnd.random() < 0.05:
+                # Mal categorizado a mano
+                cat, con = rnd.choice(classes)
+            r = rnd.random()
+            if r < 0.35:
+                # Sucursal/ticket: la misma tienda con números distintos
+                nota = f"{merchant} {rnd.randint(1, 9999)}"
+            elif r < 0.5:
+                # Tienda nueva del mismo tipo: comparte la primera palabra
+                nota = f"{merchant.split()[0]} {rnd.choice(_NEW_WORDS)} {rnd.randint(1, 99)}"
+            else:
+                nota = merchant
+            conn.execute(
+                "INSERT INTO gastos (user_id, categoria, concepto, nota) VALUES (?, ?, ?, ?)",
+                (user_id, cat, con, nota),
+            )
+    return conn
+
+
+def _evaluate(conn, user_id: int, test_frac: float, stats: dict) -> None:
+    rows = conn.execute(
+        "SELECT id, nota, categoria, COALESCE(concepto, '') AS concepto FROM gastos "
+        "WHERE user_id = ? AND COALESCE(nota, '') <> '' AND COALESCE(categoria, '') <> '' ORDER BY id",
+        (user_id,),
+    ).fetchall()
+    split = int(len(rows) * (1 - test_frac))
+    if split == 0 or split == len(rows):
+        return
+    cutoff = rows[split - 1]["id"]
+
+    model = categorizer.NaiveBayes()
+    for r in rows[:split]:
+        model.learn(r["nota"], r["categoria"], r["concepto"])
+
+    for r in rows[split:]:
+        truth = (r["categoria"], r["concepto"])
+        nota = r["nota"].strip()
+
+        like = conn.execute(_LIKE_SQL, (user_id, cutoff, f"%{_escape_like(nota)}%")).fetchone()
+        _score(stats["like"], truth, (like["categoria"], like["concepto"]) if like else None)
+
+        best = model.predict(nota, 1)
+        guess = (best[0]["categoria"], best[0]["concepto"]) if best else None
+        _score(stats["nb"], truth, guess)
+        confident = guess if best and best[0]["p"] >= categorizer.CATEGORIZER_MIN_PROB else None
+        _score(stats["nb >= min_prob"], truth, confident)
+
+
+def _score(s: dict, truth: tuple, guess) -> None:
+    s["total"] += 1
+    if guess is None:
+        return
+    s["covered"] += 1
+    s["cat"] += guess[0] == truth[0]
+    s["pair"] += guess == truth
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", help="copy of a gastos DB (opened read-only)")
+    ap.add_argument("--user-id", type=int)
+    ap.add_argument("--test-frac", type=float, default=0.2)
+    ap.add_argument("--users", type=int, default=3, help="synthetic users")
+    ap.add_argument("--rows", type=int, default=1500, help="synthetic gastos per user")
+    args = ap.parse_args()
+
+    if args.db:
+        conn = sqlite3.connect(Path(args.db).resolve().as_uri() + "?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+    else:
+        conn = _synthetic(args.users, args.rows)
+
+    if args.user_id:
+        users = [args.user_id]
+    else:
+        users = [r[0] for r in conn.execute("SELECT DISTINCT user_id FROM gastos ORDER BY user_id")]
+
+    stats = {m: {"total": 0, "covered": 0, "cat": 0, "pair": 0} for m in ("like", "nb", "nb >= min_prob")}
+    for user_id in users:
+        _evaluate(conn, user_id, args.test_frac, stats)
+
+    print(f"{'method':<16} {'covered':>9} {'accuracy':>9} {'precision':>10} {'pair acc':>9}")
+    for name, s in stats.items():
+        total = s["total"] or 1
+        covered = s["covered"] or 1
+        print(f"{name:<16} {s['covered'] / total:>9.1%} {s['cat'] / total:>9.1%} "
+              f"{s['cat'] / covered:>10.1%} {s['pair'] / total:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
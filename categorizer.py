@@ -0,0 +1,325 @@
+"""
+Per-user multinomial Naive Bayes over the words of the notes, for
+categorizing notes never seen before (/api/sugerir, CSV import).
+
+- Classes are the (categoria, concepto) pairs of the user's gastos; features
+  are the normalized words of the note (trigram_index.normalize: lowercase,
+  no accents, no numbers). Laplace smoothing with CATEGORIZER_ALPHA.
+- Trained from the user's gastos (one GROUP BY) and kept in an LRU of
+  CATEGORIZER_USERS users. This worker's writes update it in place
+  (on_insert / on_delete); writes from other workers are picked up after
+  CATEGORIZER_TTL_S with the same freshness key as trigram_index: only
+  inserts since -> train on the new rows, anything else -> retrain.
+- Each retrain (and every CATEGORIZER_SNAPSHOT_ROWS rows caught up) is
+  saved as a JSON snapshot in CATEGORIZER_DIR, so a new worker starts from
+  it and only catches up on the rows added since.
+- predict() is a few dict lookups per class: microseconds, no SQL.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+import db
+import trigram_index
+
+logger = logging.getLogger(__name__)
+
+CATEGORIZER_USERS = int(os.environ.get("CATEGORIZER_USERS", "64"))
+CATEGORIZER_TTL_S = float(os.environ.get("CATEGORIZER_TTL_S", "30"))
+CATEGORIZER_ALPHA = float(os.environ.get("CATEGORIZER_ALPHA", "0.5"))
+# Probabilidad mínima de la clase ganadora para usar la predicción
+CATEGORIZER_MIN_PROB = float(os.environ.get("CATEGORIZER_MIN_PROB", "0.6"))
+CATEGORIZER_DIR = os.environ.get("CATEGORIZER_DIR") or str(Path(db.DB_PATH).parent / "models")
+# Gastos nuevos aprendidos antes de reescribir el snapshot (el resto se recupera al arrancar)
+CATEGORIZER_SNAPSHOT_ROWS = int(os.environ.get("CATEGORIZER_SNAPSHOT_ROWS", "500"))
+
+SNAPSHOT_VERSION = 1
+
+# Gastos con nota y categoria desde un id (0 = todos), agrupados
+_TRAIN_SQL = """
+    SELECT nota, categoria, COALESCE(concepto, '') AS concepto, COUNT(*) AS n
+    FROM gastos
+    WHERE user_id = ? AND id > ?
+      AND COALESCE(nota, '') <> '' AND COALESCE(categoria, '') <> ''
+    GROUP BY nota, categoria, COALESCE(concepto, '')
+"""
+
+_NEW_ROWS_SQL = "SELECT COUNT(*) AS n FROM gastos WHERE user_id = ? AND id > ?"
+
+
+def tokens(nota: str) -> list:
+    return [t for t in trigram_index.normalize(nota).split() if len(t) > 1]
+
+
+class NaiveBayes:
+    """
+    Word counts per (categoria, concepto) for one user. Not thread-safe on
+    its own; the module lock serializes access.
+    """
+
+    def __init__(self, key=None):
+        self.docs = {}      # (categoria, concepto) -> nº de gastos
+        self.words = {}     # palabra -> {(categoria, concepto): apariciones}
+        self.totals = {}    # (categoria, concepto) -> total de palabras
+        self.n_docs = 0
+        self.key = key      # trigram_index.freshness_key() de lo aprendido
+        self.unsaved = 0    # gastos aprendidos desde el último snapshot
+        self.checked_at = time.monotonic()
+        self._base = None   # {clase: (log P(clase), log(total + alpha * V))}, se recalcula tras learn
+
+    def learn(self, nota: str, categoria: str, concepto: str, n: int = 1) -> None:
+        """
+        Add n gastos with this note and class (n < 0 forgets them).
+        """
+        words = tokens(nota)
+        if not words or not categoria:
+            return
+        cls = (categoria, concepto or "")
+        self._base = None
+        self.docs[cls] = self.docs.get(cls, 0) + n
+        self.n_docs += n
+        for w, c in Counter(words).items():
+            counts = self.words.setdefault(w, {})
+            counts[cls] = counts.get(cls, 0) + c * n
+            if counts[cls] <= 0:
+                del counts[cls]
+                if not counts:
+                    del self.words[w]
+        self.totals[cls] = self.totals.get(cls, 0) + len(words) * n
+        if self.docs[cls] <= 0:
+            del self.docs[cls], self.totals[cls]
+
+    def _class_terms(self) -> dict:
+        if self._base is None:
+            log_n = math.log(self.n_docs)
+            denom_v = CATEGORIZER_ALPHA * len(self.words)
+            self._base = {
+                cls: (math.log(docs) - log_n, math.log(self.totals[cls] + denom_v))
+                for cls, docs in self.docs.items()
+            }
+        return self._base
+
+    def predict(self, nota: str, limit: int = 1) -> list:
+        """
+        Most likely classes for `nota`: dicts with categoria, concepto, n
+        (gastos of that class) and p (posterior probability). Empty if no
+        word of the note has been seen.
+        """
+        words = Counter(w for w in tokens(nota) if w in self.words)
+        if not words or self.n_docs <= 0:
+            return []
+        log_a = math.log(CATEGORIZER_ALPHA)
+        n = sum(words.values())
+        # Todas las clases con la palabra ausente (alpha) y luego se corrigen
+        # solo las que sí la tienen
+        scores = {cls: prior + n * (log_a - denom) for cls, (prior, denom) in self._class_terms().items()}
+        for w, c in words.items():
+            for cls, count in self.words[w].items():
+                scores[cls] += c * (math.log(count + CATEGORIZER_ALPHA) - log_a)
+
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], -self.docs[kv[0]]))
+        top = ranked[0][1]
+        z = sum(math.exp(s - top) for s in scores.values())
+        return [
+            {"categoria": cat, "concepto": con, "n": self.docs[(cat, con)], "p": round(math.exp(s - top) / z, 3)}
+            for (cat, con), s in ranked[:limit]
+        ]
+
+    def to_dict(self) -> dict:
+        by_class = {cls: {} for cls in self.docs}
+        for w, counts in self.words.items():
+            for cls, c in counts.items():
+                by_class[cls][w] = c
+        return {
+            "version": SNAPSHOT_VERSION,
+            "key": list(self.key) if self.key else None,
+            "classes": [[cat, con, self.docs[(cat, con)], words] for (cat, con), words in by_class.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        model = cls(tuple(data["key"]) if data.get("key") else None)
+        for cat, con, docs, words in data["classes"]:
+            key = (cat, con)
+            model.docs[key] = int(docs)
+            model.n_docs += int(docs)
+            model.totals[key] = 0
+            for w, c in words.items():
+                model.words.setdefault(w, {})[key] = int(c)
+                model.totals[key] += int(c)
+        return model
+
+
+def snapshot_path(user_id: int) -> Path:
+    return Path(CATEGORIZER_DIR) / f"nb-{int(user_id)}.json"
+
+
+def _save(user_id: int, model: NaiveBayes) -> None:
+    path = snapshot_path(user_id)
+    with _lock:
+        data = json.dumps(model.to_dict(), ensure_ascii=False).encode("utf-8")
+        model.unsaved = 0
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        # Sin snapshot solo se pierde el arranque rápido
+        logger.warning("could not save categorizer snapshot %s", path, exc_info=True)
+
+
+def _load_snapshot(user_id: int):
+    try:
+        with open(snapshot_path(user_id), encoding="utf-8") as fh:
+            data = json.load(fh)
+        if data.get("version") != SNAPSHOT_VERSION:
+            return None
+        return NaiveBayes.from_dict(data)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _train(model: NaiveBayes, user_id: int, after_id: int) -> None:
+    rows = db.db_all(_TRAIN_SQL, (user_id, after_id), user_id=user_id) or []
+    with _lock:
+        for r in rows:
+            model.learn(r["nota"], r["categoria"], r["concepto"], int(r["n"]))
+
+
+def _catch_up(user_id: int, model, key: tuple):
+    """
+    `model` brought to `key`: train on the rows added since (inserts only)
+    or retrain from scratch. Returns the model to cache.
+    """
+    if model is not None and model.key is not None and model.key[0] == key[0] and key[1] >= model.key[1]:
+        added = db.db_one(_NEW_ROWS_SQL, (user_id, model.key[1]), user_id=user_id)
+        if model.key[2] + int(added["n"]) == key[2]:
+            if key != model.key:
+                _train(model, user_id, model.key[1])
+                model.key = key
+                model.unsaved += int(added["n"])
+                if model.unsaved >= CATEGORIZER_SNAPSHOT_ROWS:
+                    _save(user_id, model)
+            return model
+
+    model = NaiveBayes(key)
+    _train(model, user_id, 0)
+    _save(user_id, model)
+    return model
+
+
+_cache = OrderedDict()   # user_id -> NaiveBayes
+_lock = threading.Lock()
+# Un (re)entrenamiento a la vez: dos requests no aprenden las mismas filas dos veces
+_train_lock = threading.Lock()
+
+
+def _model(user_id: int) -> NaiveBayes:
+    now = time.monotonic()
+    with _lock:
+        model = _cache.get(user_id)
+        if model is not None:
+            _cache.move_to_end(user_id)
+
+    if model is None or now - model.checked_at > CATEGORIZER_TTL_S:
+        key = trigram_index.freshness_key(user_id)
+        with _train_lock:
+            with _lock:
+                model = _cache.get(user_id)
+            if model is None:
+                model = _load_snapshot(user_id)
+            if model is None or model.key != key:
+                model = _catch_up(user_id, model, key)
+            model.checked_at = now
+            with _lock:
+                _cache[user_id] = model
+                _cache.move_to_end(user_id)
+                while len(_cache) > CATEGORIZER_USERS:
+                    _cache.popitem(last=False)
+    return model
+
+
+def predict(user_id: int, nota: str, limit: int = 1) -> list:
+    """
+    Classes for `nota` from the user's model; see NaiveBayes.predict.
+    """
+    model = _model(user_id)
+    with _lock:
+        return model.predict(nota, limit)
+
+
+def predict_many(user_id: int, notas, min_prob: float = None) -> dict:
+    """
+    {nota: best match (see NaiveBayes.predict)} for the notes whose best
+    class reaches min_prob (CATEGORIZER_MIN_PROB by default).
+    """
+    min_prob = CATEGORIZER_MIN_PROB if min_prob is None else min_prob
+    model = _model(user_id)
+    out = {}
+    with _lock:
+        for nota in notas:
+            best = model.predict(nota, 1)
+            if best and best[0]["p"] >= min_prob:
+                out[nota] = best[0]
+    return out
+
+
+def is_cached(user_id: int) -> bool:
+    return user_id in _cache
+
+
+def on_insert(user_id: int, gasto_id: int, nota: str, categoria: str, concepto: str) -> None:
+    """
+    Learn a gasto this worker just inserted (no-op if the user isn't cached).
+    """
+    with _lock:
+        model = _cache.get(user_id)
+        if model is None:
+            return
+        model.learn(nota, categoria, concepto)
+        if model.key is not None:
+            db_file, last_id, n = model.key
+            model.key = (db_file, max(last_id, int(gasto_id or 0)), n + 1)
+
+
+def on_delete(user_id: int, row) -> None:
+    """
+    Forget a deleted gasto (row with id, nota, categoria and concepto).
+    """
+    with _lock:
+        model = _cache.get(user_id)
+        if model is None or row is None:
+            return
+        model.learn(row["nota"], row["categoria"], row["concepto"], -1)
+        if model.key is not None:
+            db_file, last_id, n = model.key
+            if int(row["id"]) == last_id:
+                # Cambia MAX(id): se reentrena en la próxima comprobación
+                model.key = None
+                model.checked_at = -math.inf
+            else:
+                model.key = (db_file, last_id, n - 1)
+
+
+def expire(user_id: int) -> None:
+    """
+    Recheck the user's model on the next prediction (bulk inserts: it
+    trains on the new rows only).
+    """
+    with _lock:
+        model = _cache.get(user_id)
+        if model is not None:
+            model.checked_at = -math.inf
+
+
+def clear() -> None:
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,183 @@
+"""
+Management commands (Flask CLI):
+
+    flask --app app shards split [--delete-source]
+    flask --app app replicate [--once]
+    flask --app app backup run | status | verify <file>
+    flask --app app rollup verify [--user-id N] [--fix] | rebuild [--user-id N]
+    flask --app app gastos dedupe [--user-id N] [--fix] [--chunk N]
+"""
+
+import click
+
+
+@click.group("shards")
+def shards_cli():
+    """Per-user DB sharding tools."""
+
+
+@shards_cli.command("split")
+@click.option("--delete-source", is_flag=True, help="Borra de la BD global las filas ya copiadas.")
+def shards_split(delete_source):
+    """Copy gastos from DB_PATH into the per-user shard files."""
+    from sharding import split_into_shards
+
+    try:
+        copied = split_into_shards(delete_source=delete_source)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for uid, n in copied.items():
+        click.echo(f"user {uid}: {n} filas")
+    click.echo(f"{len(copied)} usuarios, {sum(copied.values())} filas copiadas")
+
+
+@click.command("replicate")
+@click.option("--once", is_flag=True, help="Una sola ronda y salir.")
+def replicate(once):
+    """Ship snapshots of DB_PATH (and shards) to REPLICA_DIR."""
+    from replication import Replicator
+
+    try:
+        rep = Replicator()
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if once:
+        n = rep.sync_once()
+        click.echo(f"{n} ficheros copiados a {rep.replica_dir}")
+        return
+    click.echo(f"Replicando cada {rep.interval}s a {rep.replica_dir} (Ctrl+C para parar)")
+    try:
+        rep.run_forever()
+    except KeyboardInterrupt:
+        rep.stop()
+
+
+@click.group("backup")
+def backup_cli():
+    """Online backups (SQLite backup API)."""
+
+
+@backup_cli.command("run")
+@click.option("--dir", "backup_dir", default=None, help="Directorio destino (BACKUP_DIR).")
+@click.option("--keep", type=int, default=None, help="Snapshots a conservar por BD.")
+def backup_run(backup_dir, keep):
+    """Back up every DB file now, verify and rotate."""
+    from backups import run_backup
+
+    status = run_backup(backup_dir=backup_dir, keep=keep)
+    for f in status["files"]:
+        click.echo(f"{f['path']}  {f['bytes']} bytes  {f['ms']:.0f}ms")
+    for err in status["errors"]:
+        click.echo(f"ERROR {err}", err=True)
+    if not status["ok"]:
+        raise click.ClickException("backup con errores")
+
+
+@backup_cli.command("status")
+@click.option("--dir", "backup_dir", default=None)
+def backup_status(backup_dir):
+    """Show the last run and the snapshots on disk."""
+    import json
+    from backups import list_backups, read_status
+
+    click.echo(json.dumps(read_status(backup_dir), indent=2))
+    for path in list_backups(backup_dir):
+        click.echo(path)
+
+
+@backup_cli.command("verify")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def backup_verify(path):
+    """PRAGMA integrity_check on a snapshot."""
+    from backups import verify_backup
+
+    result = verify_backup(path)
+    click.echo("\n".join(result))
+    if result != ["ok"]:
+        raise click.ClickException("integrity_check falló")
+
+
+def _source_conns():
+    import sqlite3
+    from replication import source_paths
+
+    for path in source_paths():
+        conn = sqlite3.connect(path)
+        try:
+            yield path, conn
+        finally:
+            conn.close()
+
+
+@click.group("rollup")
+def rollup_cli():
+    """gastos_rollup (resumen / categorias) maintenance."""
+
+
+@rollup_cli.command("verify")
+@click.option("--user-id", type=int, default=None)
+@click.option("--fix", is_flag=True, help="Reconstruye los ficheros con diferencias.")
+def rollup_verify(user_id, fix):
+    """Compare gastos_rollup with gastos; exit 1 on drift (unless --fix)."""
+    import rollup
+
+    drift = 0
+    for path, conn in _source_conns():
+        diffs = rollup.verify(conn, user_id)
+        for d in diffs[:20]:
+            click.echo(f"{path}: {d}")
+        if diffs and fix:
+            n = rollup.rebuild(conn, user_id)
+            click.echo(f"{path}: {len(diffs)} diferencias, reconstruido ({n} filas)")
+        elif diffs:
+            drift += len(diffs)
+    if drift:
+        raise click.ClickException(f"{drift} diferencias en gastos_rollup")
+    click.echo("gastos_rollup OK")
+
+
+@rollup_cli.command("rebuild")
+@click.option("--user-id", type=int, default=None)
+def rollup_rebuild(user_id):
+    """Recompute gastos_rollup from gastos."""
+    import rollup
+
+    for path, conn in _source_conns():
+        n = rollup.rebuild(conn, user_id)
+        click.echo(f"{path}: {n} filas")
+
+
+@click.group("gastos")
+def gastos_cli():
+    """gastos maintenance."""
+
+
+@gastos_cli.command("dedupe")
+@click.option("--user-id", type=int, default=None)
+@click.option("--fix", is_flag=True, help="Fusiona los duplicados (si no, solo los lista).")
+@click.option("--chunk", type=int, default=None, help="Gastos por bloque (DEDUPE_CHUNK_ROWS).")
+def gastos_dedupe(user_id, fix, chunk):
+    """Find duplicated gastos (same fingerprint); exit 1 if any (unless --fix)."""
+    import dedupe
+
+    found = 0
+    for path, conn in _source_conns():
+        stats = dedupe.sweep(conn, user_id, fix=fix, chunk_rows=chunk)
+        for d in stats["examples"]:
+            click.echo(f"{path}: id {d['id']} repite id {d['keep_id']} (user {d['user_id']}, {d['fecha']}, {d['nota']!r})")
+        msg = f"{path}: {stats['duplicates']} duplicados en {stats['groups']} grupos ({stats['chunks']} bloques)"
+        if fix:
+            msg += f", {stats['deleted']} borrados"
+        else:
+            found += stats["duplicates"]
+        click.echo(msg)
+    if found:
+        raise click.ClickException(f"{found} gastos duplicados (--fix para fusionarlos)")
+
+
+def register_commands(app):
+    app.cli.add_command(shards_cli)
+    app.cli.add_command(replicate)
+    app.cli.add_command(backup_cli)
+    app.cli.add_command(rollup_cli)
+    app.cli.add_command(gastos_cli)
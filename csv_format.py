@@ -0,0 +1,175 @@
+"""
+Per-file format of a bank CSV export, decided once from a sample.
+
+- Delimiter: the first of , ; TAB | whose header has date, description and
+  amount columns (Spanish banks export "Fecha;Concepto;Importe").
+- Date format: the one of DATE_FORMATS that most sampled dates match,
+  ties going to the earlier one (day-first before month-first: 03/04/2026
+  is 3 April unless rows like 04/13/2026 only fit month-first).
+- Decimal/thousands: voted over the sampled amounts; "1.234,56" and
+  "-12,5" vote for ",", "1,234.56" and "-12.5" for ".". Values like
+  "1.234" are ambiguous and don't vote.
+
+The rows are then parsed with fixed parsers (one regex per date, two
+replaces per amount) instead of trying every format on every row.
+"""
+
+import csv
+import os
+import re
+from datetime import date, datetime
+
+CSV_SNIFF_LINES = int(os.environ.get("CSV_SNIFF_LINES", "50"))
+
+DELIMITERS = [",", ";", "\t", "|"]
+
+DATE_COLUMNS = ["date", "fecha", "fecha_transaccion", "transaction_date", "datum", "fecha valor", "fecha operacion"]
+DESC_COLUMNS = ["description", "descripcion", "concepto", "concept", "memo", "nota"]
+AMOUNT_COLUMNS = ["amount", "importe", "monto", "cantidad", "value", "valor"]
+
+# (formato strptime, regex equivalente, orden de los grupos)
+DATE_FORMATS = [
+    ("%Y-%m-%d", r"(\d{4})-(\d{1,2})-(\d{1,2})", "ymd"),   # 2026-01-30
+    ("%d/%m/%Y", r"(\d{1,2})/(\d{1,2})/(\d{4})", "dmy"),   # 30/01/2026
+    ("%d-%m-%Y", r"(\d{1,2})-(\d{1,2})-(\d{4})", "dmy"),   # 30-01-2026
+    ("%m/%d/%Y", r"(\d{1,2})/(\d{1,2})/(\d{4})", "mdy"),   # 01/30/2026 (US)
+    ("%Y/%m/%d", r"(\d{4})/(\d{1,2})/(\d{1,2})", "ymd"),   # 2026/01/30
+    ("%d.%m.%Y", r"(\d{1,2})\.(\d{1,2})\.(\d{4})", "dmy"),  # 30.01.2026
+    ("%Y%m%d", r"(\d{4})(\d{2})(\d{2})", "ymd"),           # 20260130
+]
+
+_AMOUNT_CLEAN_RE = re.compile(r"[\s€$£]")
+# 1.234 / 1,234: separador de miles o decimal con 3 cifras, no se sabe
+_AMBIGUOUS_RE = re.compile(r"[-+]?\d{1,3}([.,])\d{3}")
+
+
+def _find_column(fieldnames, candidates):
+    lower = {(name or "").strip().lower(): name for name in fieldnames}
+    for candidate in candidates:
+        if candidate in lower:
+            return lower[candidate]
+    return None
+
+
+def resolve_columns(fieldnames) -> dict:
+    """
+    {"date", "description", "amount"} -> header name (None if missing).
+    """
+    return {
+        "date": _find_column(fieldnames, DATE_COLUMNS),
+        "description": _find_column(fieldnames, DESC_COLUMNS),
+        "amount": _find_column(fieldnames, AMOUNT_COLUMNS),
+    }
+
+
+def date_parser(fmt: str):
+    """
+    Fixed parser for one of DATE_FORMATS: str -> "YYYY-MM-DD" or None.
+    """
+    _fmt, pattern, order = next(f for f in DATE_FORMATS if f[0] == fmt)
+    match = re.compile(pattern).fullmatch
+    iy, im, id_ = order.index("y") + 1, order.index("m") + 1, order.index("d") + 1
+
+    def parse(value: str):
+        m = match(value.strip())
+        if m is None:
+            return None
+        try:
+            return date(int(m.group(iy)), int(m.group(im)), int(m.group(id_))).isoformat()
+        except ValueError:
+            return None
+
+    return parse
+
+
+def amount_parser(decimal: str, thousands: str):
+    """
+    Fixed normalizer for amounts: "1.234,56" -> "1234.56" (then money.to_cents).
+    """
+    def parse(value: str) -> str:
+        return _AMOUNT_CLEAN_RE.sub("", value).replace(thousands, "").replace(decimal, ".")
+
+    return parse
+
+
+def _sniff_date_format(values):
+    values = [v for v in values if v]
+    best, best_hits = None, 0
+    for fmt, _pattern, _order in DATE_FORMATS:
+        parse = date_parser(fmt)
+        hits = sum(1 for v in values if parse(v))
+        # Empate: el primero de la lista (día antes que mes)
+        if hits > best_hits:
+            best, best_hits = fmt, hits
+    return best
+
+
+def _decimal_vote(value: str):
+    v = _AMOUNT_CLEAN_RE.sub("", value)
+    has_comma, has_dot = "," in v, "." in v
+    if has_comma and has_dot:
+        return "," if v.rfind(",") > v.rfind(".") else "."
+    if not (has_comma or has_dot) or _AMBIGUOUS_RE.fullmatch(v):
+        return None
+    if v.count("," if has_comma else ".") > 1:
+        # 1.234.567: solo puede ser separador de miles
+        return "." if has_comma else ","
+    return "," if has_comma else "."
+
+
+def _sniff_decimal(values) -> str:
+    votes = {",": 0, ".": 0}
+    for v in values:
+        vote = _decimal_vote(v)
+        if vote:
+            votes[vote] += 1
+    if votes[","] != votes["."]:
+        return "," if votes[","] > votes["."] else "."
+    # Sin votos: coma decimal si aparece alguna (como el parser anterior)
+    return "," if any("," in v for v in values) else "."
+
+
+def sniff(sample_lines: list) -> dict:
+    """
+    Format of a CSV from its first lines (header included):
+    {delimiter, date_format, decimal, thousands, columns}. date_format is
+    None when no sampled date fits any format; columns has None for the
+    missing ones.
+    """
+    header = sample_lines[0] if sample_lines else ""
+    delimiter = DELIMITERS[0]
+    for candidate in DELIMITERS:
+        fields = next(csv.reader([header], delimiter=candidate), [])
+        if all(resolve_columns(fields).values()):
+            delimiter = candidate
+            break
+
+    reader = csv.DictReader(sample_lines, delimiter=delimiter)
+    columns = resolve_columns(reader.fieldnames or [])
+    dates, amounts = [], []
+    if all(columns.values()):
+        for row in reader:
+            dates.append((row.get(columns["date"]) or "").strip())
+            amounts.append((row.get(columns["amount"]) or "").strip())
+
+    decimal = _sniff_decimal([a for a in amounts if a])
+    return {
+        "delimiter": delimiter,
+        "date_format": _sniff_date_format(dates),
+        "decimal": decimal,
+        "thousands": "." if decimal == "," else ",",
+        "columns": columns,
+    }
+
+
+def parse_date(date_str: str) -> str:
+    """
+    Any of DATE_FORMATS -> YYYY-MM-DD (None if none fits). For single
+    values; files use the sniffed format.
+    """
+    for fmt, _pattern, _order in DATE_FORMATS:
+        try:
+            return datetime.strptime(date_str.strip(), fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
@@ -1,7 +1,15 @@
 import os
+import queue
 import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+from functools import wraps
 from pathlib import Path
-from flask import g
+from flask import g, has_app_context, has_request_context, request
+
+import sql_metrics
 
 # -----------------------------------------------------------------------------
 # DB PATH strategy:
@@ -14,6 +22,95 @@ DEFAULT_LOCAL_DB = BASE_DIR / "data" / "gastos.db"
 
 DB_PATH = os.environ.get("DB_PATH") or str(DEFAULT_LOCAL_DB)
 
+# Lecturas: por defecto el mismo fichero; puede apuntar a una réplica
+READ_DB_PATH = os.environ.get("READ_DB_PATH") or DB_PATH
+READ_ROUTING = os.environ.get("DB_READ_ROUTING", "1").strip() not in ("0", "false", "no")
+READ_METHODS = ("GET", "HEAD")
+
+# Replicación (ver replication.py):
+# - DB_ROLE=primary: BD normal; si REPLICA_DIR está definido se envían snapshots allí
+# - DB_ROLE=replica: lecturas desde la copia en REPLICA_DIR, escrituras a PRIMARY_URL
+DB_ROLE = os.environ.get("DB_ROLE", "primary").strip().lower()
+REPLICA_DIR = os.environ.get("REPLICA_DIR", "")
+PRIMARY_URL = os.environ.get("PRIMARY_URL", "")
+
+# -----------------------------------------------------------------------------
+# Connection pool + pragma profile
+# - Each gunicorn worker keeps a small pool of warm connections per DB file.
+# - Every new connection gets the pragma profile below (overridable via env).
+# -----------------------------------------------------------------------------
+
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "4"))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "5"))
+
+PRAGMA_PROFILE = {
+    "journal_mode": os.environ.get("DB_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("DB_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.environ.get("DB_CACHE_SIZE", "-16000")),       # KiB si es negativo
+    "mmap_size": int(os.environ.get("DB_MMAP_SIZE", str(64 * 1024 * 1024))),
+    "temp_store": os.environ.get("DB_TEMP_STORE", "MEMORY"),
+    "busy_timeout": int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000")),
+}
+
+# Conexiones de solo lectura: sin journal_mode/synchronous (no pueden escribir)
+READONLY_PRAGMA_PROFILE = {
+    "cache_size": PRAGMA_PROFILE["cache_size"],
+    "mmap_size": PRAGMA_PROFILE["mmap_size"],
+    "temp_store": PRAGMA_PROFILE["temp_store"],
+    "busy_timeout": PRAGMA_PROFILE["busy_timeout"],
+    "query_only": 1,
+}
+
+# -----------------------------------------------------------------------------
+# Write path:
+# - "direct": db_exec ejecuta y hace commit en la conexión del request (default)
+# - "group":  db_exec se encola en un único writer por proceso que agrupa
+#             escrituras concurrentes en un solo commit (group commit)
+#
+# El writer es por proceso: solo agrupa si el proceso atiende varios requests
+# a la vez (gunicorn --threads N). Con los workers sync del Dockerfile cada
+# lote es de 1 escritura y el writer no espera ventana alguna; entre procesos
+# sigue mandando busy_timeout. Solo compensa si el commit es caro
+# (DB_SYNCHRONOUS=FULL): con WAL + NORMAL un commit apenas cuesta y "direct"
+# es más rápido. Medir con bench/bench_group_commit.py.
+# -----------------------------------------------------------------------------
+
+WRITE_MODE = os.environ.get("DB_WRITE_MODE", "direct").strip().lower()
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get("DB_GROUP_COMMIT_MAX_BATCH", "64"))
+GROUP_COMMIT_WINDOW_MS = float(os.environ.get("DB_GROUP_COMMIT_WINDOW_MS", "2"))
+
+# -----------------------------------------------------------------------------
+# Presupuestos de tiempo por endpoint (ms) para las lecturas.
+# Se aplican con el progress handler de SQLite: al agotarse, la sentencia
+# se interrumpe y el endpoint devuelve un resultado degradado.
+# Override: QUERY_BUDGET_<NOMBRE>_MS (p. ej. QUERY_BUDGET_SUGERIR_MS=500)
+# -----------------------------------------------------------------------------
+
+PROGRESS_STEPS = int(os.environ.get("DB_PROGRESS_STEPS", "1000"))  # instrucciones VM entre checks
+
+_DEFAULT_BUDGETS_MS = {
+    "gastos": 2000,
+    "resumen": 2000,
+    "sugerir": 300,
+    "sugerir_nota": 200,
+}
+QUERY_BUDGETS_MS = {
+    name: float(os.environ.get(f"QUERY_BUDGET_{name.upper()}_MS", default))
+    for name, default in _DEFAULT_BUDGETS_MS.items()
+}
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """
+    Raised when no pooled connection becomes available within the timeout.
+    """
+
+
+class QueryTimeout(sqlite3.OperationalError):
+    """
+    Raised when a read is interrupted because the endpoint's budget ran out.
+    """
+
 
 def _ensure_db_dir_exists(db_path: str) -> None:
     """
@@ -24,6 +121,416 @@ def _ensure_db_dir_exists(db_path: str) -> None:
     parent.mkdir(parents=True, exist_ok=True)
 
 
+def apply_pragmas(conn: sqlite3.Connection, pragmas: dict) -> None:
+    """
+    Apply a pragma profile to a connection.
+    Unknown / unsupported pragmas are ignored by SQLite itself.
+    """
+    for name, value in pragmas.items():
+        if value is None or value == "":
+            continue
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections for one DB file.
+
+    - acquire() reuses an idle connection or opens a new one while below max_size;
+      otherwise waits up to `timeout` seconds for a release.
+    - release() rolls back any open transaction and returns the connection.
+    - After a fork (gunicorn workers) the inherited connections are dropped.
+    - readonly=True opens the file with mode=ro and PRAGMA query_only.
+    - watch_file=True recycles the connections when the file at db_path is
+      replaced (e.g. a replica snapshot renamed into place).
+    """
+
+    def __init__(self, db_path: str, max_size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 pragmas: dict = None, readonly: bool = False, watch_file: bool = False):
+        self.db_path = db_path
+        self.max_size = max(1, int(max_size))
+        self.timeout = timeout
+        self.readonly = readonly
+        self.watch_file = watch_file
+        default_pragmas = READONLY_PRAGMA_PROFILE if readonly else PRAGMA_PROFILE
+        self.pragmas = dict(default_pragmas if pragmas is None else pragmas)
+
+        self._cond = threading.Condition()
+        self._idle = []
+        self._open = 0
+        self._pid = os.getpid()
+        self._file_id = None
+        self._generation = 0
+        self._conn_gen = {}
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_ms": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "recycled": 0,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        busy_ms = int(self.pragmas.get("busy_timeout") or 0)
+        if self.readonly:
+            uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=busy_ms / 1000.0, check_same_thread=False)
+        else:
+            _ensure_db_dir_exists(self.db_path)
+            conn = sqlite3.connect(self.db_path, timeout=busy_ms / 1000.0, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        apply_pragmas(conn, self.pragmas)
+        return conn
+
+    def _check_fork(self) -> None:
+        # Las conexiones heredadas del proceso padre no deben usarse en el hijo
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._idle = []
+            self._open = 0
+            self._conn_gen = {}
+
+    def _check_file(self) -> list:
+        """
+        If the DB file was replaced, start a new generation and return the
+        idle connections of the old one (to be closed by the caller).
+        """
+        try:
+            st = os.stat(self.db_path)
+            file_id = (st.st_dev, st.st_ino)
+        except OSError:
+            file_id = None
+        if file_id == self._file_id:
+            return []
+        first = self._file_id is None and not self._conn_gen
+        self._file_id = file_id
+        if first:
+            return []
+        self._generation += 1
+        stale, self._idle = self._idle, []
+        self._open -= len(stale)
+        self._stats["recycled"] += len(stale)
+        for conn in stale:
+            self._conn_gen.pop(id(conn), None)
+        return stale
+
+    def acquire(self) -> sqlite3.Connection:
+        stale = []
+        with self._cond:
+            self._check_fork()
+            self._stats["checkouts"] += 1
+            if self.watch_file:
+                stale = self._check_file()
+        for old in stale:
+            try:
+                old.close()
+            except sqlite3.Error:
+                pass
+
+        with self._cond:
+            t0 = None
+            while not self._idle and self._open >= self.max_size:
+                if t0 is None:
+                    self._stats["waits"] += 1
+                    t0 = time.perf_counter()
+                remaining = t0 + self.timeout - time.perf_counter()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    self._stats["wait_ms"] += (time.perf_counter() - t0) * 1000
+                    raise PoolTimeout(f"connection pool exhausted for {self.db_path}")
+                self._cond.wait(remaining)
+            if t0 is not None:
+                self._stats["wait_ms"] += (time.perf_counter() - t0) * 1000
+
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
+
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["created"] += 1
+            self._conn_gen[id(conn)] = self._generation
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        healthy = True
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            healthy = False
+
+        with self._cond:
+            if os.getpid() != self._pid:
+                return
+            # Conexión a un fichero ya reemplazado: no vuelve al pool
+            stale = self._conn_gen.get(id(conn), self._generation) != self._generation
+            if healthy and not stale:
+                self._idle.append(conn)
+            else:
+                self._open -= 1
+                self._conn_gen.pop(id(conn), None)
+                self._stats["recycled" if stale else "discarded"] += 1
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._cond.notify()
+
+    def close_all(self) -> None:
+        """
+        Close idle connections (checked-out ones go back to the pool on release).
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            for conn in idle:
+                self._conn_gen.pop(id(conn), None)
+        for conn in idle:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> dict:
+        with self._cond:
+            out = dict(self._stats)
+            out["wait_ms"] = round(out["wait_ms"], 3)
+            out["open"] = self._open
+            out["idle"] = len(self._idle)
+            out["in_use"] = self._open - len(self._idle)
+            out["max_size"] = self.max_size
+            return out
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str = None, readonly: bool = False) -> ConnectionPool:
+    """
+    Returns the process-wide pool for a DB file (created lazily).
+    Read-only and read-write connections live in separate pools.
+    """
+    path = db_path or DB_PATH
+    key = (path, readonly)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            # Las lecturas vigilan el fichero: una réplica se reemplaza con rename
+            pool = _pools[key] = ConnectionPool(path, readonly=readonly, watch_file=readonly)
+        return pool
+
+
+def pool_stats() -> dict:
+    """
+    Stats of every pool in this process, keyed by DB path (+ ":ro").
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {(path + ":ro" if ro else path): pool.stats() for (path, ro), pool in pools}
+
+
+def close_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+# Resultado de una escritura encolada (subset compatible con sqlite3.Cursor)
+WriteResult = namedtuple("WriteResult", ["lastrowid", "rowcount"])
+
+
+class GroupCommitWriter:
+    """
+    Single writer thread that owns one connection and batches queued writes.
+
+    - Waits for the first write, then collects the writes other threads
+      have in flight, for up to `window_ms` or `max_batch` writes. When
+      nobody else is writing (e.g. sync workers: one request per process)
+      it commits straight away, so a lone write pays no window.
+    - Each write runs inside its own SAVEPOINT, so a failing statement only
+      fails its own caller; the rest of the batch is committed together.
+    - submit() blocks until the batch containing the write is committed and
+      returns a WriteResult (or raises the statement's exception).
+
+    The writer is per process: with several gunicorn workers, cross-process
+    contention is still resolved by busy_timeout, but each worker takes the
+    write lock once per batch instead of once per row. Batches only grow
+    past 1 with threaded workers (gthread).
+    """
+
+    def __init__(self, db_path: str, max_batch: int = GROUP_COMMIT_MAX_BATCH,
+                 window_ms: float = GROUP_COMMIT_WINDOW_MS, pragmas: dict = None):
+        self.db_path = db_path
+        self.max_batch = max(1, int(max_batch))
+        self.window = max(0.0, float(window_ms)) / 1000.0
+        self.pragmas = dict(PRAGMA_PROFILE if pragmas is None else pragmas)
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._inflight = 0  # submit() esperando resultado
+        self._stats = {
+            "writes": 0,
+            "errors": 0,
+            "batches": 0,
+            "max_batch": 0,
+            "commit_ms_total": 0.0,
+            "commit_ms_max": 0.0,
+            "window_skips": 0,
+        }
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            # Tras un fork el hilo del padre no existe en el hijo
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="db-group-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, sql: str, params=()) -> WriteResult:
+        self._ensure_thread()
+        fut = Future()
+        with self._lock:
+            self._inflight += 1
+        try:
+            self._queue.put((sql, params, fut))
+            return fut.result()
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+    def _connect(self) -> sqlite3.Connection:
+        _ensure_db_dir_exists(self.db_path)
+        busy_ms = int(self.pragmas.get("busy_timeout") or 0)
+        conn = sqlite3.connect(self.db_path, timeout=busy_ms / 1000.0,
+                               check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        apply_pragmas(conn, self.pragmas)
+        # Un shard nuevo lo crea esta conexión: aplicar el esquema antes de escribir
+        _ensure_migrated(self.db_path, conn)
+        return conn
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            with self._lock:
+                if len(batch) >= self._inflight:
+                    # Nadie más está escribiendo: esperar la ventana solo añadiría latencia
+                    self._stats["window_skips"] += 1
+                    break
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        conn = None
+        while True:
+            batch = self._collect()
+            try:
+                if conn is None:
+                    conn = self._connect()
+                self._run_batch(conn, batch)
+            except Exception as e:
+                # Fallo a nivel de lote (BEGIN/COMMIT): todos los pendientes fallan
+                for _, _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                try:
+                    if conn is not None and conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    conn = None
+
+    def _run_batch(self, conn: sqlite3.Connection, batch: list) -> None:
+        results = []
+        conn.execute("BEGIN IMMEDIATE")
+        for sql, params, fut in batch:
+            conn.execute("SAVEPOINT gc_write")
+            try:
+                cur = conn.execute(sql, params)
+                results.append((fut, WriteResult(cur.lastrowid, cur.rowcount), None))
+                conn.execute("RELEASE gc_write")
+            except Exception as e:
+                conn.execute("ROLLBACK TO gc_write")
+                conn.execute("RELEASE gc_write")
+                results.append((fut, None, e))
+
+        t0 = time.perf_counter()
+        conn.execute("COMMIT")
+        commit_ms = (time.perf_counter() - t0) * 1000
+
+        errors = sum(1 for _, _, err in results if err is not None)
+        with self._lock:
+            st = self._stats
+            st["batches"] += 1
+            st["writes"] += len(batch)
+            st["errors"] += errors
+            st["max_batch"] = max(st["max_batch"], len(batch))
+            st["commit_ms_total"] += commit_ms
+            st["commit_ms_max"] = max(st["commit_ms_max"], commit_ms)
+
+        for fut, res, err in results:
+            if err is not None:
+                fut.set_exception(err)
+            else:
+                fut.set_result(res)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+        batches = out["batches"] or 1
+        out["avg_batch"] = round(out["writes"] / batches, 3) if out["batches"] else 0
+        out["avg_commit_ms"] = round(out["commit_ms_total"] / batches, 3) if out["batches"] else 0
+        out["commit_ms_total"] = round(out["commit_ms_total"], 3)
+        out["commit_ms_max"] = round(out["commit_ms_max"], 3)
+        out["queued"] = self._queue.qsize()
+        return out
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(db_path: str = None) -> GroupCommitWriter:
+    """
+    Returns the process-wide group-commit writer for a DB file.
+    """
+    path = db_path or DB_PATH
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = _writers[path] = GroupCommitWriter(path)
+        return writer
+
+
+def writer_stats() -> dict:
+    with _writers_lock:
+        writers = list(_writers.items())
+    return {path: w.stats() for path, w in writers}
+
+
 def init_db(db_path=None):
     """
     Initializes the database file and directory.
@@ -37,51 +544,282 @@ def init_db(db_path=None):
     con.close()
 
 
-def get_db() -> sqlite3.Connection:
+# -----------------------------------------------------------------------------
+# Sharding por usuario (opcional):
+# - "none": todo en DB_PATH (default)
+# - "user": un fichero por usuario en DB_SHARD_DIR (user_<id>.db)
+# - "hash": DB_SHARD_BUCKETS ficheros; cada usuario va a user_id % N
+# DB_PATH sigue siendo el directorio global (tabla users).
+# -----------------------------------------------------------------------------
+
+SHARD_MODE = os.environ.get("DB_SHARD_MODE", "none").strip().lower()
+SHARD_BUCKETS = int(os.environ.get("DB_SHARD_BUCKETS", "16"))
+SHARD_DIR = os.environ.get("DB_SHARD_DIR") or str(Path(DB_PATH).parent / "shards")
+
+_migrated_paths = set()
+_migrated_lock = threading.Lock()
+
+
+def shard_path(user_id=None) -> str:
+    """
+    DB file holding the gastos of `user_id` (DB_PATH when not sharded).
+    """
+    if user_id is None or SHARD_MODE in ("", "none"):
+        return DB_PATH
+    uid = int(user_id)
+    if SHARD_MODE == "user":
+        return str(Path(SHARD_DIR) / f"user_{uid}.db")
+    if SHARD_MODE == "hash":
+        return str(Path(SHARD_DIR) / f"bucket_{uid % max(1, SHARD_BUCKETS):03d}.db")
+    raise ValueError(f"DB_SHARD_MODE desconocido: {SHARD_MODE}")
+
+
+def _ensure_migrated(path: str, conn: sqlite3.Connection, readonly: bool = False) -> None:
+    """
+    Shards are created on demand: bring them to SCHEMA_VERSION the first
+    time this process touches them. A read-only connection can't migrate,
+    so a shard that is behind is migrated through a short-lived rw one
+    (on a replica the primary already shipped a migrated copy).
+    """
+    if path == DB_PATH or path in _migrated_paths:
+        return
+    import schema
+    with _migrated_lock:
+        if path in _migrated_paths:
+            return
+        if not readonly:
+            schema.migrate(conn, shard=True)
+        elif DB_ROLE != "replica" and schema.get_version(conn) < schema.SCHEMA_VERSION:
+            rw = sqlite3.connect(path, timeout=POOL_TIMEOUT)
+            try:
+                schema.migrate(rw, shard=True)
+            finally:
+                rw.close()
+        _migrated_paths.add(path)
+
+
+def _checkout(path: str, readonly: bool) -> sqlite3.Connection:
+    """
+    Per-request connection for (path, readonly), kept in flask.g until close_db.
+    """
+    conns = g.setdefault("db_conns", {})
+    key = (path, readonly)
+    if key not in conns:
+        pool = get_pool(path, readonly=readonly)
+        conn = pool.acquire()
+        conns[key] = (conn, pool)
+        try:
+            _ensure_migrated(path, conn, readonly=readonly)
+        except Exception:
+            del conns[key]
+            pool.release(conn)
+            raise
+    return conns[key][0]
+
+
+def get_db(user_id=None) -> sqlite3.Connection:
+    """
+    Returns a per-request SQLite connection stored in flask.g,
+    checked out from the pool. With sharding enabled, `user_id`
+    selects that user's shard; without it, the global DB.
+    On a replica there is nothing writable: returns the read-only copy.
+    """
+    if DB_ROLE == "replica":
+        return _checkout(read_path(user_id), readonly=True)
+    return _checkout(shard_path(user_id), readonly=False)
+
+
+def replica_path(path: str, replica_dir: str = None) -> str:
+    """
+    Location of `path` (DB_PATH or a shard) inside REPLICA_DIR,
+    keeping its position relative to DB_PATH's directory.
+    """
+    base = Path(DB_PATH).resolve().parent
+    p = Path(path).resolve()
+    try:
+        rel = p.relative_to(base)
+    except ValueError:
+        rel = Path(p.name)
+    return str(Path(replica_dir or REPLICA_DIR) / rel)
+
+
+def read_path(user_id=None) -> str:
+    if DB_ROLE == "replica":
+        return replica_path(shard_path(user_id))
+    if user_id is None or SHARD_MODE in ("", "none"):
+        return READ_DB_PATH
+    return shard_path(user_id)
+
+
+def get_read_db(user_id=None) -> sqlite3.Connection:
+    """
+    Returns a per-request read-only connection (mode=ro + query_only)
+    on READ_DB_PATH (or the user's shard). If the file can't be opened
+    read-only yet (e.g. fresh install), falls back to the read-write one.
+    A shard that doesn't exist yet is NOT created by a read: the user has
+    no gastos, so an empty in-memory shard is returned instead.
+    """
+    path = read_path(user_id)
+    if path != READ_DB_PATH and path != DB_PATH and not os.path.exists(path):
+        return _empty_shard()
+    try:
+        return _checkout(path, readonly=True)
+    except PoolTimeout:
+        raise
+    except sqlite3.OperationalError:
+        return get_db(user_id)
+
+
+def _empty_shard() -> sqlite3.Connection:
     """
-    Returns a per-request SQLite connection stored in flask.g.
+    Per-request in-memory DB with the shard schema and no rows
+    (closed by close_db like the pooled ones).
     """
-    if "db" not in g:
-        _ensure_db_dir_exists(DB_PATH)
-        g.db = sqlite3.connect(DB_PATH, check_same_thread=False)
-        g.db.row_factory = sqlite3.Row
-    return g.db
+    conns = g.setdefault("db_conns", {})
+    key = (":empty-shard:", True)
+    if key not in conns:
+        import schema
+        conn = sqlite3.connect(":memory:")
+        conn.row_factory = sqlite3.Row
+        schema.migrate(conn, shard=True)
+        conn.execute("PRAGMA query_only = 1")
+        conns[key] = (conn, None)
+    return conns[key][0]
+
+
+def _read_conn(user_id=None) -> sqlite3.Connection:
+    """
+    Connection for a pure read: read-only one for GET/HEAD requests,
+    the regular per-request connection otherwise.
+    """
+    if READ_ROUTING and has_request_context() and request.method in READ_METHODS:
+        return get_read_db(user_id)
+    return get_db(user_id)
 
 
 def close_db(e=None) -> None:
     """
-    Closes DB connection at the end of the request.
+    Returns the DB connections to their pools at the end of the request.
     """
-    db = g.pop("db", None)
-    if db is not None:
-        db.close()
+    conns = g.pop("db_conns", None) or {}
+    for conn, pool in conns.values():
+        if pool is None:
+            conn.close()
+        else:
+            pool.release(conn)
 
 
-def db_exec(sql: str, params=()):
+def _timed(conn, sql: str, params, fetch, interruptible: bool = False):
     """
-    Execute INSERT / UPDATE / CREATE and commit.
+    Run a statement and report timing / row count to sql_metrics.
+    If `interruptible` and a query budget is active (see query_budget),
+    the statement is aborted once the deadline passes.
     """
-    db = get_db()
-    cur = db.execute(sql, params)
-    db.commit()
-    return cur
+    deadline = None
+    if interruptible and has_app_context():
+        deadline = g.get("query_deadline")
 
+    t0 = time.perf_counter()
+    if deadline is not None:
+        conn.set_progress_handler(lambda: 1 if time.perf_counter() > deadline else 0, PROGRESS_STEPS)
+    try:
+        cur = conn.execute(sql, params)
+        result, nrows = fetch(cur)
+    except sqlite3.OperationalError as e:
+        if deadline is not None and time.perf_counter() > deadline:
+            raise QueryTimeout(f"query budget exceeded: {e}") from e
+        raise
+    finally:
+        if deadline is not None:
+            conn.set_progress_handler(None, 0)
 
-def db_one(sql: str, params=()):
+    sql_metrics.observe(conn, sql, params, (time.perf_counter() - t0) * 1000, nrows)
+    return result
+
+
+_deadline_lock = threading.Lock()
+_deadline_aborts = {}
+
+
+def query_budget(name: str, on_timeout):
     """
-    Fetch one row.
+    Decorator for read endpoints: gives all db_one/db_all reads of the
+    request a shared time budget QUERY_BUDGETS_MS[name]. When it runs out
+    the statement is interrupted, the abort is counted, and the view
+    returns on_timeout() instead (degraded result / 503).
     """
-    cur = get_db().execute(sql, params)
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            budget_ms = QUERY_BUDGETS_MS.get(name)
+            if not budget_ms or budget_ms <= 0:
+                return view(*args, **kwargs)
+
+            g.query_deadline = time.perf_counter() + budget_ms / 1000.0
+            try:
+                return view(*args, **kwargs)
+            except QueryTimeout:
+                with _deadline_lock:
+                    _deadline_aborts[name] = _deadline_aborts.get(name, 0) + 1
+                return on_timeout()
+            finally:
+                g.pop("query_deadline", None)
+        return wrapped
+    return decorator
+
+
+def deadline_stats() -> dict:
+    with _deadline_lock:
+        aborts = dict(_deadline_aborts)
+    return {
+        name: {"budget_ms": budget, "aborts": aborts.get(name, 0)}
+        for name, budget in QUERY_BUDGETS_MS.items()
+    }
+
+
+def db_exec(sql: str, params=(), user_id=None):
+    """
+    Execute INSERT / UPDATE / CREATE and commit.
+    With DB_WRITE_MODE=group the statement goes through the group-commit
+    writer and a WriteResult (lastrowid, rowcount) is returned instead.
+    `user_id` routes the statement to that user's shard (if sharding).
+    """
+    if WRITE_MODE == "group":
+        t0 = time.perf_counter()
+        res = get_writer(shard_path(user_id)).submit(sql, params)
+        sql_metrics.observe(None, sql, params, (time.perf_counter() - t0) * 1000, res.rowcount)
+        return res
+
+    db = get_db(user_id)
+
+    def _commit(cur):
+        db.commit()
+        return cur, cur.rowcount
+
+    return _timed(db, sql, params, _commit)
+
+
+def _fetch_one(cur):
     row = cur.fetchone()
     cur.close()
-    return row
+    return row, (1 if row is not None else 0)
 
 
-def db_all(sql: str, params=()):
+def _fetch_all(cur):
+    rows = cur.fetchall()
+    cur.close()
+    return rows, len(rows)
+
+
+def db_one(sql: str, params=(), user_id=None):
+    """
+    Fetch one row.
+    """
+    return _timed(_read_conn(user_id), sql, params, _fetch_one, interruptible=True)
+
+
+def db_all(sql: str, params=(), user_id=None):
     """
     Fetch all rows.
     """
-    cur = get_db().execute(sql, params)
-    rows = cur.fetchall()
-    cur.close()
-    return rows
+    return _timed(_read_conn(user_id), sql, params, _fetch_all, interruptible=True)
@@ -0,0 +1,125 @@
+"""
+Duplicated gastos already in the table: same user and fingerprint
+(schema.fingerprint_sql), e.g. imported before idx_gastos_user_fingerprint
+existed (they were left without fingerprint by migration 8) or repeated by
+hand. Found with a window function over chunks of DEDUPE_CHUNK_ROWS
+gastos in (user_id, fecha) order (duplicates share both, so a chunk never
+splits a group) and merged into the oldest row of each group.
+"""
+
+import os
+import sqlite3
+
+import schema
+
+DEDUPE_CHUNK_ROWS = int(os.environ.get("DEDUPE_CHUNK_ROWS", "5000"))
+
+# Límite superior del siguiente bloque: la clave (user_id, fecha) chunk_rows filas más allá
+_NEXT_BOUND_SQL = """
+    SELECT user_id, fecha FROM gastos INDEXED BY idx_gastos_user_fecha
+    WHERE user_id IS NOT NULL AND (user_id, fecha) {lo_op} (?, ?)
+    ORDER BY user_id, fecha
+    LIMIT 1 OFFSET ?
+"""
+
+_LAST_BOUND_SQL = """
+    SELECT user_id, fecha FROM gastos INDEXED BY idx_gastos_user_fecha
+    WHERE user_id IS NOT NULL {and_user}
+    ORDER BY user_id DESC, fecha DESC
+    LIMIT 1
+"""
+
+# Filas que repiten otra anterior (rn > 1) con la que se queda (keep_id, la más antigua)
+_DUPLICATES_SQL = f"""
+    SELECT id, keep_id, user_id, fecha, nota, categoria, concepto, keep_categoria
+    FROM (
+      SELECT id, user_id, fecha, nota,
+             COALESCE(categoria, '') AS categoria, COALESCE(concepto, '') AS concepto,
+             FIRST_VALUE(id) OVER w AS keep_id,
+             FIRST_VALUE(COALESCE(categoria, '')) OVER w AS keep_categoria,
+             ROW_NUMBER() OVER w AS rn
+      FROM gastos INDEXED BY idx_gastos_user_fecha
+      WHERE user_id IS NOT NULL AND (user_id, fecha) {{lo_op}} (?, ?) AND (user_id, fecha) <= (?, ?)
+      WINDOW w AS (PARTITION BY user_id, {schema.gasto_fingerprint_sql("gastos")} ORDER BY id)
+    )
+    WHERE rn > 1
+    ORDER BY keep_id, id
+"""
+
+
+def _user_filter(user_id):
+    if user_id is None:
+        return "", ()
+    return "AND user_id = ?", (int(user_id),)
+
+
+def _bounds(conn: sqlite3.Connection, user_id, chunk_rows: int):
+    """
+    (lo_op, lo, hi) per chunk: the gastos with lo <op> (user_id, fecha) <= hi.
+    The user filter is the range itself, so every chunk is an index range.
+    """
+    and_user, params = _user_filter(user_id)
+    last = conn.execute(_LAST_BOUND_SQL.format(and_user=and_user), params).fetchone()
+    if last is None:
+        return
+    last = tuple(last)
+    lo_op, lo = ">=", (-1 if user_id is None else int(user_id), "")
+    while True:
+        hi = conn.execute(
+            _NEXT_BOUND_SQL.format(lo_op=lo_op), (*lo, max(1, chunk_rows) - 1)
+        ).fetchone()
+        # Más allá del último gasto (del usuario): hasta ahí
+        hi = min(tuple(hi), last) if hi is not None else last
+        yield lo_op, lo, hi
+        if hi == last:
+            return
+        lo_op, lo = ">", hi
+
+
+def _duplicates(conn: sqlite3.Connection, lo_op: str, lo: tuple, hi: tuple) -> list:
+    rows = conn.execute(_DUPLICATES_SQL.format(lo_op=lo_op), (*lo, *hi)).fetchall()
+    keys = ("id", "keep_id", "user_id", "fecha", "nota", "categoria", "concepto", "keep_categoria")
+    return [dict(zip(keys, r)) for r in rows]
+
+
+def _merge(conn: sqlite3.Connection, dups: list) -> int:
+    # La que se queda hereda la categoría de un duplicado si no tenía
+    fills = {}
+    for d in dups:
+        if not d["keep_categoria"] and d["categoria"] and d["keep_id"] not in fills:
+            fills[d["keep_id"]] = (d["categoria"], d["concepto"], d["keep_id"])
+    conn.executemany("UPDATE gastos SET categoria = ?, concepto = ? WHERE id = ?", list(fills.values()))
+    return conn.executemany("DELETE FROM gastos WHERE id = ?", [(d["id"],) for d in dups]).rowcount
+
+
+def sweep(conn: sqlite3.Connection, user_id=None, fix: bool = False, chunk_rows: int = None) -> dict:
+    """
+    Find duplicated gastos (all users or one). With fix=True each chunk is
+    merged in its own transaction: the oldest row of every group keeps
+    its data (taking the categoria/concepto of a duplicate if it had
+    none) and the others are deleted; the triggers update rollup, notas,
+    FTS and pass the fingerprint on. Returns {chunks, groups, duplicates,
+    deleted, examples} (examples: the first 20 duplicates found).
+    """
+    chunk_rows = chunk_rows or DEDUPE_CHUNK_ROWS
+    if conn.in_transaction:
+        raise RuntimeError("dedupe.sweep() called with a transaction already open")
+
+    stats = {"chunks": 0, "groups": 0, "duplicates": 0, "deleted": 0, "examples": []}
+    for lo_op, lo, hi in _bounds(conn, user_id, chunk_rows):
+        stats["chunks"] += 1
+        if fix:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                dups = _duplicates(conn, lo_op, lo, hi)
+                stats["deleted"] += _merge(conn, dups)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        else:
+            dups = _duplicates(conn, lo_op, lo, hi)
+        stats["groups"] += len({d["keep_id"] for d in dups})
+        stats["duplicates"] += len(dups)
+        stats["examples"].extend(dups[:20 - len(stats["examples"])])
+    return stats
@@ -0,0 +1,143 @@
+"""
+Background CSV imports: POST /api/import/csv?async=1 answers 202 with a job
+id right away instead of importing inside the request.
+
+- The upload is saved to IMPORT_SPOOL_DIR/<job id>.csv and a row is added
+  to import_jobs (status queued).
+- A local thread pool (IMPORT_WORKERS threads per gunicorn worker) runs
+  the same pipeline as the synchronous import (import_csv.run_import)
+  inside an app context. After every chunk the counters are written to
+  the row, so GET /api/import/jobs/<id> reports progress.
+- Jobs don't survive a restart: one whose row hasn't been updated for
+  IMPORT_JOB_STALE_S is reported as failed (the chunks already committed
+  stay imported; importing the file again skips them as duplicates).
+"""
+
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from flask import current_app
+
+import db
+
+logger = logging.getLogger(__name__)
+
+SPOOL_DIR = os.environ.get("IMPORT_SPOOL_DIR") or str(Path(db.DB_PATH).parent / "imports")
+IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", "1"))
+JOB_STALE_S = float(os.environ.get("IMPORT_JOB_STALE_S", "600"))
+
+_JOB_COLUMNS = (
+    "id, status, filename, rows_done, imported, skipped, duplicates, error, "
+    "created_at, updated_at, finished_at, format"
+)
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    with _executor_lock:
+        # Tras un fork los hilos del padre no existen en el hijo
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=max(1, IMPORT_WORKERS), thread_name_prefix="csv-import")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _submit(fn, *args):
+    return _get_executor().submit(fn, *args)
+
+
+def spool_path(job_id: str) -> str:
+    return str(Path(SPOOL_DIR) / f"{job_id}.csv")
+
+
+def create_job(user_id: int, file_storage) -> str:
+    """
+    Save the upload, record the job and queue it. Returns the job id.
+    """
+    job_id = uuid.uuid4().hex
+    Path(SPOOL_DIR).mkdir(parents=True, exist_ok=True)
+    file_storage.save(spool_path(job_id))
+    now = _now()
+    db.db_exec(
+        "INSERT INTO import_jobs (id, user_id, status, filename, created_at, updated_at) "
+        "VALUES (?, ?, 'queued', ?, ?, ?)",
+        (job_id, user_id, file_storage.filename or "", now, now),
+    )
+    _submit(_run, current_app._get_current_object(), job_id, user_id)
+    return job_id
+
+
+def _update(job_id: str, **fields) -> None:
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    db.db_exec(
+        f"UPDATE import_jobs SET {cols}, updated_at = ? WHERE id = ?",
+        (*fields.values(), _now(), job_id),
+    )
+
+
+def _run(app, job_id: str, user_id: int) -> None:
+    from api_routes import import_csv
+
+    path = spool_path(job_id)
+    with app.app_context():
+        try:
+            _update(job_id, status="running")
+
+            def progress(counters):
+                _update(job_id, rows_done=counters["seen"], imported=counters["imported"],
+                        skipped=counters["skipped"], duplicates=counters["duplicates"])
+
+            with open(path, encoding="utf-8-sig", newline="") as fh:
+                counters = import_csv.run_import(user_id, fh, progress=progress)
+            if counters["imported"] > 0:
+                import_csv.mark_imported(user_id)
+            _update(job_id, status="done", finished_at=_now(), rows_done=counters["seen"],
+                    imported=counters["imported"], skipped=counters["skipped"],
+                    duplicates=counters["duplicates"], format=json.dumps(counters["format"]))
+        except UnicodeDecodeError:
+            _update(job_id, status="failed", finished_at=_now(),
+                    error="File encoding not supported. Use UTF-8.")
+        except Exception as e:
+            logger.exception("import job %s failed", job_id)
+            _update(job_id, status="failed", finished_at=_now(), error=f"Import failed: {e}")
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def get_job(job_id: str, user_id: int):
+    """
+    The job as a dict (only the owner's), or None.
+    """
+    row = db.db_one(
+        f"SELECT {_JOB_COLUMNS} FROM import_jobs WHERE id = ? AND user_id = ?",
+        (job_id, user_id),
+    )
+    if row is None:
+        return None
+    job = dict(row)
+    job["format"] = json.loads(job["format"]) if job["format"] else None
+    if job["status"] in ("queued", "running"):
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(job["updated_at"])
+        if age.total_seconds() > JOB_STALE_S:
+            # El worker que lo ejecutaba se reinició a medias
+            error = "Import interrupted (server restarted). Import the file again; rows already imported are skipped as duplicates."
+            _update(job_id, status="failed", finished_at=_now(), error=error)
+            job.update(status="failed", error=error)
+    return job
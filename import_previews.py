@@ -0,0 +1,113 @@
+"""
+Dry-run CSV imports: POST /api/import/csv?dry_run=1 parses, checks
+duplicates and categorizes on the server without writing to gastos, and
+keeps the result under a short-lived token; POST /api/import/csv/confirm
+with that token imports it without uploading or parsing the file again.
+
+- The preview is saved to IMPORT_SPOOL_DIR/preview-<token>.json (shared by
+  all gunicorn workers, like the import job spool) together with its
+  owner, and expires after IMPORT_PREVIEW_TTL_S.
+- A token is used once: confirm() claims the file by renaming it, so two
+  confirms of the same preview can't both import it.
+- Files over IMPORT_PREVIEW_MAX_ROWS transactions are not previewed (the
+  client imports them directly, ?async=1).
+"""
+
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from pathlib import Path
+
+import import_jobs
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_TTL_S = float(os.environ.get("IMPORT_PREVIEW_TTL_S", "900"))
+PREVIEW_MAX_ROWS = int(os.environ.get("IMPORT_PREVIEW_MAX_ROWS", "20000"))
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_-]{16,64}")
+
+
+def preview_path(token: str) -> Path:
+    return Path(import_jobs.SPOOL_DIR) / f"preview-{token}.json"
+
+
+def _sweep() -> None:
+    # Previews caducadas que nadie confirmó
+    cutoff = time.time() - PREVIEW_TTL_S
+    for path in Path(import_jobs.SPOOL_DIR).glob("preview-*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def save(user_id: int, fmt: dict, rows: list) -> str:
+    """
+    Store a preview (rows as [fecha, nota, importe_cents, categoria,
+    concepto]) and return its token.
+    """
+    token = secrets.token_urlsafe(24)
+    path = preview_path(token)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _sweep()
+    data = {"user_id": user_id, "created_at": time.time(), "format": fmt, "rows": rows}
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, ensure_ascii=False)
+    os.replace(tmp, path)
+    return token
+
+
+def claim(token: str, user_id: int):
+    """
+    Take the user's preview for `token` (once): its dict, or None if the
+    token is unknown, expired, already used or someone else's. Call
+    release() to give it back if the import fails.
+    """
+    if not isinstance(token, str) or not _TOKEN_RE.fullmatch(token):
+        return None
+    path = preview_path(token)
+    claimed = path.with_suffix(".claimed")
+    try:
+        os.rename(path, claimed)
+    except OSError:
+        return None
+    try:
+        with open(claimed, encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        discard(token)
+        return None
+    if data.get("user_id") != user_id:
+        # No es suya: se deja como estaba
+        os.rename(claimed, path)
+        return None
+    if time.time() - float(data.get("created_at") or 0) > PREVIEW_TTL_S:
+        discard(token)
+        return None
+    return data
+
+
+def release(token: str) -> None:
+    """
+    Make a claimed preview confirmable again.
+    """
+    path = preview_path(token)
+    try:
+        os.rename(path.with_suffix(".claimed"), path)
+    except OSError:
+        logger.warning("could not release import preview %s", token, exc_info=True)
+
+
+def discard(token: str) -> None:
+    path = preview_path(token)
+    for p in (path, path.with_suffix(".claimed")):
+        try:
+            p.unlink()
+        except OSError:
+            pass
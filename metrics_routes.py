@@ -0,0 +1,44 @@
+import os
+import hmac
+
+from flask import Blueprint, abort, jsonify, request
+
+import backups
+import db
+import replication
+import sql_metrics
+
+metrics_bp = Blueprint("metrics", __name__, url_prefix="/_internal")
+
+
+def _check_token():
+    """
+    Internal stats are only served when METRICS_TOKEN is set and the request
+    carries it in the X-Metrics-Token header (never in the query string,
+    which ends up in proxy / access logs). Otherwise: 404.
+    """
+    expected = os.environ.get("METRICS_TOKEN", "")
+    given = request.headers.get("X-Metrics-Token") or ""
+    if not expected or not hmac.compare_digest(given, expected):
+        abort(404)
+
+
+@metrics_bp.get("/stats")
+def stats():
+    _check_token()
+    return jsonify({
+        "pid": os.getpid(),
+        "pool": db.pool_stats(),
+        "writer": db.writer_stats(),
+        "deadlines": db.deadline_stats(),
+        "replication": replication.replication_status(),
+        "backups": backups.read_status(),
+        "sql": sql_metrics.snapshot(),
+    })
+
+
+@metrics_bp.get("/sql.txt")
+def sql_report():
+    _check_token()
+    limit = request.args.get("limit", type=int) or 20
+    return sql_metrics.format_report(limit), 200, {"Content-Type": "text/plain; charset=utf-8"}
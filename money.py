@@ -0,0 +1,36 @@
+"""
+Money at the API boundary: amounts are stored as integer cents
+(gastos.importe_cents) so sums and comparisons are exact.
+
+- to_cents(): client / CSV value -> int cents (ROUND_HALF_UP), never via float
+- from_cents(): int cents -> number for the JSON responses (2 decimals)
+"""
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+_CENT = Decimal("0.01")
+
+
+def to_cents(value) -> int:
+    """
+    12.345 / "12.345" / Decimal -> 1235. Raises ValueError if not a finite number.
+    """
+    if isinstance(value, bool) or value is None:
+        raise ValueError(f"importe no numérico: {value!r}")
+    try:
+        # str() para floats: Decimal(0.1) arrastraría el error binario
+        d = Decimal(value if isinstance(value, (int, Decimal)) else str(value).strip())
+    except (InvalidOperation, ValueError) as e:
+        raise ValueError(f"importe no numérico: {value!r}") from e
+    if not d.is_finite():
+        raise ValueError(f"importe no numérico: {value!r}")
+    return int(d.quantize(_CENT, rounding=ROUND_HALF_UP) * 100)
+
+
+def from_cents(cents):
+    """
+    1235 -> 12.35 (None stays None).
+    """
+    if cents is None:
+        return None
+    return float(Decimal(int(cents)) / 100)
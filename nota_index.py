@@ -0,0 +1,230 @@
+"""
+In-process prefix index of each user's notes for /api/sugerir_nota.
+
+- Per user: the distinct notes sorted by casefolded text (bisect for the
+  prefix range), each with its use count, last gasto id and the
+  categoria/concepto of that use. The answer (top 8 by count, then recency)
+  comes from memory, no SQLite involved.
+- Built lazily from the user's rows in the notas table (the newest
+  NOTA_INDEX_MAX_NOTES) and kept in an LRU of NOTA_INDEX_USERS users.
+- This worker's own writes update it in place (on_insert / on_delete).
+  Writes from other workers show up after NOTA_INDEX_TTL_S: then one
+  freshness query (trigram_index.freshness_key) decides whether to rebuild.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from heapq import nlargest
+
+import db
+import trigram_index
+
+NOTA_INDEX_USERS = int(os.environ.get("NOTA_INDEX_USERS", "64"))
+NOTA_INDEX_MAX_NOTES = int(os.environ.get("NOTA_INDEX_MAX_NOTES", "20000"))
+NOTA_INDEX_TTL_S = float(os.environ.get("NOTA_INDEX_TTL_S", "30"))
+
+_NOTES_SQL = """
+    SELECT nota, n, last_id, categoria, concepto
+    FROM notas
+    WHERE user_id = ?
+    ORDER BY last_id DESC
+    LIMIT ?
+"""
+
+
+class NotaPrefixIndex:
+    """
+    Sorted (casefolded nota, nota) keys + per-note stats for one user
+    (an in-memory copy of the user's rows in the notas table).
+    """
+
+    def __init__(self, key=None):
+        self.keys = []          # [(nota.casefold(), nota)] ordenadas
+        self.notes = {}         # nota -> [n, last_id, categoria, concepto]
+        self.key = key          # trigram_index.freshness_key() al construirlo
+        self.checked_at = time.monotonic()
+
+    def set(self, nota: str, n: int, last_id: int, categoria: str, concepto: str) -> None:
+        if nota not in self.notes:
+            insort(self.keys, (nota.casefold(), nota))
+        self.notes[nota] = [int(n), int(last_id), categoria or "", concepto or ""]
+
+    def add(self, nota: str, categoria: str, concepto: str, last_id: int) -> None:
+        """
+        One more use of `nota` (gasto `last_id`), like trg_gastos_notas_ai.
+        """
+        if not (nota or "").strip():
+            return
+        stats = self.notes.get(nota)
+        if stats is None:
+            self.set(nota, 1, last_id, categoria, concepto)
+            return
+        stats[0] += 1
+        if int(last_id) >= stats[1]:
+            stats[1:] = [int(last_id), categoria or "", concepto or ""]
+
+    def remove(self, nota: str, gasto_id: int) -> bool:
+        """
+        One use less of `nota`. False when gasto_id was its latest use: the
+        previous categoria/concepto isn't known here, the caller rebuilds.
+        """
+        stats = self.notes.get(nota)
+        if stats is None:
+            return True
+        stats[0] -= 1
+        if stats[0] <= 0:
+            del self.notes[nota]
+            i = bisect_left(self.keys, (nota.casefold(), nota))
+            if i < len(self.keys) and self.keys[i] == (nota.casefold(), nota):
+                del self.keys[i]
+            return True
+        return int(gasto_id) != stats[1]
+
+    def search(self, pref: str, limit: int = 8) -> list:
+        """
+        Notes starting with `pref` (case-insensitive): most used first, then
+        most recent, with the categoria/concepto of their latest use.
+        """
+        folded = pref.casefold()
+        candidates = []
+        i = bisect_left(self.keys, (folded,))
+        while i < len(self.keys) and self.keys[i][0].startswith(folded):
+            nota = self.keys[i][1]
+            n, last_id, _cat, _con = self.notes[nota]
+            candidates.append((n, last_id, nota))
+            i += 1
+
+        out = []
+        for n, _last_id, nota in nlargest(limit, candidates):
+            _n, _last, cat, con = self.notes[nota]
+            out.append({"nota": nota, "n": n, "categoria": cat, "concepto": con})
+        return out
+
+
+_cache = OrderedDict()   # user_id -> NotaPrefixIndex
+_lock = threading.Lock()
+
+
+def _build(user_id: int, key: tuple) -> NotaPrefixIndex:
+    index = NotaPrefixIndex(key)
+    rows = db.db_all(_NOTES_SQL, (user_id, NOTA_INDEX_MAX_NOTES), user_id=user_id)
+    for r in rows or []:
+        index.set(r["nota"], r["n"], r["last_id"], r["categoria"], r["concepto"])
+    return index
+
+
+def lookup(user_id: int, pref: str, limit: int = 8) -> list:
+    """
+    Autocomplete matches for `pref`; see NotaPrefixIndex.search.
+    """
+    now = time.monotonic()
+    with _lock:
+        index = _cache.get(user_id)
+        if index is not None:
+            _cache.move_to_end(user_id)
+
+    if index is None or now - index.checked_at > NOTA_INDEX_TTL_S:
+        key = trigram_index.freshness_key(user_id)
+        if index is None or index.key != key:
+            index = _build(user_id, key)
+            with _lock:
+                _cache[user_id] = index
+                _cache.move_to_end(user_id)
+                while len(_cache) > NOTA_INDEX_USERS:
+                    _cache.popitem(last=False)
+        index.checked_at = now
+
+    with _lock:
+        return index.search(pref, limit)
+
+
+_EXACT_SQL = """
+    SELECT categoria, concepto, n
+    FROM notas INDEXED BY idx_notas_user_clave
+    WHERE user_id = ? AND clave = lower(trim(?))
+    ORDER BY n DESC, last_id DESC
+    LIMIT 1
+"""
+
+
+def exact_match(user_id: int, nota: str):
+    """
+    Row (categoria, concepto, n) of the most used note equal to `nota`
+    (ignoring ASCII case and surrounding spaces), or None. One lookup on
+    idx_notas_user_clave (forced: without ANALYZE the planner picks the
+    primary key and scans all the user's notes), straight from SQLite.
+    """
+    return db.db_one(_EXACT_SQL, (user_id, nota), user_id=user_id)
+
+
+_EXACT_MANY_SQL = """
+    SELECT nota, categoria, concepto, n FROM (
+      SELECT j.value AS nota, n.categoria, n.concepto, n.n,
+             ROW_NUMBER() OVER (PARTITION BY j.value ORDER BY n.n DESC, n.last_id DESC) AS rk
+      FROM json_each(?) AS j
+      JOIN notas AS n INDEXED BY idx_notas_user_clave
+        ON n.user_id = ? AND n.clave = lower(trim(j.value))
+    )
+    WHERE rk = 1
+"""
+
+
+def exact_matches(user_id: int, notas) -> dict:
+    """
+    {nota: row} like exact_match for many notes in one query (notes
+    passed as a JSON array; those never used are missing).
+    """
+    rows = db.db_all(_EXACT_MANY_SQL, (json.dumps(list(notas)), user_id), user_id=user_id)
+    return {r["nota"]: r for r in rows or []}
+
+
+def is_cached(user_id: int) -> bool:
+    return user_id in _cache
+
+
+def on_insert(user_id: int, gasto_id: int, nota: str, categoria: str, concepto: str) -> None:
+    """
+    Record a gasto this worker just inserted (no-op if the user isn't cached).
+    """
+    with _lock:
+        index = _cache.get(user_id)
+        if index is None:
+            return
+        index.add(nota, categoria, concepto, gasto_id or 0)
+        if index.key is not None:
+            db_file, last_id, n = index.key
+            index.key = (db_file, max(last_id, int(gasto_id or 0)), n + 1)
+
+
+def on_delete(user_id: int, row) -> None:
+    """
+    Record a deleted gasto (row with id and nota).
+    """
+    with _lock:
+        index = _cache.get(user_id)
+        if index is None or row is None:
+            return
+        if not index.remove(row["nota"], row["id"]):
+            # Era su último uso: se relee de notas en la próxima consulta
+            del _cache[user_id]
+            return
+        if index.key is not None:
+            db_file, last_id, n = index.key
+            index.key = (db_file, last_id, n - 1)
+
+
+def invalidate(user_id: int) -> None:
+    """
+    Drop the user's index (bulk writes); rebuilt on the next lookup.
+    """
+    with _lock:
+        _cache.pop(user_id, None)
+
+
+def clear() -> None:
+    with _lock:
+        _cache.clear()
@@ -1,6 +1,6 @@
 # C:\Users\Usuario\Dropbox\app.gastos\onboarding.py
 
-from db import get_db
+from db import db_one
 
 
 def user_needs_onboarding(user_id: int) -> bool:
@@ -8,11 +8,10 @@ def user_needs_onboarding(user_id: int) -> bool:
     Devuelve True si el usuario debe ver el modal de onboarding.
     Regla: mostrar mientras users.has_imported_csv == 0 (o NULL / no existe).
     """
-    db = get_db()
-    row = db.execute(
+    row = db_one(
         "SELECT has_imported_csv FROM users WHERE id = ?",
         (user_id,),
-    ).fetchone()
+    )
 
     # Si no existe el usuario (caso raro), por defecto no bloqueamos con onboarding
     if row is None:
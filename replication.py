@@ -0,0 +1,308 @@
+"""
+Snapshot replication of the SQLite files to REPLICA_DIR, and the replica
+serving mode.
+
+Primary side (Replicator):
+- keeps one connection per source file and checks PRAGMA data_version;
+  files that didn't change since the last round are skipped
+- changed files are copied with the online backup API (N pages per step,
+  sleeping between steps so writers aren't blocked), written to a temp
+  file and renamed into place, so a replica reader never sees a torn copy;
+  a commit on another connection restarts a step-wise copy, so after
+  REPLICATION_MAX_RESTARTS restarts it is redone in a single pass
+- sources: DB_PATH plus every shard file when sharding is on
+
+SQLite doesn't expose WAL frames or checkpoint hooks to Python, so instead
+of shipping WAL frames we ship consistent snapshots, and only when the
+file changed.
+
+Replica side (DB_ROLE=replica):
+- reads come from the copy in REPLICA_DIR (db.read_path; the read-only pool
+  recycles its connections when a new snapshot is renamed in)
+- every non-GET/HEAD request is forwarded to PRIMARY_URL as-is (cookies
+  included; both machines share SECRET_KEY) and the response relayed back
+
+Both sides can run on a single box with two directories, e.g.:
+    DB_PATH=/tmp/a/gastos.db REPLICA_DIR=/tmp/b flask --app app replicate
+    DB_ROLE=replica DB_PATH=/tmp/a/gastos.db REPLICA_DIR=/tmp/b PRIMARY_URL=http://127.0.0.1:8080 ...
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from flask import Response, request
+
+import db
+
+try:
+    import fcntl
+except ImportError:  # Windows (dev local)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+INTERVAL_S = float(os.environ.get("REPLICATION_INTERVAL_S", "5"))
+PAGES_PER_STEP = int(os.environ.get("REPLICATION_PAGES_PER_STEP", "256"))
+STEP_SLEEP_S = float(os.environ.get("REPLICATION_STEP_SLEEP_S", "0.005"))
+MAX_RESTARTS = int(os.environ.get("REPLICATION_MAX_RESTARTS", "3"))
+FORWARD_TIMEOUT_S = float(os.environ.get("REPLICATION_FORWARD_TIMEOUT_S", "30"))
+
+# Cabeceras que no se reenvían (hop-by-hop o recalculadas)
+_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te",
+    "trailers", "transfer-encoding", "upgrade", "host", "content-length",
+}
+
+# GET que escriben: también van al primario
+FORWARD_GET_ENDPOINTS = {"auth.confirm_email"}
+
+
+def source_paths() -> list:
+    """
+    Files to replicate: DB_PATH and, when sharding, every shard file.
+    """
+    paths = [db.DB_PATH]
+    if db.SHARD_MODE not in ("", "none") and os.path.isdir(db.SHARD_DIR):
+        paths += sorted(str(p) for p in Path(db.SHARD_DIR).glob("*.db"))
+    return paths
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _restart_guard(max_restarts: int):
+    """
+    backup() progress callback that aborts the step-wise copy after
+    `max_restarts` restarts (a step that doesn't bring `remaining` down means
+    another connection committed and SQLite started the copy over).
+    """
+    state = {"last": None, "restarts": 0}
+
+    def progress(status, remaining, total):
+        if state["last"] is not None and remaining >= state["last"]:
+            state["restarts"] += 1
+            if state["restarts"] > max_restarts:
+                raise _TooManyRestarts()
+        state["last"] = remaining
+
+    return progress
+
+
+def copy_database(src: sqlite3.Connection, dest_path: str, pages: int = -1, sleep: float = 0.0,
+                  max_restarts: int = None) -> None:
+    """
+    Consistent online copy of `src` into `dest_path` via the backup API,
+    written next to the target and renamed into place.
+    """
+    max_restarts = MAX_RESTARTS if max_restarts is None else max_restarts
+    db._ensure_db_dir_exists(dest_path)
+    tmp_path = f"{dest_path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    dst = sqlite3.connect(tmp_path)
+    try:
+        try:
+            src.backup(dst, pages=pages, sleep=sleep, progress=_restart_guard(max_restarts))
+        except _TooManyRestarts:
+            # Cada commit de otra conexión reinicia la copia por pasos: con
+            # escrituras continuas no terminaría nunca. En una sola pasada
+            # solo se retiene un snapshot de lectura (en WAL no bloquea escritores).
+            src.backup(dst, pages=-1)
+        # La copia queda en modo rollback journal: los lectores mode=ro no necesitan -wal/-shm
+        dst.execute("PRAGMA journal_mode = DELETE")
+        dst.commit()
+    finally:
+        dst.close()
+    os.replace(tmp_path, dest_path)
+
+
+class Replicator:
+    """
+    Ships snapshots of the source files to REPLICA_DIR when they change.
+    """
+
+    def __init__(self, replica_dir: str = None, pages: int = PAGES_PER_STEP,
+                 sleep: float = STEP_SLEEP_S, interval: float = INTERVAL_S):
+        self.replica_dir = replica_dir or db.REPLICA_DIR
+        if not self.replica_dir:
+            raise ValueError("REPLICA_DIR no está definido")
+        self.pages = pages
+        self.sleep = sleep
+        self.interval = interval
+
+        self._sources = {}      # path -> (conn, last data_version)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.status = {
+            "rounds": 0,
+            "copies": 0,
+            "skipped": 0,
+            "errors": 0,
+            "last_error": None,
+            "last_copy_at": None,
+            "last_round_at": None,
+            "last_copy_ms": None,
+        }
+
+    def _source_conn(self, path: str):
+        entry = self._sources.get(path)
+        if entry is None:
+            conn = sqlite3.connect(path, check_same_thread=False)
+            entry = self._sources[path] = [conn, None]
+        return entry
+
+    def sync_once(self) -> int:
+        """
+        One replication round. Returns the number of files copied.
+        """
+        copied = 0
+        with self._lock:
+            for path in source_paths():
+                if not os.path.exists(path):
+                    continue
+                try:
+                    entry = self._source_conn(path)
+                    conn = entry[0]
+                    version = conn.execute("PRAGMA data_version").fetchone()[0]
+                    target = db.replica_path(path, self.replica_dir)
+                    if entry[1] == version and os.path.exists(target):
+                        self.status["skipped"] += 1
+                        continue
+                    t0 = time.perf_counter()
+                    copy_database(conn, target, pages=self.pages, sleep=self.sleep)
+                    entry[1] = version
+                    copied += 1
+                    self.status["copies"] += 1
+                    self.status["last_copy_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+                    self.status["last_copy_at"] = time.time()
+                except Exception as e:
+                    self.status["errors"] += 1
+                    self.status["last_error"] = f"{path}: {e}"
+                    logger.exception("replication of %s failed", path)
+            self.status["rounds"] += 1
+            self.status["last_round_at"] = time.time()
+        return copied
+
+    def run_forever(self) -> None:
+        while not self._stop.is_set():
+            self.sync_once()
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="db-replicator", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+        with self._lock:
+            for conn, _ in self._sources.values():
+                conn.close()
+            self._sources.clear()
+
+
+_replicator = None
+_leader_fh = None
+
+
+def leader_lock(lock_path: str):
+    """
+    Non-blocking exclusive lock so a background job runs in one worker per
+    machine. Returns the open file (keep a reference) or None if another
+    process holds it. Without fcntl every caller is the leader.
+    """
+    db._ensure_db_dir_exists(lock_path)
+    fh = open(lock_path, "a")
+    if fcntl is None:
+        return fh
+    try:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        fh.close()
+        return None
+    return fh
+
+
+def start_background_replicator():
+    """
+    Start the replicator in ONE worker per machine: the first worker to
+    get the lock file in REPLICA_DIR wins, the rest return None.
+    """
+    global _replicator, _leader_fh
+    if db.DB_ROLE != "primary" or not db.REPLICA_DIR or _replicator is not None:
+        return _replicator
+
+    fh = leader_lock(os.path.join(db.REPLICA_DIR, ".replicator.lock"))
+    if fh is None:
+        return None
+    _leader_fh = fh
+
+    _replicator = Replicator()
+    _replicator.start()
+    return _replicator
+
+
+def replication_status() -> dict:
+    return {
+        "role": db.DB_ROLE,
+        "replica_dir": db.REPLICA_DIR or None,
+        "replicator": dict(_replicator.status) if _replicator is not None else None,
+    }
+
+
+# -----------------------------------------------------------------------------
+# Modo réplica: reenvío de escrituras al primario
+# -----------------------------------------------------------------------------
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Las redirecciones (p. ej. tras login) se devuelven tal cual al navegador
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def forward_to_primary() -> Response:
+    url = db.PRIMARY_URL.rstrip("/") + request.full_path.rstrip("?")
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in _HOP_HEADERS}
+    headers["X-Forwarded-By"] = "replica"
+    req = urllib.request.Request(url, data=request.get_data() or None, headers=headers,
+                                 method=request.method)
+    try:
+        resp = _opener.open(req, timeout=FORWARD_TIMEOUT_S)
+    except urllib.error.HTTPError as e:
+        resp = e
+    except (urllib.error.URLError, OSError) as e:
+        logger.warning("forward to primary failed: %s", e)
+        return Response('{"ok": false, "error": "Primario no disponible"}', status=503,
+                        mimetype="application/json", headers={"Retry-After": "5"})
+
+    body = resp.read()
+    out_headers = [(k, v) for k, v in resp.headers.items() if k.lower() not in _HOP_HEADERS]
+    return Response(body, status=resp.getcode(), headers=out_headers)
+
+
+def _replica_before_request():
+    if request.method in db.READ_METHODS and request.endpoint not in FORWARD_GET_ENDPOINTS:
+        return None
+    return forward_to_primary()
+
+
+def init_app(app) -> None:
+    if db.DB_ROLE == "replica":
+        if not db.PRIMARY_URL:
+            raise RuntimeError("DB_ROLE=replica requiere PRIMARY_URL")
+        app.before_request(_replica_before_request)
@@ -0,0 +1,72 @@
+"""
+gastos_rollup maintenance (the table and its triggers live in schema.py,
+migration 3): verify it against gastos and rebuild it if it drifted
+(e.g. rows changed with the triggers dropped, or a restored old backup).
+"""
+
+import sqlite3
+
+import schema
+
+_DIFF_SQL = f"""
+    WITH expected (user_id, mes, categoria, concepto, n, total_cents) AS (
+      {schema.ROLLUP_SELECT_SQL}
+    ),
+    actual AS (
+      SELECT user_id, mes, categoria, concepto, n, total_cents
+      FROM gastos_rollup
+      WHERE 1 = 1 {{and_user}}
+    )
+    SELECT e.user_id, e.mes, e.categoria, e.concepto, e.n, e.total_cents, a.n, a.total_cents
+    FROM expected e
+    LEFT JOIN actual a USING (user_id, mes, categoria, concepto)
+    WHERE a.n IS NOT e.n OR a.total_cents IS NOT e.total_cents
+    UNION ALL
+    SELECT a.user_id, a.mes, a.categoria, a.concepto, NULL, NULL, a.n, a.total_cents
+    FROM actual a
+    LEFT JOIN expected e USING (user_id, mes, categoria, concepto)
+    WHERE e.n IS NULL
+"""
+
+
+def _user_filter(user_id):
+    if user_id is None:
+        return "", ()
+    return "AND user_id = ?", (int(user_id),)
+
+
+def verify(conn: sqlite3.Connection, user_id=None) -> list:
+    """
+    Keys whose rollup row doesn't match gastos. Each item:
+    {user_id, mes, categoria, concepto, expected: (n, cents), actual: (n, cents)}
+    (None for a missing side). Empty list = in sync.
+    """
+    and_user, params = _user_filter(user_id)
+    rows = conn.execute(_DIFF_SQL.format(and_user=and_user), params * 2).fetchall()
+    return [
+        {
+            "user_id": r[0], "mes": r[1], "categoria": r[2], "concepto": r[3],
+            "expected": (r[4], r[5]) if r[4] is not None else None,
+            "actual": (r[6], r[7]) if r[6] is not None else None,
+        }
+        for r in rows
+    ]
+
+
+def rebuild(conn: sqlite3.Connection, user_id=None) -> int:
+    """
+    Recompute the rollup from gastos (all users or one) in one transaction.
+    Returns the number of rollup rows written.
+    """
+    and_user, params = _user_filter(user_id)
+    if conn.in_transaction:
+        raise RuntimeError("rollup.rebuild() called with a transaction already open")
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f"DELETE FROM gastos_rollup WHERE 1 = 1 {and_user}", params)
+        cur = conn.execute(schema.ROLLUP_BACKFILL_SQL.format(and_user=and_user), params)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return cur.rowcount
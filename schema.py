@@ -1,11 +1,102 @@
-from db import db_exec, db_all
+"""
+Versioned schema migrations keyed on PRAGMA user_version.
 
+- ensure_schema() is called on every create_app(); if the DB is already at
+  SCHEMA_VERSION it costs a single pragma read (plus a sqlite_master lookup
+  for indexes left pending, see _create_users_email_index).
+- Pending migrations run in order inside ONE transaction (BEGIN IMMEDIATE)
+  while holding a file lock (MIGRATION_LOCK_PATH, one for all DB files), so
+  gunicorn workers starting at the same time don't race: the second one
+  re-reads user_version and skips.
+- To change the schema, append a new (version, description, fn) entry to
+  MIGRATIONS. Never edit a migration that has already shipped.
+- fn(conn, shard): with sharding the same versions run on every shard file
+  with shard=True; shards only hold gastos (and what hangs off it), the
+  directory tables (users, ...) live only in DB_PATH.
+"""
 
-def ensure_schema():
-    # -----------------------------
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+
+import db
+
+try:
+    import fcntl
+except ImportError:  # Windows (dev local): sin lock entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Por defecto junto a DB_PATH (data/, fuera de git); se resuelve al migrar
+MIGRATION_LOCK_PATH = os.environ.get("DB_MIGRATION_LOCK", "")
+
+
+def _columns(conn, table: str) -> set:
+    return {r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+def _add_column(conn, table: str, col: str, decl: str) -> None:
+    if col not in _columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {decl}")
+
+
+# -----------------------------------------------------------------------------
+# Migraciones
+# -----------------------------------------------------------------------------
+
+def _m001_baseline(conn, shard=False):
+    """
+    Esquema base (equivale al antiguo ensure_schema). Es idempotente para
+    poder aplicarse sobre BDs creadas antes de existir user_version.
+    """
+    if not shard:
+        _m001_users(conn)
+
+    # Tabla gastos (en un shard no hay tabla users a la que referenciar)
+    fk = "" if shard else ",\n      FOREIGN KEY(user_id) REFERENCES users(id)"
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS gastos (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      user_id INTEGER,
+      fecha TEXT NOT NULL DEFAULT (date('now')),
+      categoria TEXT NOT NULL DEFAULT '',
+      concepto TEXT NOT NULL DEFAULT '',
+      importe REAL NOT NULL DEFAULT 0,
+      nota TEXT NOT NULL DEFAULT '',
+      source TEXT NOT NULL DEFAULT 'manual',
+      created_at TEXT NOT NULL DEFAULT (datetime('now')){fk}
+    )
+    """)
+
+    # Columnas añadidas a gastos con el tiempo
+    gastos_cols = _columns(conn, "gastos")
+    _add_column(conn, "gastos", "user_id", "INTEGER")
+    _add_column(conn, "gastos", "concepto", "TEXT NOT NULL DEFAULT ''")
+    _add_column(conn, "gastos", "nota", "TEXT NOT NULL DEFAULT ''")
+    _add_column(conn, "gastos", "source", "TEXT NOT NULL DEFAULT 'manual'")
+
+    # Compatibilidad: si existía 'notas' (plural), copiar datos a 'nota'
+    if "notas" in gastos_cols:
+        conn.execute("""
+            UPDATE gastos
+            SET nota = COALESCE(notas, '')
+            WHERE (nota IS NULL OR nota = '')
+        """)
+
+    # Índices para rendimiento
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_gastos_user_id ON gastos(user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_gastos_user_fecha ON gastos(user_id, fecha)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_gastos_fecha ON gastos(fecha)")
+    # Útil para sugerencias por nota
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_gastos_user_nota ON gastos(user_id, nota)")
+
+
+def _m001_users(conn):
     # Tabla users (with email-based auth and confirmation)
-    # -----------------------------
-    db_exec("""
+    conn.execute("""
     CREATE TABLE IF NOT EXISTS users (
       id INTEGER PRIMARY KEY AUTOINCREMENT,
       username TEXT,
@@ -19,144 +110,518 @@ def ensure_schema():
     )
     """)
 
-    # -----------------------------
-    # Tabla gastos
-    # -----------------------------
-    db_exec("""
-    CREATE TABLE IF NOT EXISTS gastos (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      user_id INTEGER,
-      fecha TEXT NOT NULL DEFAULT (date('now')),
-      categoria TEXT NOT NULL DEFAULT '',
-      concepto TEXT NOT NULL DEFAULT '',
-      importe REAL NOT NULL DEFAULT 0,
-      nota TEXT NOT NULL DEFAULT '',
-      source TEXT NOT NULL DEFAULT 'manual',
-      created_at TEXT NOT NULL DEFAULT (datetime('now')),
-      FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
+    # Columnas añadidas a users con el tiempo
+    _add_column(conn, "users", "email", "TEXT")
+    _add_column(conn, "users", "is_confirmed", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "users", "confirmation_token", "TEXT")
+    _add_column(conn, "users", "confirmation_sent_at", "TEXT")
+    _add_column(conn, "users", "has_imported_csv", "INTEGER NOT NULL DEFAULT 0")
+
+    _create_users_email_index(conn)
+
+
+def _create_users_email_index(conn) -> bool:
+    """
+    Unique index on users.email. With duplicated emails in old data it is
+    left pending (warning) instead of blocking startup; ensure_schema()
+    retries it on every boot until the duplicates are fixed.
+    """
+    conn.execute("SAVEPOINT idx_users_email")
+    try:
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email)")
+        conn.execute("RELEASE idx_users_email")
+        return True
+    except sqlite3.IntegrityError:
+        conn.execute("ROLLBACK TO idx_users_email")
+        conn.execute("RELEASE idx_users_email")
+        logger.warning("idx_users_email not created: duplicated emails in users")
+        return False
 
-    # -----------------------------
-    # Migraciones defensivas para users
-    # -----------------------------
+
+def _retry_pending_indexes(conn) -> None:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_users_email'"
+    ).fetchone()
+    if row is not None:
+        return
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        user_cols = db_all("PRAGMA table_info(users)")
+        _create_users_email_index(conn)
+        conn.commit()
     except Exception:
-        user_cols = []
+        conn.rollback()
+        raise
 
-    user_col_names = {c["name"] for c in user_cols} if user_cols else set()
 
-    # Add email column if missing
-    if "email" not in user_col_names:
-        try:
-            db_exec("ALTER TABLE users ADD COLUMN email TEXT")
-        except Exception:
-            pass
+def _m002_importe_cents(conn, shard=False):
+    """
+    gastos.importe_cents: importe en céntimos (entero) para sumas exactas.
+    La app escribe ambas columnas; los triggers rellenan importe_cents para
+    filas insertadas o actualizadas solo con importe (código antiguo, SQL a mano).
+    """
+    _add_column(conn, "gastos", "importe_cents", "INTEGER")
+    conn.execute("""
+        UPDATE gastos
+        SET importe_cents = CAST(ROUND(importe * 100) AS INTEGER)
+        WHERE importe_cents IS NULL AND importe IS NOT NULL
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_cents_ai
+    AFTER INSERT ON gastos
+    WHEN NEW.importe_cents IS NULL AND NEW.importe IS NOT NULL
+    BEGIN
+      UPDATE gastos SET importe_cents = CAST(ROUND(NEW.importe * 100) AS INTEGER) WHERE id = NEW.id;
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_cents_au
+    AFTER UPDATE OF importe ON gastos
+    WHEN NEW.importe IS NOT OLD.importe AND NEW.importe_cents IS OLD.importe_cents
+    BEGIN
+      UPDATE gastos SET importe_cents = CAST(ROUND(NEW.importe * 100) AS INTEGER) WHERE id = NEW.id;
+    END
+    """)
 
-    # Add is_confirmed column if missing
-    if "is_confirmed" not in user_col_names:
-        try:
-            db_exec("ALTER TABLE users ADD COLUMN is_confirmed INTEGER NOT NULL DEFAULT 0")
-        except Exception:
-            pass
 
-    # Add confirmation_token column if missing
-    if "confirmation_token" not in user_col_names:
-        try:
-            db_exec("ALTER TABLE users ADD COLUMN confirmation_token TEXT")
-        except Exception:
-            pass
+# Céntimos de una fila de gastos dentro de un trigger (X = NEW u OLD). Mismo
+# criterio que trg_gastos_cents_*: si importe_cents aún es NULL (inserción
+# cruda) se deriva de importe, así el orden en que disparan da igual.
+_ROLLUP_CENTS = "COALESCE({x}.importe_cents, CAST(ROUND({x}.importe * 100) AS INTEGER), 0)"
+_ROLLUP_KEY = "{x}.user_id, COALESCE(substr({x}.fecha, 1, 7), ''), COALESCE({x}.categoria, ''), COALESCE({x}.concepto, '')"
 
-    # Add confirmation_sent_at column if missing
-    if "confirmation_sent_at" not in user_col_names:
-        try:
-            db_exec("ALTER TABLE users ADD COLUMN confirmation_sent_at TEXT")
-        except Exception:
-            pass
 
-    # Add has_imported_csv column if missing (for onboarding)
-    if "has_imported_csv" not in user_col_names:
-        try:
-            db_exec("ALTER TABLE users ADD COLUMN has_imported_csv INTEGER NOT NULL DEFAULT 0")
-        except Exception:
-            pass
+def _rollup_add(x: str, sign: str) -> str:
+    return (
+        "INSERT INTO gastos_rollup (user_id, mes, categoria, concepto, n, total_cents) "
+        f"SELECT {_ROLLUP_KEY.format(x=x)}, {sign}1, {sign}{_ROLLUP_CENTS.format(x=x)} "
+        f"WHERE {x}.user_id IS NOT NULL "
+        "ON CONFLICT (user_id, mes, categoria, concepto) DO UPDATE SET "
+        "n = n + excluded.n, total_cents = total_cents + excluded.total_cents;"
+    )
 
-    # Create unique index on email (ignore conflicts if already exists)
-    try:
-        db_exec("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email)")
-    except Exception:
-        pass
 
-    # -----------------------------
-    # Migraciones defensivas para gastos
-    # -----------------------------
+def _rollup_prune(x: str) -> str:
+    return (
+        "DELETE FROM gastos_rollup WHERE n = 0 AND user_id = {x}.user_id "
+        "AND mes = COALESCE(substr({x}.fecha, 1, 7), '') "
+        "AND categoria = COALESCE({x}.categoria, '') AND concepto = COALESCE({x}.concepto, '');"
+    ).format(x=x)
+
+
+# Rollup calculado desde gastos ({and_user}: "" o "AND user_id = ?")
+ROLLUP_SELECT_SQL = """
+    SELECT user_id, COALESCE(substr(fecha, 1, 7), ''), COALESCE(categoria, ''), COALESCE(concepto, ''),
+           COUNT(*), SUM(COALESCE(importe_cents, CAST(ROUND(importe * 100) AS INTEGER), 0))
+    FROM gastos
+    WHERE user_id IS NOT NULL {and_user}
+    GROUP BY 1, 2, 3, 4
+"""
+ROLLUP_BACKFILL_SQL = (
+    "INSERT INTO gastos_rollup (user_id, mes, categoria, concepto, n, total_cents) " + ROLLUP_SELECT_SQL
+)
+
+
+def _m003_gastos_rollup(conn, shard=False):
+    """
+    gastos_rollup: n y total_cents por (user_id, mes, categoria, concepto),
+    mantenida por triggers en gastos. La leen /api/resumen y /api/categorias.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS gastos_rollup (
+      user_id INTEGER NOT NULL,
+      mes TEXT NOT NULL,
+      categoria TEXT NOT NULL,
+      concepto TEXT NOT NULL,
+      n INTEGER NOT NULL,
+      total_cents INTEGER NOT NULL,
+      PRIMARY KEY (user_id, mes, categoria, concepto)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("DELETE FROM gastos_rollup")
+    conn.execute(ROLLUP_BACKFILL_SQL.format(and_user=""))
+
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_rollup_ai AFTER INSERT ON gastos
+    BEGIN
+      {_rollup_add("NEW", "")}
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_rollup_ad AFTER DELETE ON gastos
+    BEGIN
+      {_rollup_add("OLD", "-")}
+      {_rollup_prune("OLD")}
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_rollup_au
+    AFTER UPDATE OF user_id, fecha, categoria, concepto, importe, importe_cents ON gastos
+    BEGIN
+      {_rollup_add("OLD", "-")}
+      {_rollup_add("NEW", "")}
+      {_rollup_prune("OLD")}
+    END
+    """)
+
+
+def _m004_gastos_fts(conn, shard=False):
+    """
+    gastos_fts: índice FTS5 (external content) sobre nota y concepto para
+    /api/gastos?q=, sin distinguir mayúsculas ni acentos. Si la build de
+    SQLite no trae FTS5 se omite (warning) y la búsqueda sigue con LIKE.
+    """
+    conn.execute("SAVEPOINT gastos_fts")
     try:
-        cols = db_all("PRAGMA table_info(gastos)")
-    except Exception:
-        cols = []
+        conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS gastos_fts USING fts5(
+          nota, concepto,
+          content='gastos', content_rowid='id',
+          tokenize='unicode61 remove_diacritics 2'
+        )
+        """)
+    except sqlite3.OperationalError as e:
+        conn.execute("ROLLBACK TO gastos_fts")
+        conn.execute("RELEASE gastos_fts")
+        logger.warning("gastos_fts not created (%s): note search falls back to LIKE", e)
+        return
+    conn.execute("RELEASE gastos_fts")
 
-    col_names = {c["name"] for c in cols} if cols else set()
+    conn.execute("INSERT INTO gastos_fts (gastos_fts) VALUES ('rebuild')")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_fts_ai AFTER INSERT ON gastos
+    BEGIN
+      INSERT INTO gastos_fts (rowid, nota, concepto) VALUES (NEW.id, NEW.nota, NEW.concepto);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_fts_ad AFTER DELETE ON gastos
+    BEGIN
+      INSERT INTO gastos_fts (gastos_fts, rowid, nota, concepto) VALUES ('delete', OLD.id, OLD.nota, OLD.concepto);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_fts_au AFTER UPDATE OF nota, concepto ON gastos
+    BEGIN
+      INSERT INTO gastos_fts (gastos_fts, rowid, nota, concepto) VALUES ('delete', OLD.id, OLD.nota, OLD.concepto);
+      INSERT INTO gastos_fts (rowid, nota, concepto) VALUES (NEW.id, NEW.nota, NEW.concepto);
+    END
+    """)
 
-    # Asegurar user_id
-    if "user_id" not in col_names:
-        try:
-            db_exec("ALTER TABLE gastos ADD COLUMN user_id INTEGER")
-        except Exception:
-            pass
 
-    # Asegurar concepto (subcategoría)
-    if "concepto" not in col_names:
-        try:
-            db_exec("ALTER TABLE gastos ADD COLUMN concepto TEXT NOT NULL DEFAULT ''")
-        except Exception:
-            pass
+# Última fila de gastos con esa nota ({x} = OLD): para recalcular notas al borrar
+_NOTAS_LATEST = (
+    "SELECT id, fecha, categoria, COALESCE(concepto, '') FROM gastos "
+    "WHERE user_id = {x}.user_id AND nota = {x}.nota ORDER BY id DESC LIMIT 1"
+)
 
-    # Asegurar 'nota'
-    if "nota" not in col_names:
-        try:
-            db_exec("ALTER TABLE gastos ADD COLUMN nota TEXT NOT NULL DEFAULT ''")
-        except Exception:
-            pass
 
-    # Asegurar 'source' (track CSV imports vs manual entry)
-    if "source" not in col_names:
+def _notas_add(x: str) -> str:
+    return (
+        "INSERT INTO notas (user_id, nota, clave, n, last_id, last_fecha, categoria, concepto) "
+        f"SELECT {x}.user_id, {x}.nota, lower(trim({x}.nota)), 1, {x}.id, {x}.fecha, "
+        f"COALESCE({x}.categoria, ''), COALESCE({x}.concepto, '') "
+        f"WHERE {x}.user_id IS NOT NULL AND trim(COALESCE({x}.nota, '')) <> '' "
+        "ON CONFLICT (user_id, nota) DO UPDATE SET "
+        "n = n + 1, "
+        "last_id = CASE WHEN excluded.last_id >= last_id THEN excluded.last_id ELSE last_id END, "
+        "last_fecha = CASE WHEN excluded.last_id >= last_id THEN excluded.last_fecha ELSE last_fecha END, "
+        "categoria = CASE WHEN excluded.last_id >= last_id THEN excluded.categoria ELSE categoria END, "
+        "concepto = CASE WHEN excluded.last_id >= last_id THEN excluded.concepto ELSE concepto END;"
+    )
+
+
+def _notas_remove(x: str) -> str:
+    return (
+        f"UPDATE notas SET n = n - 1 WHERE user_id = {x}.user_id AND nota = {x}.nota; "
+        f"UPDATE notas SET (last_id, last_fecha, categoria, concepto) = ({_NOTAS_LATEST.format(x=x)}) "
+        f"WHERE user_id = {x}.user_id AND nota = {x}.nota AND last_id = {x}.id AND n > 0; "
+        f"DELETE FROM notas WHERE user_id = {x}.user_id AND nota = {x}.nota AND n <= 0;"
+    )
+
+
+NOTAS_BACKFILL_SQL = """
+    INSERT INTO notas (user_id, nota, clave, n, last_id, last_fecha, categoria, concepto)
+    SELECT user_id, nota, lower(trim(nota)), n, id, fecha, categoria, concepto
+    FROM (
+      SELECT user_id, nota, id, fecha, COALESCE(categoria, '') AS categoria, COALESCE(concepto, '') AS concepto,
+             COUNT(*) OVER (PARTITION BY user_id, nota) AS n,
+             ROW_NUMBER() OVER (PARTITION BY user_id, nota ORDER BY id DESC) AS rn
+      FROM gastos
+      WHERE user_id IS NOT NULL AND trim(COALESCE(nota, '')) <> '' {and_user}
+    )
+    WHERE rn = 1
+"""
+
+
+def _m005_notas(conn, shard=False):
+    """
+    notas: diccionario de notas por usuario (usos, último uso y su
+    categoria/concepto), mantenido por triggers en gastos. clave =
+    lower(trim(nota)) para búsquedas exactas y por prefijo con índice.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS notas (
+      user_id INTEGER NOT NULL,
+      nota TEXT NOT NULL,
+      clave TEXT NOT NULL,
+      n INTEGER NOT NULL,
+      last_id INTEGER NOT NULL,
+      last_fecha TEXT,
+      categoria TEXT NOT NULL,
+      concepto TEXT NOT NULL,
+      PRIMARY KEY (user_id, nota)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notas_user_clave ON notas(user_id, clave)")
+    conn.execute("DELETE FROM notas")
+    conn.execute(NOTAS_BACKFILL_SQL.format(and_user=""))
+
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_notas_ai AFTER INSERT ON gastos
+    BEGIN
+      {_notas_add("NEW")}
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_notas_ad AFTER DELETE ON gastos
+    BEGIN
+      {_notas_remove("OLD")}
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_notas_au
+    AFTER UPDATE OF user_id, nota, fecha, categoria, concepto ON gastos
+    BEGIN
+      {_notas_remove("OLD")}
+      {_notas_add("NEW")}
+    END
+    """)
+
+
+def _m006_import_jobs(conn, shard=False):
+    """
+    import_jobs: importaciones CSV en segundo plano (import_jobs.py).
+    Tabla de directorio como users: solo en DB_PATH, no en los shards.
+    """
+    if shard:
+        return
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS import_jobs (
+      id TEXT PRIMARY KEY,
+      user_id INTEGER NOT NULL,
+      status TEXT NOT NULL DEFAULT 'queued',
+      filename TEXT NOT NULL DEFAULT '',
+      rows_done INTEGER NOT NULL DEFAULT 0,
+      imported INTEGER NOT NULL DEFAULT 0,
+      skipped INTEGER NOT NULL DEFAULT 0,
+      duplicates INTEGER NOT NULL DEFAULT 0,
+      error TEXT,
+      created_at TEXT NOT NULL,
+      updated_at TEXT NOT NULL,
+      finished_at TEXT
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_import_jobs_user ON import_jobs(user_id, created_at)")
+
+
+def _m007_import_jobs_format(conn, shard=False):
+    """
+    import_jobs.format: formato detectado del CSV (JSON, ver csv_format).
+    """
+    if shard:
+        return
+    _add_column(conn, "import_jobs", "format", "TEXT")
+
+
+# Huella de un gasto para detectar duplicados: fecha, céntimos y nota
+# normalizada como notas.clave (el usuario va aparte, en el índice). Sin
+# función hash en SQLite: la clave normalizada es la huella, y así la
+# calculan igual los triggers, la importación y las inserciones a mano
+def fingerprint_sql(fecha: str, nota: str, cents: str) -> str:
+    return f"({fecha} || '|' || {cents} || '|' || lower(trim(COALESCE({nota}, ''))))"
+
+
+def gasto_fingerprint_sql(x: str) -> str:
+    return fingerprint_sql(f"{x}.fecha", f"{x}.nota", _ROLLUP_CENTS.format(x=x))
+
+
+# Otra fila con el mismo contenido que aún no tiene huella (la repetida que
+# la hereda cuando la que la tenía se borra o cambia)
+_FINGERPRINT_PROMOTE = (
+    "UPDATE OR IGNORE gastos SET fingerprint = OLD.fingerprint WHERE id = ("
+    "SELECT id FROM gastos WHERE user_id = OLD.user_id AND fecha = OLD.fecha "
+    f"AND fingerprint IS NULL AND {gasto_fingerprint_sql('gastos')} = OLD.fingerprint "
+    "ORDER BY id LIMIT 1);"
+)
+
+FINGERPRINT_BACKFILL_SQL = f"""
+    UPDATE gastos SET fingerprint = {gasto_fingerprint_sql("gastos")}
+    WHERE id IN (
+      SELECT id FROM (
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id, {gasto_fingerprint_sql("gastos")} ORDER BY id) AS rn
+        FROM gastos
+        WHERE user_id IS NOT NULL {{and_user}}
+      )
+      WHERE rn = 1
+    )
+"""
+
+
+def _m008_gastos_fingerprint(conn, shard=False):
+    """
+    gastos.fingerprint (fingerprint_sql) con índice único (user_id,
+    fingerprint): la importación inserta con INSERT OR IGNORE y los
+    duplicados son las filas ignoradas. Lo rellenan los triggers para las
+    filas que llegan sin ella; una fila que repite otra (dos cafés iguales
+    el mismo día, a mano) se queda en NULL y la hereda si la otra se borra.
+    Los duplicados ya existentes se quedan en NULL: flask gastos dedupe.
+    """
+    _add_column(conn, "gastos", "fingerprint", "TEXT")
+    conn.execute(FINGERPRINT_BACKFILL_SQL.format(and_user=""))
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_gastos_user_fingerprint ON gastos(user_id, fingerprint)"
+    )
+
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_fingerprint_ai AFTER INSERT ON gastos
+    WHEN NEW.fingerprint IS NULL AND NEW.user_id IS NOT NULL
+    BEGIN
+      UPDATE OR IGNORE gastos SET fingerprint = {gasto_fingerprint_sql("NEW")} WHERE id = NEW.id;
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_fingerprint_ad AFTER DELETE ON gastos
+    WHEN OLD.fingerprint IS NOT NULL
+    BEGIN
+      {_FINGERPRINT_PROMOTE}
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_gastos_fingerprint_au
+    AFTER UPDATE OF user_id, fecha, nota, importe, importe_cents ON gastos
+    WHEN {gasto_fingerprint_sql("OLD")} IS NOT {gasto_fingerprint_sql("NEW")} OR OLD.user_id IS NOT NEW.user_id
+    BEGIN
+      UPDATE gastos SET fingerprint = NULL WHERE id = NEW.id;
+      {_FINGERPRINT_PROMOTE}
+      UPDATE OR IGNORE gastos SET fingerprint = {gasto_fingerprint_sql("NEW")}
+      WHERE id = NEW.id AND NEW.user_id IS NOT NULL;
+    END
+    """)
+
+
+MIGRATIONS = [
+    (1, "baseline: users, gastos e índices", _m001_baseline),
+    (2, "gastos.importe_cents (entero) + triggers de compatibilidad", _m002_importe_cents),
+    (3, "gastos_rollup por usuario/mes/categoría/concepto", _m003_gastos_rollup),
+    (4, "gastos_fts (FTS5) para buscar en nota/concepto", _m004_gastos_fts),
+    (5, "notas: diccionario de notas por usuario", _m005_notas),
+    (6, "import_jobs: importaciones CSV en segundo plano", _m006_import_jobs),
+    (7, "import_jobs.format: formato detectado del CSV", _m007_import_jobs_format),
+    (8, "gastos.fingerprint con índice único para duplicados", _m008_gastos_fingerprint),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+# -----------------------------------------------------------------------------
+# Runner
+# -----------------------------------------------------------------------------
+
+def get_version(conn) -> int:
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def _db_file(conn) -> str:
+    # Ruta del fichero 'main' de la conexión ('' para BDs en memoria)
+    for row in conn.execute("PRAGMA database_list").fetchall():
+        if row[1] == "main":
+            return row[2] or ""
+    return ""
+
+
+def _lock_path() -> str:
+    return MIGRATION_LOCK_PATH or str(Path(db.DB_PATH).parent / ".migrate.lock")
+
+
+@contextmanager
+def _migration_lock(db_file: str):
+    """
+    Exclusive cross-process lock on MIGRATION_LOCK_PATH (no-op without fcntl
+    or for in-memory DBs). BEGIN IMMEDIATE already serializes writers; the
+    lock also keeps the other worker from failing with "database is locked"
+    while a long migration runs. One lock for the main DB and all shards,
+    so no lock files are left next to every DB file.
+    """
+    if fcntl is None or not db_file:
+        yield
+        return
+    lock_path = _lock_path()
+    Path(lock_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as fh:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
         try:
-            db_exec("ALTER TABLE gastos ADD COLUMN source TEXT NOT NULL DEFAULT 'manual'")
-        except Exception:
-            pass
+            yield
+        finally:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
 
-    # Compatibilidad: si existía 'notas' (plural) pero no 'nota', copiar datos
-    if ("notas" in col_names) and ("nota" in col_names):
+
+def migrate(conn, shard: bool = False) -> list:
+    """
+    Apply pending migrations. Returns the list of applied versions.
+    shard=True for per-user shard files (gastos only, see module doc).
+    """
+    if get_version(conn) >= SCHEMA_VERSION:
+        return []
+    if conn.in_transaction:
+        # Un commit implícito aquí confirmaría a medias el trabajo del llamador
+        raise RuntimeError("migrate() called with a transaction already open")
+
+    with _migration_lock(_db_file(conn)):
+        conn.execute("BEGIN IMMEDIATE")
         try:
-            db_exec("""
-                UPDATE gastos
-                SET nota = COALESCE(notas, '')
-                WHERE (nota IS NULL OR nota = '')
-            """)
+            current = get_version(conn)
+            applied = []
+            for version, description, fn in MIGRATIONS:
+                if version <= current:
+                    continue
+                logger.info("schema migration %s: %s", version, description)
+                fn(conn, shard)
+                applied.append(version)
+            if applied:
+                conn.execute(f"PRAGMA user_version = {int(applied[-1])}")
+            conn.commit()
         except Exception:
-            pass
+            conn.rollback()
+            raise
+    return applied
 
-    # -----------------------------
-    # Índices para rendimiento
-    # -----------------------------
-    try:
-        db_exec("CREATE INDEX IF NOT EXISTS idx_gastos_user_id ON gastos(user_id)")
-    except Exception:
-        pass
 
-    try:
-        db_exec("CREATE INDEX IF NOT EXISTS idx_gastos_user_fecha ON gastos(user_id, fecha)")
-    except Exception:
-        pass
+def migrate_shards() -> dict:
+    """
+    Bring every existing shard file up to SCHEMA_VERSION. Returns
+    {path: applied_versions} for the shards that needed it.
+    """
+    out = {}
+    if db.SHARD_MODE in ("", "none") or not Path(db.SHARD_DIR).is_dir():
+        return out
+    for path in sorted(Path(db.SHARD_DIR).glob("*.db")):
+        conn = sqlite3.connect(str(path), timeout=db.POOL_TIMEOUT)
+        try:
+            applied = migrate(conn, shard=True)
+        finally:
+            conn.close()
+        if applied:
+            out[str(path)] = applied
+    return out
 
-    try:
-        db_exec("CREATE INDEX IF NOT EXISTS idx_gastos_fecha ON gastos(fecha)")
-    except Exception:
-        pass
 
-    # Útil para sugerencias por nota (LIKE)
-    try:
-        db_exec("CREATE INDEX IF NOT EXISTS idx_gastos_user_nota ON gastos(user_id, nota)")
-    except Exception:
-        pass
+def ensure_schema():
+    # Una réplica es una copia de una BD ya migrada por el primario
+    if db.DB_ROLE == "replica":
+        return
+    conn = db.get_db()
+    migrate(conn)
+    _retry_pending_indexes(conn)
+    # Los shards que nadie ha escrito desde la última migración se leen en
+    # modo solo lectura: migrarlos aquí para que ningún GET vea un esquema viejo
+    migrate_shards()
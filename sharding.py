@@ -0,0 +1,72 @@
+"""
+Split the single gastos DB into per-user shard files (see DB_SHARD_MODE in db.py).
+
+The global DB keeps the users table (directory). Rows are copied with their
+original ids, so running the split twice is harmless (INSERT OR IGNORE).
+Source rows are only deleted when explicitly asked, after every shard copy
+has committed.
+"""
+
+import sqlite3
+
+import db
+import schema
+
+
+def _columns(conn, table: str, schema_name: str = "main") -> list:
+    return [r[1] for r in conn.execute(f"PRAGMA {schema_name}.table_info({table})").fetchall()]
+
+
+def split_into_shards(src_path: str = None, delete_source: bool = False) -> dict:
+    """
+    Copy each user's gastos from `src_path` (default DB_PATH) into its shard.
+    Returns {user_id: rows_copied}.
+    """
+    if db.SHARD_MODE in ("", "none"):
+        raise ValueError("DB_SHARD_MODE=none: no hay shards a los que mover datos")
+
+    src_path = src_path or db.DB_PATH
+    src = sqlite3.connect(src_path)
+    try:
+        user_ids = [r[0] for r in src.execute(
+            "SELECT DISTINCT user_id FROM gastos WHERE user_id IS NOT NULL ORDER BY user_id"
+        ).fetchall()]
+    finally:
+        src.close()
+
+    copied = {}
+    for uid in user_ids:
+        path = db.shard_path(uid)
+        if path == src_path:
+            continue
+        db._ensure_db_dir_exists(path)
+        dst = sqlite3.connect(path)
+        try:
+            db.apply_pragmas(dst, db.PRAGMA_PROFILE)
+            schema.migrate(dst, shard=True)
+            dst.execute("ATTACH DATABASE ? AS src", (src_path,))
+            src_cols = set(_columns(dst, "gastos", "src"))
+            cols = ", ".join(c for c in _columns(dst, "gastos") if c in src_cols)
+
+            dst.execute("BEGIN IMMEDIATE")
+            cur = dst.execute(
+                f"INSERT OR IGNORE INTO main.gastos ({cols}) "
+                f"SELECT {cols} FROM src.gastos WHERE user_id = ? ORDER BY id",
+                (uid,)
+            )
+            dst.commit()
+            copied[uid] = cur.rowcount
+            dst.execute("DETACH DATABASE src")
+        finally:
+            dst.close()
+
+    if delete_source and copied:
+        src = sqlite3.connect(src_path)
+        try:
+            marks = ",".join("?" for _ in copied)
+            src.execute(f"DELETE FROM gastos WHERE user_id IN ({marks})", tuple(copied))
+            src.commit()
+        finally:
+            src.close()
+
+    return copied
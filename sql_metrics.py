@@ -0,0 +1,141 @@
+"""
+In-process SQL instrumentation for db_all / db_one / db_exec.
+
+Per statement (whitespace-normalized SQL) it keeps:
+- calls, total/max time, rows returned or affected
+- call sites (file:line of the caller outside db.py)
+- number of slow executions and the EXPLAIN QUERY PLAN captured
+  the first time the statement was slow
+
+Slow executions are logged to the "sql.slow" logger.
+Config via env: SQL_METRICS=0 disables it, SQL_SLOW_MS sets the threshold.
+"""
+
+import logging
+import os
+import re
+import sys
+import threading
+
+ENABLED = os.environ.get("SQL_METRICS", "1").strip() not in ("0", "false", "no")
+SLOW_MS = float(os.environ.get("SQL_SLOW_MS", "100"))
+MAX_SITES = 5
+
+logger = logging.getLogger("sql.slow")
+
+_WS_RE = re.compile(r"\s+")
+_SKIP_FILES = ("db.py", "sql_metrics.py")
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def normalize_sql(sql: str) -> str:
+    return _WS_RE.sub(" ", sql or "").strip()
+
+
+def _call_site() -> str:
+    """
+    file:line of the first frame outside the DB layer.
+    """
+    f = sys._getframe(2)
+    while f is not None:
+        filename = os.path.basename(f.f_code.co_filename)
+        if filename not in _SKIP_FILES:
+            return f"{filename}:{f.f_lineno}"
+        f = f.f_back
+    return "?"
+
+
+def _explain(conn, sql: str, params) -> list:
+    try:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    except Exception as e:
+        return [f"<explain failed: {e}>"]
+    # Columnas: id, parent, notused, detail
+    return [r[3] for r in rows]
+
+
+def observe(conn, sql: str, params, elapsed_ms: float, rows: int) -> None:
+    """
+    Record one execution. `conn` is used to capture the query plan
+    the first time the statement is slow (may be None).
+    """
+    if not ENABLED:
+        return
+
+    key = normalize_sql(sql)
+    site = _call_site()
+    slow = elapsed_ms >= SLOW_MS
+
+    with _lock:
+        st = _stats.get(key)
+        if st is None:
+            st = _stats[key] = {
+                "calls": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "rows": 0,
+                "slow": 0,
+                "sites": {},
+                "plan": None,
+            }
+        st["calls"] += 1
+        st["total_ms"] += elapsed_ms
+        st["max_ms"] = max(st["max_ms"], elapsed_ms)
+        st["rows"] += max(0, rows or 0)
+        if site in st["sites"] or len(st["sites"]) < MAX_SITES:
+            st["sites"][site] = st["sites"].get(site, 0) + 1
+        if slow:
+            st["slow"] += 1
+        need_plan = slow and st["plan"] is None and conn is not None
+
+    if not slow:
+        return
+
+    if need_plan:
+        plan = _explain(conn, sql, params)
+        with _lock:
+            if st["plan"] is None:
+                st["plan"] = plan
+
+    logger.warning("slow query %.1fms rows=%s site=%s sql=%s", elapsed_ms, rows, site, key)
+
+
+def snapshot() -> list:
+    """
+    Aggregates as a list of dicts, most expensive (total time) first.
+    """
+    with _lock:
+        items = [(sql, dict(st, sites=dict(st["sites"]))) for sql, st in _stats.items()]
+
+    out = []
+    for sql, st in items:
+        st["sql"] = sql
+        st["avg_ms"] = round(st["total_ms"] / st["calls"], 3) if st["calls"] else 0
+        st["total_ms"] = round(st["total_ms"], 3)
+        st["max_ms"] = round(st["max_ms"], 3)
+        out.append(st)
+    out.sort(key=lambda x: -x["total_ms"])
+    return out
+
+
+def reset() -> None:
+    with _lock:
+        _stats.clear()
+
+
+def format_report(limit: int = 20) -> str:
+    """
+    Plain-text dump of the top statements (for logs / debugging).
+    """
+    lines = []
+    for st in snapshot()[:limit]:
+        lines.append(
+            f"{st['total_ms']:>10.1f}ms total  {st['calls']:>6} calls  "
+            f"{st['avg_ms']:>8.2f}ms avg  {st['max_ms']:>8.2f}ms max  "
+            f"{st['rows']:>8} rows  {st['slow']:>4} slow  {st['sql'][:120]}"
+        )
+        for detail in st["plan"] or []:
+            lines.append(f"{'':>12}plan: {detail}")
+    return "\n".join(lines)
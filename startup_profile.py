@@ -0,0 +1,143 @@
+"""
+Startup profiler for cold starts (Fly machines auto-stopped to zero).
+
+Enabled with STARTUP_PROFILE=1. wsgi.py installs it before importing the
+app, so it sees:
+- every module import (self time and cumulative time, nested imports
+  are attributed to their parent)
+- named init phases, via `with startup_profile.phase("schema"): ...`
+
+report() logs the slowest imports and all phases to the "startup" logger.
+When disabled, phase() is a no-op and nothing is installed.
+"""
+
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+ENABLED = os.environ.get("STARTUP_PROFILE", "").strip() in ("1", "true", "yes")
+
+logger = logging.getLogger("startup")
+
+_t0 = time.perf_counter()
+_imports = {}       # module -> [cumulative_ms, self_ms]
+_phases = []        # (name, ms)
+_stack = []         # pila de imports en curso: [child_ms acumulado]
+_finder = None
+
+
+class _TimingLoader:
+    """
+    Wraps a module loader and times exec_module (the actual import work).
+    """
+
+    def __init__(self, loader, name):
+        self._loader = loader
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        _stack.append(0.0)
+        t0 = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            total = (time.perf_counter() - t0) * 1000
+            children = _stack.pop()
+            if _stack:
+                _stack[-1] += total
+            _imports[self._name] = [total, total - children]
+            # Que importlib vea el loader real a partir de aquí
+            if getattr(module, "__spec__", None) is not None:
+                module.__spec__.loader = self._loader
+            if getattr(module, "__loader__", None) is self:
+                module.__loader__ = self._loader
+
+
+class _TimingFinder:
+    """
+    Meta path finder that delegates to the real finders and wraps the loader.
+    """
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self:
+                continue
+            find_spec = getattr(finder, "find_spec", None)
+            if find_spec is None:
+                continue
+            spec = find_spec(name, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimingLoader(spec.loader, name)
+            return spec
+        return None
+
+
+def install() -> None:
+    """
+    Start timing imports (only if STARTUP_PROFILE is enabled).
+    """
+    global _finder
+    if not ENABLED or _finder is not None:
+        return
+    _finder = _TimingFinder()
+    sys.meta_path.insert(0, _finder)
+
+
+def uninstall() -> None:
+    global _finder
+    if _finder is not None and _finder in sys.meta_path:
+        sys.meta_path.remove(_finder)
+    _finder = None
+
+
+@contextmanager
+def phase(name: str):
+    if not ENABLED:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, (time.perf_counter() - t0) * 1000))
+
+
+def results() -> dict:
+    imports = sorted(
+        ({"module": m, "cumulative_ms": round(c, 3), "self_ms": round(s, 3)}
+         for m, (c, s) in _imports.items()),
+        key=lambda x: -x["self_ms"],
+    )
+    return {
+        "since_install_ms": round((time.perf_counter() - _t0) * 1000, 3),
+        "imports_ms": round(sum(i["self_ms"] for i in imports), 3),
+        "imports": imports,
+        "phases": [{"phase": n, "ms": round(ms, 3)} for n, ms in _phases],
+    }
+
+
+def report(limit: int = 25) -> None:
+    """
+    Log the startup profile and stop timing imports.
+    """
+    if not ENABLED:
+        return
+    uninstall()
+    res = results()
+    logger.warning("startup: %.1fms since profiler install, %.1fms in imports (pid %s)",
+                   res["since_install_ms"], res["imports_ms"], os.getpid())
+    for p in res["phases"]:
+        logger.warning("startup phase %-24s %8.1fms", p["phase"], p["ms"])
+    for i in res["imports"][:limit]:
+        logger.warning("startup import %-32s %8.1fms self %8.1fms cumulative",
+                       i["module"], i["self_ms"], i["cumulative_ms"])
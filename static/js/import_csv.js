@@ -7,6 +7,9 @@ const ImportCSV = {
   // State
   parsedData: [],
   selectedFile: null,
+  previewToken: null,   // token de la vista previa del servidor (?dry_run=1)
+  edits: {},            // filas editadas: {idx: {i, categoria, concepto}}
+  pollIntervalMs: 1000,
 
   /**
    * Initialize the CSV import UI
@@ -32,6 +35,7 @@ const ImportCSV = {
           <p class="preview-info">
             <span id="preview-count">0</span> transacciones encontradas
           </p>
+          <p id="preview-note" class="preview-info"></p>
           <div class="table-wrapper">
             <table id="preview-table" class="preview-table">
               <thead>
@@ -88,196 +92,75 @@ const ImportCSV = {
   },
 
   /**
-   * Handle file selection
+   * Handle file selection: the server parses the file, marks duplicates
+   * and suggests categories without importing (dry run)
    */
   async handleFileSelect(event) {
     const file = event.target.files[0];
     if (!file) return;
 
     this.selectedFile = file;
+    this.previewToken = null;
+    this.edits = {};
     
     const fileInfo = document.getElementById('file-info');
     fileInfo.textContent = `Archivo: ${file.name} (${this.formatFileSize(file.size)})`;
 
     try {
-      const content = await this.readFileContent(file);
-      this.parsedData = this.parseCSV(content);
+      const formData = new FormData();
+      formData.append('file', file);
+
+      const response = await fetch('/api/import/csv?dry_run=1', {
+        method: 'POST',
+        body: formData
+      });
+      const result = await response.json();
+
+      if (response.status === 413 && result.too_large) {
+        // Demasiado grande para la vista previa: se importa directamente
+        this.parsedData = [];
+        this.showPreview('Archivo demasiado grande para la vista previa: se importará directamente');
+        return;
+      }
+      if (!result.ok) {
+        this.showError(result.error || 'Error al leer el archivo');
+        return;
+      }
+
+      this.parsedData = result.rows.map(([fecha, concepto, importe, duplicate, categoria, subconcepto]) => ({
+        fecha, concepto, importe, duplicate, categoria, subconcepto
+      }));
       
       if (this.parsedData.length === 0) {
         this.showError('No se encontraron transacciones válidas en el archivo CSV');
         return;
       }
 
-      await this.enrichWithSuggestions();
-      this.showPreview();
+      this.previewToken = result.token;
+      this.showPreview(
+        result.duplicates ? `${result.duplicates} ya importadas o repetidas (no se importarán)` : ''
+      );
     } catch (error) {
       this.showError(`Error al leer el archivo: ${error.message}`);
     }
   },
 
-  /**
-   * Read file content as text
-   */
-  readFileContent(file) {
-    return new Promise((resolve, reject) => {
-      const reader = new FileReader();
-      reader.onload = (e) => resolve(e.target.result);
-      reader.onerror = (e) => reject(new Error('Error al leer el archivo'));
-      reader.readAsText(file);
-    });
-  },
-
-  /**
-   * Parse CSV content
-   */
-  parseCSV(content) {
-    const lines = content.split('\n').filter(line => line.trim());
-    if (lines.length < 2) return [];
-
-    const headers = lines[0].split(',').map(h => h.trim().toLowerCase());
-    
-    // Find column indices (flexible column names)
-    const dateIdx = this.findColumnIndex(headers, ['date', 'fecha', 'fecha_transaccion', 'transaction_date']);
-    const descIdx = this.findColumnIndex(headers, ['description', 'descripcion', 'concepto', 'concept', 'memo', 'nota']);
-    const amountIdx = this.findColumnIndex(headers, ['amount', 'importe', 'monto', 'cantidad', 'value']);
-
-    if (dateIdx === -1 || descIdx === -1 || amountIdx === -1) {
-      throw new Error('CSV debe tener columnas: fecha, concepto/descripción, e importe');
-    }
-
-    const transactions = [];
-    
-    for (let i = 1; i < lines.length; i++) {
-      const values = this.parseCSVLine(lines[i]);
-      
-      if (values.length <= Math.max(dateIdx, descIdx, amountIdx)) continue;
-      
-      const fecha = values[dateIdx]?.trim();
-      const concepto = values[descIdx]?.trim();
-      const importeStr = values[amountIdx]?.trim();
-      
-      if (!fecha || !concepto || !importeStr) continue;
-
-      try {
-        const fechaNorm = this.parseDate(fecha);
-        const importe = parseFloat(importeStr.replace(',', '.').replace(/\s/g, ''));
-        
-        if (fechaNorm && !isNaN(importe)) {
-          transactions.push({
-            fecha: fechaNorm,
-            concepto: concepto,
-            importe: importe,
-            categoria: '',
-            subconcepto: ''
-          });
-        }
-      } catch (e) {
-        // Skip invalid row
-      }
-    }
-
-    return transactions;
-  },
-
-  /**
-   * Parse a CSV line handling quoted fields
-   */
-  parseCSVLine(line) {
-    const result = [];
-    let current = '';
-    let inQuotes = false;
-
-    for (let i = 0; i < line.length; i++) {
-      const char = line[i];
-      
-      if (char === '"') {
-        inQuotes = !inQuotes;
-      } else if (char === ',' && !inQuotes) {
-        result.push(current);
-        current = '';
-      } else {
-        current += char;
-      }
-    }
-    result.push(current);
-    
-    return result.map(v => v.trim().replace(/^"|"$/g, ''));
-  },
-
-  /**
-   * Find column index by multiple possible names
-   */
-  findColumnIndex(headers, candidates) {
-    for (const candidate of candidates) {
-      const idx = headers.indexOf(candidate);
-      if (idx !== -1) return idx;
-    }
-    return -1;
-  },
-
-  /**
-   * Parse date string to YYYY-MM-DD
-   */
-  parseDate(dateStr) {
-    // Try ISO format first
-    if (/^\d{4}-\d{2}-\d{2}$/.test(dateStr)) {
-      return dateStr;
-    }
-    
-    // Try DD/MM/YYYY
-    const match1 = dateStr.match(/^(\d{1,2})[\/\-\.](\d{1,2})[\/\-\.](\d{4})$/);
-    if (match1) {
-      const day = match1[1].padStart(2, '0');
-      const month = match1[2].padStart(2, '0');
-      const year = match1[3];
-      return `${year}-${month}-${day}`;
-    }
-    
-    // Try YYYY/MM/DD
-    const match2 = dateStr.match(/^(\d{4})[\/\-\.](\d{1,2})[\/\-\.](\d{1,2})$/);
-    if (match2) {
-      const year = match2[1];
-      const month = match2[2].padStart(2, '0');
-      const day = match2[3].padStart(2, '0');
-      return `${year}-${month}-${day}`;
-    }
-    
-    return null;
-  },
-
-  /**
-   * Enrich transactions with category suggestions
-   */
-  async enrichWithSuggestions() {
-    for (const tx of this.parsedData) {
-      try {
-        const response = await fetch(`/api/sugerir?nota=${encodeURIComponent(tx.concepto)}`);
-        if (response.ok) {
-          const data = await response.json();
-          if (data.sugerencia) {
-            tx.categoria = data.sugerencia.categoria || '';
-            tx.subconcepto = data.sugerencia.concepto || '';
-          }
-        }
-      } catch (e) {
-        // Continue without suggestion
-      }
-    }
-  },
-
   /**
    * Show preview table
    */
-  showPreview() {
+  showPreview(note = '') {
     const previewSection = document.getElementById('preview-section');
     const tbody = document.getElementById('preview-tbody');
     const countSpan = document.getElementById('preview-count');
 
     countSpan.textContent = this.parsedData.length;
+    document.getElementById('preview-note').textContent = note;
     tbody.innerHTML = '';
 
     this.parsedData.forEach((tx, idx) => {
       const row = document.createElement('tr');
+      const disabled = tx.duplicate ? 'disabled' : '';
+      if (tx.duplicate) row.className = 'duplicate';
       row.innerHTML = `
         <td>${tx.fecha}</td>
         <td>${this.escapeHtml(tx.concepto)}</td>
@@ -289,24 +172,25 @@ const ImportCSV = {
                  class="edit-categoria" 
                  data-idx="${idx}" 
                  value="${this.escapeHtml(tx.categoria)}" 
-                 placeholder="Sin categoría" />
+                 placeholder="Sin categoría" ${disabled} />
         </td>
         <td>
           <input type="text" 
                  class="edit-subconcepto" 
                  data-idx="${idx}" 
                  value="${this.escapeHtml(tx.subconcepto)}" 
-                 placeholder="Sin subcategoría" />
+                 placeholder="Sin subcategoría" ${disabled} />
         </td>
       `;
       tbody.appendChild(row);
     });
 
-    // Attach edit listeners
+    // Attach edit listeners (solo se envían al servidor las filas editadas)
     tbody.querySelectorAll('.edit-categoria').forEach(input => {
       input.addEventListener('change', (e) => {
         const idx = parseInt(e.target.dataset.idx);
         this.parsedData[idx].categoria = e.target.value;
+        this.trackEdit(idx);
       });
     });
 
@@ -314,6 +198,7 @@ const ImportCSV = {
       input.addEventListener('change', (e) => {
         const idx = parseInt(e.target.dataset.idx);
         this.parsedData[idx].subconcepto = e.target.value;
+        this.trackEdit(idx);
       });
     });
 
@@ -321,7 +206,16 @@ const ImportCSV = {
   },
 
   /**
-   * Import transactions to backend
+   * Remember an edited row for the confirm request
+   */
+  trackEdit(idx) {
+    const tx = this.parsedData[idx];
+    this.edits[idx] = { i: idx, categoria: tx.categoria, concepto: tx.subconcepto };
+  },
+
+  /**
+   * Import transactions to backend: confirm the server preview, or upload
+   * the file as a background import when there is no preview
    */
   async importTransactions() {
     if (!this.selectedFile) return;
@@ -331,15 +225,31 @@ const ImportCSV = {
     btnImport.textContent = 'Importando...';
 
     try {
-      const formData = new FormData();
-      formData.append('file', this.selectedFile);
-
-      const response = await fetch('/api/import/csv', {
-        method: 'POST',
-        body: formData
-      });
-
-      const result = await response.json();
+      let result;
+      if (this.previewToken) {
+        // El servidor importa lo que ya tiene analizado: no se vuelve a subir el fichero
+        const response = await fetch('/api/import/csv/confirm', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ token: this.previewToken, edits: Object.values(this.edits) })
+        });
+        result = await response.json();
+        if (result.ok) this.previewToken = null;
+      } else {
+        const formData = new FormData();
+        formData.append('file', this.selectedFile);
+
+        // En segundo plano: el servidor responde 202 con el id del trabajo
+        const response = await fetch('/api/import/csv?async=1', {
+          method: 'POST',
+          body: formData
+        });
+
+        result = await response.json();
+        if (response.status === 202 && result.job_id) {
+          result = await this.waitForJob(result.status_url, btnImport);
+        }
+      }
 
       if (result.ok) {
         this.showSuccess(
@@ -362,6 +272,29 @@ const ImportCSV = {
     }
   },
 
+  /**
+   * Poll a background import until it finishes; resolves with the same
+   * shape as the synchronous response ({ok, imported, ...} or {ok: false, error})
+   */
+  async waitForJob(statusUrl, btnImport) {
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, this.pollIntervalMs));
+
+      const response = await fetch(statusUrl);
+      const data = await response.json();
+      if (!data.ok) return data;
+
+      const job = data.job;
+      if (job.status === 'done') {
+        return { ok: true, imported: job.imported, duplicates: job.duplicates, skipped: job.skipped };
+      }
+      if (job.status === 'failed') {
+        return { ok: false, error: job.error };
+      }
+      btnImport.textContent = `Importando... ${job.rows_done} filas`;
+    }
+  },
+
   /**
    * Show success message
    */
@@ -399,6 +332,8 @@ const ImportCSV = {
     
     this.parsedData = [];
     this.selectedFile = null;
+    this.previewToken = null;
+    this.edits = {};
   },
 
   /**
@@ -31,13 +31,15 @@ def app(test_db_path, monkeypatch):
     conn.row_factory = sqlite3.Row
 
     # 2) monkeypatch de acceso a DB
-    def _get_db():
+    def _get_db(*args, **kwargs):
         return conn
 
     if hasattr(db_module, "get_db"):
         monkeypatch.setattr(db_module, "get_db", _get_db, raising=True)
     if hasattr(db_module, "get_conn"):
         monkeypatch.setattr(db_module, "get_conn", _get_db, raising=False)
+    if hasattr(db_module, "get_read_db"):
+        monkeypatch.setattr(db_module, "get_read_db", _get_db, raising=True)
 
     # 3) crear app Flask
     app = create_app()
@@ -51,6 +53,20 @@ def app(test_db_path, monkeypatch):
         pass
 
 
+@pytest.fixture(autouse=True)
+def _clear_suggest_caches(monkeypatch, tmp_path):
+    # Índices en memoria por user_id: cada test usa una BD distinta
+    import categorizer
+    import nota_index
+    import trigram_index
+
+    nota_index.clear()
+    trigram_index.clear()
+    categorizer.clear()
+    monkeypatch.setattr(categorizer, "CATEGORIZER_DIR", str(tmp_path / "models"))
+    yield
+
+
 @pytest.fixture()
 def client(app):
     return app.test_client()
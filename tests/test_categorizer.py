@@ -0,0 +1,126 @@
+import io
+import os
+
+import categorizer
+import db as db_module
+
+
+def _add(conn, user_id, nota, categoria, concepto=""):
+  cur = conn.execute(
+    "INSERT INTO gastos (user_id, fecha, importe, categoria, concepto, nota) VALUES (?,?,?,?,?,?)",
+    (user_id, "2026-01-10", 1.0, categoria, concepto, nota),
+  )
+  conn.commit()
+  return cur.lastrowid
+
+
+def _trained():
+  nb = categorizer.NaiveBayes()
+  nb.learn("Bar Manolo 12", "Ocio", "Bares", 3)
+  nb.learn("Cerveceria La Plaza", "Ocio", "Bares")
+  nb.learn("Gasolinera Repsol", "Transporte", "Gasolina", 2)
+  nb.learn("Gasolinera Cepsa Autovia", "Transporte", "Gasolina")
+  nb.learn("Farmacia Centro", "Salud", "Farmacia")
+  return nb
+
+
+def test_predicts_unseen_wording_from_known_words():
+  nb = _trained()
+  best = nb.predict("BAR LA PLAZA 0042", limit=2)
+  assert (best[0]["categoria"], best[0]["concepto"], best[0]["n"]) == ("Ocio", "Bares", 4)
+  assert best[0]["p"] > 0.8 and best[0]["p"] >= best[1]["p"]
+
+  assert nb.predict("gasolinera shell")[0]["categoria"] == "Transporte"
+  # Ninguna palabra conocida: sin predicción
+  assert nb.predict("zapateria 123") == []
+
+
+def test_forget_removes_counts_and_empty_classes():
+  nb = _trained()
+  nb.learn("Farmacia Centro", "Salud", "Farmacia", -1)
+  assert ("Salud", "Farmacia") not in nb.docs
+  assert "farmacia" not in nb.words
+  assert nb.n_docs == 7
+  assert nb.predict("farmacia") == []
+
+
+def test_snapshot_roundtrip_predicts_the_same():
+  nb = _trained()
+  nb.key = ("db", 10, 8)
+  copy = categorizer.NaiveBayes.from_dict(nb.to_dict())
+  assert copy.key == nb.key
+  assert copy.words == nb.words and copy.totals == nb.totals
+  for nota in ("bar repsol", "cepsa", "plaza centro"):
+    assert copy.predict(nota, 3) == nb.predict(nota, 3)
+
+
+def test_model_catches_up_on_new_rows_and_starts_from_snapshot(app, user_id, monkeypatch):
+  conn = db_module.get_db()
+  with app.app_context():
+    _add(conn, user_id, "Cine Yelmo", "Ocio", "Cine")
+    _add(conn, user_id, "Gasolinera Repsol", "Transporte", "Gasolina")
+    assert categorizer.predict(user_id, "yelmo centro")[0]["categoria"] == "Ocio"
+    assert os.path.exists(categorizer.snapshot_path(user_id))
+
+    # Altas de otro worker: tras expire se aprenden solo las filas nuevas
+    trained_from = []
+    real_train = categorizer._train
+    monkeypatch.setattr(categorizer, "_train", lambda m, u, after: (trained_from.append(after), real_train(m, u, after)))
+    last = _add(conn, user_id, "Kiosko Pepe", "Ocio", "Prensa")
+    categorizer.expire(user_id)
+    assert categorizer.predict(user_id, "kiosko")[0]["concepto"] == "Prensa"
+    assert trained_from == [last - 1]
+
+    # Worker nuevo: parte del snapshot (guardado en el entrenamiento completo)
+    trained_from.clear()
+    categorizer.clear()
+    assert categorizer.predict(user_id, "kiosko")[0]["concepto"] == "Prensa"
+    assert trained_from == [last - 1]
+
+    # Un borrado que no se vio aquí: reentrena desde cero
+    trained_from.clear()
+    conn.execute("DELETE FROM gastos WHERE id = ?", (last,))
+    conn.commit()
+    categorizer.expire(user_id)
+    assert categorizer.predict(user_id, "kiosko") == []
+    assert trained_from == [0]
+
+
+def test_api_writes_update_the_model(client, login, user_id):
+  conn = db_module.get_db()
+  _add(conn, user_id, "Panaderia Sol", "Alimentación", "Pan")
+  _add(conn, user_id, "Gasolinera Repsol", "Transporte", "Gasolina")
+  r = client.get("/api/sugerir?nota=panaderia%20luna")
+  assert r.get_json()["sugerencia"]["concepto"] == "Pan"
+
+  r = client.post("/api/gastos", json={
+    "fecha": "2026-02-01", "categoria": "Ocio", "concepto": "Libros",
+    "nota": "Libreria Luna", "importe": 12,
+  })
+  assert r.status_code == 200
+  assert categorizer.predict(user_id, "luna")[0]["concepto"] == "Libros"
+
+  gasto_id = conn.execute("SELECT MAX(id) FROM gastos").fetchone()[0]
+  assert client.delete(f"/api/gastos/{gasto_id}").status_code == 200
+  assert categorizer.predict(user_id, "luna") == []
+  assert categorizer.predict(user_id, "panaderia")[0]["concepto"] == "Pan"
+
+
+def test_sugerir_and_import_use_the_model_for_new_wording(client, login, user_id):
+  conn = db_module.get_db()
+  for nota in ("Bar Manolo", "Bar Pepe", "Cerveceria Sur"):
+    _add(conn, user_id, nota, "Ocio", "Bares")
+  _add(conn, user_id, "Gasolinera Repsol", "Transporte", "Gasolina")
+
+  # "Restaurante Bar Sur" no se parece lo bastante a ninguna nota
+  r = client.get("/api/sugerir?nota=Restaurante%20Bar%20Sur")
+  body = r.get_json()
+  assert body["sugerencia"]["categoria"] == "Ocio"
+  assert body["matches"][0]["p"] >= categorizer.CATEGORIZER_MIN_PROB
+
+  csv_content = "date,description,amount\n2026-03-01,Restaurante Bar Sur,-20.00\n"
+  r = client.post("/api/import/csv", data={"file": (io.BytesIO(csv_content.encode()), "m.csv")},
+                  content_type="multipart/form-data")
+  assert r.get_json()["imported"] == 1
+  row = conn.execute("SELECT categoria, concepto FROM gastos WHERE nota = 'Restaurante Bar Sur'").fetchone()
+  assert tuple(row) == ("Ocio", "Bares")
@@ -0,0 +1,59 @@
+import csv_format
+
+
+def _lines(text):
+  return text.splitlines(keepends=True)
+
+
+def test_sniffs_spanish_bank_export():
+  fmt = csv_format.sniff(_lines(
+    "Fecha;Concepto;Importe\n"
+    "03/04/2026;MERCADONA 123;-1.234,56\n"
+    "05/04/2026;NOMINA;2.100,00\n"
+    "06/04/2026;BAR;-3,5\n"
+  ))
+  assert fmt["delimiter"] == ";"
+  assert fmt["date_format"] == "%d/%m/%Y"
+  assert (fmt["decimal"], fmt["thousands"]) == (",", ".")
+  assert fmt["columns"] == {"date": "Fecha", "description": "Concepto", "amount": "Importe"}
+
+
+def test_sniffs_us_export_and_month_first_dates():
+  fmt = csv_format.sniff(_lines(
+    "date,description,amount\n"
+    "04/03/2026,Grocery,\"-1,234.56\"\n"
+    "04/13/2026,Coffee,-3.50\n"
+  ))
+  assert fmt["delimiter"] == ","
+  # 04/13 no es día/mes: el formato americano es el único que encaja
+  assert fmt["date_format"] == "%m/%d/%Y"
+  assert (fmt["decimal"], fmt["thousands"]) == (".", ",")
+
+
+def test_ambiguous_amounts_keep_comma_as_decimal():
+  fmt = csv_format.sniff(_lines("date\tnota\timporte\n2026-01-01\tx\t1,234\n"))
+  assert fmt["delimiter"] == "\t"
+  assert fmt["date_format"] == "%Y-%m-%d"
+  assert fmt["decimal"] == ","
+  assert csv_format.sniff(_lines("date,nota,importe\n2026-01-01,x,1.234\n"))["decimal"] == "."
+
+
+def test_missing_columns_and_unknown_dates():
+  fmt = csv_format.sniff(_lines("a;b;c\n1;2;3\n"))
+  assert fmt["columns"]["date"] is None
+  assert csv_format.sniff(_lines("date,nota,importe\nayer,x,1\n"))["date_format"] is None
+
+
+def test_fixed_parsers():
+  parse = csv_format.date_parser("%d.%m.%Y")
+  assert parse("30.01.2026") == "2026-01-30"
+  assert parse("31.02.2026") is None
+  assert parse("2026-01-30") is None
+  assert csv_format.date_parser("%Y%m%d")("20260130") == "2026-01-30"
+
+  amount = csv_format.amount_parser(",", ".")
+  assert amount("-1.234,56 €") == "-1234.56"
+  assert csv_format.amount_parser(".", ",")("1,234.5") == "1234.5"
+
+  assert csv_format.parse_date("01/30/2026") == "2026-01-30"
+  assert csv_format.parse_date("nope") is None
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import threading
+
+import pytest
+
+import db as db_module
+
+
+@pytest.fixture()
+def pool_path():
+    d = tempfile.mkdtemp(prefix="gastos_pool_")
+    return os.path.join(d, "pool.db")
+
+
+def test_pool_applies_pragma_profile(pool_path):
+    pool = db_module.ConnectionPool(pool_path, max_size=2)
+    conn = pool.acquire()
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2   # MEMORY
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == db_module.PRAGMA_PROFILE["busy_timeout"]
+    finally:
+        pool.release(conn)
+        pool.close_all()
+
+
+def test_pool_reuses_released_connection(pool_path):
+    pool = db_module.ConnectionPool(pool_path, max_size=2)
+    c1 = pool.acquire()
+    pool.release(c1)
+    c2 = pool.acquire()
+    assert c2 is c1
+
+    stats = pool.stats()
+    assert stats["checkouts"] == 2
+    assert stats["created"] == 1
+    assert stats["open"] == 1
+    assert stats["in_use"] == 1
+    pool.release(c2)
+    pool.close_all()
+
+
+def test_pool_rolls_back_on_release(pool_path):
+    pool = db_module.ConnectionPool(pool_path, max_size=1)
+    conn = pool.acquire()
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.execute("INSERT INTO t VALUES (1)")
+    assert conn.in_transaction
+    pool.release(conn)
+
+    conn = pool.acquire()
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    pool.release(conn)
+    pool.close_all()
+
+
+def test_pool_is_bounded_and_times_out(pool_path):
+    pool = db_module.ConnectionPool(pool_path, max_size=1, timeout=0.05)
+    conn = pool.acquire()
+    with pytest.raises(db_module.PoolTimeout):
+        pool.acquire()
+
+    stats = pool.stats()
+    assert stats["waits"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["open"] == 1
+    pool.release(conn)
+    pool.close_all()
+
+
+def test_pool_waiter_gets_released_connection(pool_path):
+    pool = db_module.ConnectionPool(pool_path, max_size=1, timeout=2)
+    conn = pool.acquire()
+    got = []
+
+    t = threading.Thread(target=lambda: got.append(pool.acquire()))
+    t.start()
+    pool.release(conn)
+    t.join(timeout=2)
+
+    assert got and got[0] is conn
+    pool.release(got[0])
+    pool.close_all()
@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+import db as db_module
+import dedupe
+import rollup
+import schema
+from app import create_app
+
+INS = "INSERT INTO gastos (user_id, fecha, categoria, concepto, nota, importe) VALUES (?, ?, ?, '', ?, ?)"
+
+
+def _conn():
+    conn = sqlite3.connect(":memory:")
+    schema.migrate(conn)
+    return conn
+
+
+def _fingerprints(conn):
+    return conn.execute("SELECT id, fingerprint FROM gastos ORDER BY id").fetchall()
+
+
+def test_triggers_fill_fingerprint_and_pass_it_on():
+    conn = _conn()
+    conn.execute(INS, (1, "2026-01-01", "A", " Cafe ", 1.2))
+    conn.execute(INS, (1, "2026-01-01", "A", "CAFE", 1.2))    # repite la 1: sin huella
+    conn.execute(INS, (2, "2026-01-01", "A", "cafe", 1.2))    # otro usuario
+    assert _fingerprints(conn) == [(1, "2026-01-01|120|cafe"), (2, None), (3, "2026-01-01|120|cafe")]
+
+    # Al borrar la que la tenía, la hereda la repetida
+    conn.execute("DELETE FROM gastos WHERE id = 1")
+    assert _fingerprints(conn) == [(2, "2026-01-01|120|cafe"), (3, "2026-01-01|120|cafe")]
+
+    conn.execute("UPDATE gastos SET importe = 2 WHERE id = 2")
+    assert _fingerprints(conn)[0] == (2, "2026-01-01|200|cafe")
+
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute(
+            "INSERT INTO gastos (user_id, fecha, nota, importe_cents, fingerprint) VALUES (2, '2026-01-01', 'x', 1, ?)",
+            ("2026-01-01|120|cafe",),
+        )
+
+
+def test_migration_backfills_first_of_each_group(monkeypatch):
+    conn = sqlite3.connect(":memory:")
+    monkeypatch.setattr(schema, "MIGRATIONS", schema.MIGRATIONS[:7])
+    monkeypatch.setattr(schema, "SCHEMA_VERSION", 7)
+    schema.migrate(conn)
+    for row in ((1, "2026-01-01", "A", "Pan", 1), (1, "2026-01-01", "", "pan", 1), (1, "2026-01-02", "A", "Pan", 1)):
+        conn.execute(INS, row)
+    conn.commit()
+    monkeypatch.undo()
+
+    assert schema.migrate(conn) == [8]
+    assert _fingerprints(conn) == [(1, "2026-01-01|100|pan"), (2, None), (3, "2026-01-02|100|pan")]
+
+
+def _seed_duplicates(conn):
+    rows = [
+        (1, "2026-01-01", "", "MERCADONA", -10),
+        (1, "2026-01-01", "Alimentación", "mercadona", -10),
+        (1, "2026-01-01", "Otros", "Mercadona ", -10),
+        (1, "2026-01-02", "", "MERCADONA", -10),
+        (1, "2026-01-03", "Ocio", "Cine", -8),
+        (1, "2026-01-03", "Ocio", "Cine", -8),
+        (2, "2026-01-03", "Ocio", "Cine", -8),
+    ]
+    for row in rows:
+        conn.execute(INS, row)
+    conn.commit()
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 5000])
+def test_sweep_merges_duplicates_in_chunks(chunk_rows):
+    conn = _conn()
+    _seed_duplicates(conn)
+
+    stats = dedupe.sweep(conn, chunk_rows=chunk_rows)
+    assert (stats["groups"], stats["duplicates"], stats["deleted"]) == (2, 3, 0)
+    assert {d["id"]: d["keep_id"] for d in stats["examples"]} == {2: 1, 3: 1, 6: 5}
+    assert conn.execute("SELECT COUNT(*) FROM gastos").fetchone()[0] == 7
+
+    stats = dedupe.sweep(conn, fix=True, chunk_rows=chunk_rows)
+    assert stats["deleted"] == 3
+    rows = conn.execute("SELECT id, categoria, fingerprint IS NOT NULL FROM gastos ORDER BY id").fetchall()
+    # La más antigua se queda y toma la categoría del primer duplicado que la tenía
+    assert rows == [(1, "Alimentación", 1), (4, "", 1), (5, "Ocio", 1), (7, "Ocio", 1)]
+    assert rollup.verify(conn) == []
+    assert dedupe.sweep(conn, chunk_rows=chunk_rows)["duplicates"] == 0
+    assert not conn.in_transaction
+
+
+def test_sweep_one_user():
+    conn = _conn()
+    _seed_duplicates(conn)
+    conn.execute(INS, (2, "2026-01-03", "Ocio", "cine", -8))
+    conn.commit()
+
+    stats = dedupe.sweep(conn, user_id=2, fix=True, chunk_rows=1)
+    assert (stats["duplicates"], stats["deleted"]) == (1, 1)
+    assert dedupe.sweep(conn, user_id=1)["duplicates"] == 3
+    assert dedupe.sweep(conn, user_id=3) == {"chunks": 0, "groups": 0, "duplicates": 0, "deleted": 0, "examples": []}
+
+
+@pytest.fixture()
+def file_db(monkeypatch):
+    d = tempfile.mkdtemp(prefix="gastos_dedupe_")
+    path = os.path.join(d, "gastos.db")
+    monkeypatch.setattr(db_module, "DB_PATH", path)
+    monkeypatch.setattr(db_module, "READ_DB_PATH", path)
+    conn = sqlite3.connect(path)
+    schema.migrate(conn)
+    _seed_duplicates(conn)
+    conn.close()
+    return path
+
+
+def test_dedupe_cli(file_db):
+    runner = create_app().test_cli_runner()
+
+    result = runner.invoke(args=["gastos", "dedupe"])
+    assert result.exit_code != 0
+    assert "3 duplicados en 2 grupos" in result.output
+
+    result = runner.invoke(args=["gastos", "dedupe", "--fix", "--chunk", "2"])
+    assert result.exit_code == 0, result.output
+    assert "3 borrados" in result.output
+    assert runner.invoke(args=["gastos", "dedupe"]).exit_code == 0
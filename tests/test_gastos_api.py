@@ -38,3 +38,88 @@ def test_post_gasto_rejects_missing_amount(client, login):
   payload = {"fecha": "2026-01-21", "categoria": "Otros", "concepto": "Varios"}
   r = client.post("/api/gastos", json=payload)
   assert r.status_code in (400, 422)
+
+
+def test_get_gastos_month_filter_uses_range(client, login, user_id):
+  conn = db_module.get_db()
+  for fecha in ("2025-12-31", "2026-01-01", "2026-01-31", "2026-02-01"):
+    conn.execute(
+      "INSERT INTO gastos (user_id, fecha, importe, categoria, concepto, nota) VALUES (?,?,?,?,?,?)",
+      (user_id, fecha, 1.0, "Otros", "Varios", fecha),
+    )
+  conn.commit()
+
+  data = client.get("/api/gastos?mes=2026-01").get_json()
+  assert [g["fecha"] for g in data] == ["2026-01-31", "2026-01-01"]
+
+  data = client.get("/api/gastos?mes=2025-12").get_json()
+  assert [g["fecha"] for g in data] == ["2025-12-31"]
+
+  # Un mes mal formado no rompe nada: simplemente no coincide
+  assert client.get("/api/gastos?mes=enero").get_json() == []
+
+
+def test_month_filter_plan_uses_user_fecha_index(app):
+  from api_routes.utils import month_filter
+
+  conn = db_module.get_db()
+  cond, params = month_filter("2026-01")
+  plan = " ".join(
+    r[3] for r in conn.execute(
+      f"EXPLAIN QUERY PLAN SELECT id FROM gastos WHERE user_id = ? AND {cond} ORDER BY fecha DESC, id DESC",
+      [1] + params,
+    )
+  )
+  assert "idx_gastos_user_fecha" in plan
+  assert "fecha>? AND fecha<?" in plan.replace("=", "")
+
+
+def _add_notes(conn, user_id, rows):
+  for fecha, concepto, nota in rows:
+    conn.execute(
+      "INSERT INTO gastos (user_id, fecha, importe, categoria, concepto, nota) VALUES (?,?,?,?,?,?)",
+      (user_id, fecha, 1.0, "Otros", concepto, nota),
+    )
+  conn.commit()
+
+
+def test_get_gastos_q_uses_fts(client, login, user_id):
+  conn = db_module.get_db()
+  _add_notes(conn, user_id, [
+    ("2026-01-01", "Bar", "Café con leche"),
+    ("2026-01-02", "Supermercado", "compra semanal"),
+    ("2026-01-03", "Varios", "cafe cafe CAFÉ"),
+  ])
+
+  # Sin acentos ni mayúsculas, por prefijo y por relevancia
+  data = client.get("/api/gastos?q=CAF").get_json()
+  assert [g["fecha"] for g in data] == ["2026-01-03", "2026-01-01"]
+
+  # También busca en concepto; todas las palabras son obligatorias
+  assert [g["fecha"] for g in client.get("/api/gastos?q=super").get_json()] == ["2026-01-02"]
+  assert client.get("/api/gastos?q=super cafe").get_json() == []
+
+  # Los triggers mantienen el índice
+  conn.execute("UPDATE gastos SET nota = 'té' WHERE fecha = '2026-01-01'")
+  conn.execute("DELETE FROM gastos WHERE fecha = '2026-01-03'")
+  conn.commit()
+  assert client.get("/api/gastos?q=cafe").get_json() == []
+  assert [g["fecha"] for g in client.get("/api/gastos?q=te").get_json()] == ["2026-01-01"]
+
+  # Operadores FTS5 en q no rompen la consulta
+  assert client.get('/api/gastos?q="compra OR NEAR(').status_code == 200
+
+
+def test_get_gastos_q_falls_back_to_like_without_fts(client, login, user_id):
+  conn = db_module.get_db()
+  for name in ("trg_gastos_fts_ai", "trg_gastos_fts_ad", "trg_gastos_fts_au"):
+    conn.execute(f"DROP TRIGGER {name}")
+  conn.execute("DROP TABLE gastos_fts")
+  _add_notes(conn, user_id, [
+    ("2026-01-01", "Bar", "Café con leche"),
+    ("2026-01-02", "Supermercado", "50% dto"),
+  ])
+
+  assert [g["fecha"] for g in client.get("/api/gastos?q=leche").get_json()] == ["2026-01-01"]
+  assert [g["fecha"] for g in client.get("/api/gastos?q=mercado").get_json()] == ["2026-01-02"]
+  assert [g["fecha"] for g in client.get("/api/gastos?q=%25").get_json()] == ["2026-01-02"]
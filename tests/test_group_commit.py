@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import tempfile
+import threading
+
+import pytest
+
+import db as db_module
+
+
+@pytest.fixture()
+def writer():
+    d = tempfile.mkdtemp(prefix="gastos_writer_")
+    path = os.path.join(d, "writer.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, x INTEGER NOT NULL)")
+    conn.commit()
+    conn.close()
+    return db_module.GroupCommitWriter(path, max_batch=16, window_ms=30)
+
+
+def _count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_writer_returns_per_call_results(writer):
+    res = writer.submit("INSERT INTO t (x) VALUES (?)", (1,))
+    assert res.rowcount == 1
+    assert res.lastrowid == 1
+    assert _count(writer.db_path) == 1
+
+
+def test_writer_batches_concurrent_writes(writer):
+    n = 12
+    barrier = threading.Barrier(n)
+    results = []
+
+    def worker(i):
+        barrier.wait()
+        results.append(writer.submit("INSERT INTO t (x) VALUES (?)", (i,)))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert len(results) == n
+    assert len({r.lastrowid for r in results}) == n
+    assert _count(writer.db_path) == n
+
+    stats = writer.stats()
+    assert stats["writes"] == n
+    assert stats["batches"] < n
+    assert stats["max_batch"] > 1
+
+
+def test_writer_isolates_failing_statement(writer):
+    n = 4
+    barrier = threading.Barrier(n)
+    errors = []
+
+    def worker(i):
+        barrier.wait()
+        try:
+            # x NOT NULL -> la escritura i == 0 falla
+            writer.submit("INSERT INTO t (x) VALUES (?)", (None if i == 0 else i,))
+        except sqlite3.IntegrityError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert len(errors) == 1
+    assert _count(writer.db_path) == n - 1
+    assert writer.stats()["errors"] == 1
+
+
+def test_db_exec_uses_writer_in_group_mode(writer, monkeypatch):
+    monkeypatch.setattr(db_module, "WRITE_MODE", "group")
+    monkeypatch.setattr(db_module, "get_writer", lambda db_path=None: writer)
+
+    res = db_module.db_exec("INSERT INTO t (x) VALUES (?)", (7,))
+    assert isinstance(res, db_module.WriteResult)
+    assert _count(writer.db_path) == 1
+
+
+def test_lone_write_skips_collection_window(tmp_path):
+    path = str(tmp_path / "lone.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, x INTEGER NOT NULL)")
+    conn.commit()
+    conn.close()
+    # Ventana enorme: si el writer la esperara con un solo escritor, se notaría
+    slow = db_module.GroupCommitWriter(path, max_batch=16, window_ms=2000)
+
+    import time
+    t0 = time.perf_counter()
+    for i in range(3):
+        slow.submit("INSERT INTO t (x) VALUES (?)", (i,))
+    assert time.perf_counter() - t0 < 1.0
+
+    stats = slow.stats()
+    assert stats["batches"] == 3
+    assert stats["window_skips"] == 3
@@ -259,3 +259,172 @@ def test_import_csv_with_utf8_bom(client, login, user_id):
     result = r.get_json()
     assert result["ok"] is True
     assert result["imported"] == 1
+
+
+def _post_csv(client, csv_content, name="bank.csv"):
+    data = {'file': (io.BytesIO(csv_content.encode('utf-8')), name)}
+    return client.post("/api/import/csv", data=data, content_type='multipart/form-data')
+
+
+def test_import_csv_counters_match_row_by_row(client, login, user_id):
+    """Duplicates vs history and inside the file, categories from history"""
+    conn = db_module.get_db()
+    conn.execute(
+        "INSERT INTO gastos (user_id, fecha, categoria, concepto, nota, importe, created_at) "
+        "VALUES (?, '2026-01-01', 'Alimentación', 'Supermercado', 'MERCADONA', -10.5, datetime('now'))",
+        (user_id,),
+    )
+    conn.commit()
+
+    csv_content = """date,description,amount
+2026-01-01,MERCADONA,-10.50
+2026-01-02,Mercadona,-3.20
+2026-01-03,Cine,-8.00
+2026-01-03,Cine,-8.00
+2026-01-04,MERCADONA 4411,-7.00
+"""
+    result = _post_csv(client, csv_content).get_json()
+    assert (result["imported"], result["skipped"], result["duplicates"]) == (3, 0, 2)
+
+    rows = conn.execute(
+        "SELECT fecha, nota, categoria, concepto, importe_cents, source FROM gastos "
+        "WHERE user_id = ? AND source = 'csv_import' ORDER BY id",
+        (user_id,),
+    ).fetchall()
+    assert [tuple(r) for r in rows] == [
+        ("2026-01-02", "Mercadona", "Alimentación", "Supermercado", -320, "csv_import"),
+        ("2026-01-03", "Cine", "", "", -800, "csv_import"),
+        ("2026-01-04", "MERCADONA 4411", "Alimentación", "Supermercado", -700, "csv_import"),
+    ]
+
+    # Reimportar el mismo fichero: todo duplicado
+    result = _post_csv(client, csv_content).get_json()
+    assert (result["imported"], result["skipped"], result["duplicates"]) == (0, 0, 5)
+    assert not conn.in_transaction
+
+
+def test_import_csv_counts_rejected_rows_as_skipped(client, login, user_id):
+    conn = db_module.get_db()
+    conn.execute(
+        "CREATE TEMP TRIGGER reject_boom BEFORE INSERT ON main.gastos "
+        "WHEN NEW.nota = 'boom' BEGIN SELECT RAISE(ABORT, 'boom'); END"
+    )
+    csv_content = """date,description,amount
+2026-01-01,uno,-1
+2026-01-02,boom,-2
+2026-01-03,tres,-3
+"""
+    result = _post_csv(client, csv_content).get_json()
+    assert (result["imported"], result["skipped"], result["duplicates"]) == (2, 1, 0)
+    assert _count_gastos(conn, user_id) == 2
+
+
+def _big_csv(rows):
+    lines = ["date,description,amount"]
+    for i in range(rows):
+        lines.append(f"2026-{i % 12 + 1:02d}-{i % 28 + 1:02d},Compra tienda {i % 50},-{i % 90 + 1}.{i % 100:02d}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def test_import_csv_streams_with_bounded_memory(client, login, user_id, monkeypatch):
+    """Memory used by the import itself doesn't grow with the file size"""
+    import tracemalloc
+    from api_routes import import_csv
+
+    monkeypatch.setattr(import_csv, "IMPORT_CHUNK_ROWS", 200)
+    # Pico durante run_import (lectura en streaming + bloques), sin el test
+    # client ni el parser multipart, que sí dependen del tamaño de la subida
+    peaks = []
+    real_run_import = import_csv.run_import
+
+    def measured(*args, **kwargs):
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            out = real_run_import(*args, **kwargs)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+            return out
+        finally:
+            tracemalloc.stop()
+
+    monkeypatch.setattr(import_csv, "run_import", measured)
+    # Calentar imports, índices y modelo en memoria (varios bloques)
+    _post_csv(client, _big_csv(1000).replace(b"2026-", b"1999-").decode("utf-8"))
+
+    extra = {}
+    for rows in (2000, 10000):
+        body = _big_csv(rows).replace(b"2026-", str(2000 + rows // 1000).encode() + b"-")
+        r = client.post("/api/import/csv", data={'file': (io.BytesIO(body), 'big.csv')},
+                        content_type='multipart/form-data')
+        assert r.status_code == 200
+        assert r.get_json()["imported"] + r.get_json()["duplicates"] == rows
+        extra[rows] = peaks[-1]
+
+    # 5x más filas: el pico del import se queda en lo que ocupa un bloque
+    assert len(body) > 300_000
+    assert extra[10000] - extra[2000] < len(body) / 10, (extra, len(body))
+
+
+def test_import_csv_rejects_uploads_over_limit(app, client, login):
+    app.config["MAX_CONTENT_LENGTH"] = 1024
+    r = client.post("/api/import/csv", data={'file': (io.BytesIO(_big_csv(200)), 'big.csv')},
+                    content_type='multipart/form-data')
+    assert r.status_code == 413
+    assert r.get_json()["ok"] is False
+
+
+def test_import_csv_spanish_bank_format(client, login, user_id):
+    """';' delimiter, day-first dates and 1.234,56 amounts are sniffed and reported"""
+    conn = db_module.get_db()
+    csv_content = (
+        "Fecha;Concepto;Importe\n"
+        "03/04/2026;MERCADONA 123;-1.234,56\n"
+        "05/04/2026;NOMINA ABRIL;2.100,00\n"
+        "06/04/2026;BAR PACO;-3,5\n"
+        "2026-04-07;OTRO FORMATO;-1,00\n"
+    )
+    result = _post_csv(client, csv_content).get_json()
+    assert result["imported"] == 4
+    assert result["format"] == {
+        "delimiter": ";",
+        "date_format": "%d/%m/%Y",
+        "decimal": ",",
+        "thousands": ".",
+        "columns": {"date": "Fecha", "description": "Concepto", "amount": "Importe"},
+    }
+    rows = conn.execute(
+        "SELECT fecha, nota, importe_cents FROM gastos WHERE user_id = ? ORDER BY fecha", (user_id,)
+    ).fetchall()
+    assert [tuple(r) for r in rows] == [
+        ("2026-04-03", "MERCADONA 123", -123456),
+        ("2026-04-05", "NOMINA ABRIL", 210000),
+        ("2026-04-06", "BAR PACO", -350),
+        # Fila con otro formato de fecha: se prueban todos
+        ("2026-04-07", "OTRO FORMATO", -100),
+    ]
+
+
+def test_import_csv_duplicates_by_fingerprint(client, login, user_id):
+    """Note compared trimmed and case-insensitive; manual repeats still allowed"""
+    from api_routes import import_csv
+
+    conn = db_module.get_db()
+    for _ in range(2):
+        r = client.post("/api/gastos", json={
+            "fecha": "2026-05-01", "importe": -3, "categoria": "Alimentación", "nota": "MERCADONA ",
+        })
+        assert r.status_code == 200
+    assert import_csv.check_duplicate(user_id, "2026-05-01", "mercadona", -300)
+    assert not import_csv.check_duplicate(user_id, "2026-05-01", "mercadona", -301)
+
+    csv_content = """date,description,amount
+2026-05-01,Mercadona,-3.00
+2026-05-01,Mercadona,-3.01
+2026-05-01,mercadona,-3.01
+"""
+    result = _post_csv(client, csv_content).get_json()
+    assert (result["imported"], result["skipped"], result["duplicates"]) == (1, 0, 2)
+    n = conn.execute(
+        "SELECT COUNT(*) FROM gastos WHERE user_id = ? AND fecha = '2026-05-01'", (user_id,)
+    ).fetchone()[0]
+    assert n == 3
@@ -0,0 +1,113 @@
+import io
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import db as db_module
+import import_jobs
+
+
+@pytest.fixture
+def inline_jobs(monkeypatch, tmp_path):
+    # La conexión compartida de los tests no admite otros hilos: el trabajo
+    # se ejecuta en el propio request
+    monkeypatch.setattr(import_jobs, "SPOOL_DIR", str(tmp_path / "imports"))
+    monkeypatch.setattr(import_jobs, "_submit", lambda fn, *args: fn(*args))
+    return tmp_path / "imports"
+
+
+def _post_async(client, content: bytes, name="movs.csv"):
+    data = {"file": (io.BytesIO(content), name)}
+    return client.post("/api/import/csv?async=1", data=data, content_type="multipart/form-data")
+
+
+def test_async_import_runs_job_and_reports_counters(client, login, user_id, inline_jobs, monkeypatch):
+    monkeypatch.setattr("api_routes.import_csv.IMPORT_CHUNK_ROWS", 2)
+    csv_content = (
+        "date,description,amount\n"
+        "2026-03-01,Panaderia,-2.50\n"
+        "2026-03-02,Kiosko,-1.20\n"
+        "2026-03-02,Kiosko,-1.20\n"
+        "2026-03-03,Farmacia,-8.00\n"
+        "2026-03-04,,\n"
+    )
+    r = _post_async(client, csv_content.encode("utf-8"))
+    assert r.status_code == 202
+    body = r.get_json()
+    assert body["ok"] is True and body["job_id"]
+    assert body["status_url"] == f"/api/import/jobs/{body['job_id']}"
+
+    r = client.get(body["status_url"])
+    assert r.status_code == 200
+    job = r.get_json()["job"]
+    assert job["status"] == "done"
+    assert job["filename"] == "movs.csv"
+    assert job["rows_done"] == 4
+    assert (job["imported"], job["duplicates"], job["skipped"]) == (3, 1, 0)
+    assert job["error"] is None and job["finished_at"]
+    assert job["format"]["delimiter"] == "," and job["format"]["date_format"] == "%Y-%m-%d"
+
+    conn = db_module.get_db()
+    n = conn.execute(
+        "SELECT COUNT(*) FROM gastos WHERE user_id = ? AND fecha LIKE '2026-03-%'", (user_id,)
+    ).fetchone()[0]
+    assert n == 3
+    # El fichero temporal se borra al terminar
+    assert os.listdir(inline_jobs) == []
+
+
+def test_async_import_progress_is_persisted_per_chunk(client, login, inline_jobs, monkeypatch):
+    monkeypatch.setattr("api_routes.import_csv.IMPORT_CHUNK_ROWS", 2)
+    seen = []
+    real_update = import_jobs._update
+
+    def spy(job_id, **fields):
+        if "rows_done" in fields and "status" not in fields:
+            seen.append(fields["rows_done"])
+        real_update(job_id, **fields)
+
+    monkeypatch.setattr(import_jobs, "_update", spy)
+    rows = "".join(f"2026-04-{d:02d},Tienda {d},-{d}.00\n" for d in range(1, 6))
+    r = _post_async(client, ("date,description,amount\n" + rows).encode("utf-8"))
+    assert r.status_code == 202
+    assert seen == [2, 4, 5]
+
+
+def test_async_import_failure_is_reported(client, login, inline_jobs):
+    r = _post_async(client, b"date,description,amount\n2026-01-01,Caf\xe9,-1.00\n")
+    assert r.status_code == 202
+    job = client.get(r.get_json()["status_url"]).get_json()["job"]
+    assert job["status"] == "failed"
+    assert "encoding" in job["error"].lower()
+
+
+def test_import_job_is_owner_only(client, login, inline_jobs):
+    r = _post_async(client, b"date,description,amount\n2026-01-01,Uno,-1.00\n")
+    job_id = r.get_json()["job_id"]
+    db_module.get_db().execute("UPDATE import_jobs SET user_id = user_id + 1000 WHERE id = ?", (job_id,))
+
+    r = client.get(f"/api/import/jobs/{job_id}")
+    assert r.status_code == 404
+    assert client.get("/api/import/jobs/nope").status_code == 404
+
+
+def test_stale_running_job_is_marked_failed(client, login, user_id):
+    old = (datetime.now(timezone.utc) - timedelta(seconds=import_jobs.JOB_STALE_S + 60)).isoformat()
+    conn = db_module.get_db()
+    conn.execute(
+        "INSERT INTO import_jobs (id, user_id, status, filename, rows_done, created_at, updated_at) "
+        "VALUES ('stale', ?, 'running', 'x.csv', 1000, ?, ?)",
+        (user_id, old, old),
+    )
+    conn.commit()
+
+    job = client.get("/api/import/jobs/stale").get_json()["job"]
+    assert job["status"] == "failed"
+    assert "interrupted" in job["error"].lower()
+    row = conn.execute("SELECT status FROM import_jobs WHERE id = 'stale'").fetchone()
+    assert row[0] == "failed"
+
+
+def test_import_jobs_requires_login(client):
+    assert client.get("/api/import/jobs/abc").status_code == 302
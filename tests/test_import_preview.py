@@ -0,0 +1,140 @@
+import io
+import os
+import time
+
+import pytest
+
+import db as db_module
+import import_jobs
+import import_previews
+
+
+@pytest.fixture
+def spool(monkeypatch, tmp_path):
+    monkeypatch.setattr(import_jobs, "SPOOL_DIR", str(tmp_path / "imports"))
+    return tmp_path / "imports"
+
+
+def _dry_run(client, content: str, name="movs.csv"):
+    data = {"file": (io.BytesIO(content.encode("utf-8")), name)}
+    return client.post("/api/import/csv?dry_run=1", data=data, content_type="multipart/form-data")
+
+
+def _count(user_id):
+    conn = db_module.get_db()
+    return conn.execute("SELECT COUNT(*) FROM gastos WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+
+def _seed(user_id):
+    conn = db_module.get_db()
+    conn.execute(
+        "INSERT INTO gastos (user_id, fecha, categoria, concepto, nota, importe, importe_cents, created_at) "
+        "VALUES (?, '2026-02-01', 'Alimentación', 'Pan', 'Panaderia Paqui', -2.5, -250, datetime('now'))",
+        (user_id,),
+    )
+    conn.commit()
+
+
+CSV = (
+    "Fecha;Concepto;Importe\n"
+    "01/02/2026;Panaderia Paqui;-2,50\n"
+    "03/02/2026;Panaderia Paqui;-1.234,56\n"
+    "04/02/2026;Kiosko;-1,20\n"
+    "04/02/2026;Kiosko;-1,20\n"
+)
+
+
+def test_dry_run_previews_without_writing(client, login, user_id, spool):
+    _seed(user_id)
+    before = _count(user_id)
+
+    r = _dry_run(client, CSV)
+    assert r.status_code == 200
+    body = r.get_json()
+    assert body["ok"] is True and body["token"]
+    assert body["format"]["delimiter"] == ";" and body["format"]["decimal"] == ","
+    assert (body["total"], body["duplicates"]) == (4, 2)
+    assert body["columns"] == ["fecha", "nota", "importe", "duplicate", "categoria", "concepto"]
+    assert body["rows"] == [
+        ["2026-02-01", "Panaderia Paqui", -2.5, True, "", ""],
+        ["2026-02-03", "Panaderia Paqui", -1234.56, False, "Alimentación", "Pan"],
+        ["2026-02-04", "Kiosko", -1.2, False, "", ""],
+        ["2026-02-04", "Kiosko", -1.2, True, "", ""],
+    ]
+
+    assert _count(user_id) == before
+    assert os.listdir(spool) == [f"preview-{body['token']}.json"]
+
+
+def test_confirm_imports_preview_with_edits(client, login, user_id, spool):
+    _seed(user_id)
+    before = _count(user_id)
+    token = _dry_run(client, CSV).get_json()["token"]
+
+    r = client.post("/api/import/csv/confirm", json={
+        "token": token,
+        "edits": [{"i": 2, "categoria": "Ocio", "concepto": "Prensa"}],
+    })
+    assert r.status_code == 200
+    body = r.get_json()
+    assert (body["imported"], body["duplicates"], body["skipped"]) == (2, 2, 0)
+    assert body["format"]["date_format"] == "%d/%m/%Y"
+    assert _count(user_id) == before + 2
+
+    rows = db_module.get_db().execute(
+        "SELECT fecha, nota, importe_cents, categoria, concepto, source FROM gastos "
+        "WHERE user_id = ? AND fecha > '2026-02-01' ORDER BY fecha",
+        (user_id,),
+    ).fetchall()
+    assert [tuple(r) for r in rows] == [
+        ("2026-02-03", "Panaderia Paqui", -123456, "Alimentación", "Pan", "csv_import"),
+        ("2026-02-04", "Kiosko", -120, "Ocio", "Prensa", "csv_import"),
+    ]
+
+    # Un solo uso
+    assert os.listdir(spool) == []
+    r = client.post("/api/import/csv/confirm", json={"token": token})
+    assert r.status_code == 404
+
+
+def test_confirm_rejects_bad_edits_and_keeps_token(client, login, user_id, spool):
+    before = _count(user_id)
+    token = _dry_run(client, CSV).get_json()["token"]
+
+    r = client.post("/api/import/csv/confirm", json={"token": token, "edits": [{"i": 99, "categoria": "X"}]})
+    assert r.status_code == 400
+    assert _count(user_id) == before
+
+    r = client.post("/api/import/csv/confirm", json={"token": token})
+    assert r.status_code == 200
+    assert r.get_json()["imported"] == 3
+
+
+def test_confirm_unknown_expired_or_foreign_token(client, login, user_id, spool, monkeypatch):
+    assert client.post("/api/import/csv/confirm", json={"token": "../../etc/passwd"}).status_code == 404
+    assert client.post("/api/import/csv/confirm", json={}).status_code == 404
+
+    foreign = import_previews.save(user_id + 1, {}, [["2026-01-01", "X", -100, None, None]])
+    assert client.post("/api/import/csv/confirm", json={"token": foreign}).status_code == 404
+    # Sigue ahí para su dueño
+    assert import_previews.preview_path(foreign).exists()
+
+    token = _dry_run(client, CSV).get_json()["token"]
+    monkeypatch.setattr(import_previews, "PREVIEW_TTL_S", 0)
+    time.sleep(0.01)
+    assert client.post("/api/import/csv/confirm", json={"token": token}).status_code == 404
+    assert not import_previews.preview_path(token).exists()
+
+
+def test_dry_run_over_limit_is_rejected(client, login, spool, monkeypatch):
+    monkeypatch.setattr(import_previews, "PREVIEW_MAX_ROWS", 2)
+    r = _dry_run(client, CSV)
+    assert r.status_code == 413
+    body = r.get_json()
+    assert body["ok"] is False and body["too_large"] is True
+    assert not spool.exists() or os.listdir(spool) == []
+
+
+def test_confirm_requires_login(client):
+    r = client.post("/api/import/csv/confirm", json={"token": "x" * 32})
+    assert r.status_code == 302
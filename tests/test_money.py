@@ -0,0 +1,23 @@
+import pytest
+
+from money import from_cents, to_cents
+
+
+def test_to_cents_rounds_half_up_without_float_drift():
+    assert to_cents(12.345) == 1235
+    assert to_cents("12.345") == 1235
+    assert to_cents(0.1 + 0.2) == 30
+    assert to_cents("-3.555") == -356
+    assert to_cents(10) == 1000
+
+
+@pytest.mark.parametrize("value", ["abc", "", None, True, float("nan"), "inf"])
+def test_to_cents_rejects_non_numbers(value):
+    with pytest.raises(ValueError):
+        to_cents(value)
+
+
+def test_from_cents():
+    assert from_cents(1235) == 12.35
+    assert from_cents(-5) == -0.05
+    assert from_cents(None) is None
@@ -0,0 +1,73 @@
+import db as db_module
+import nota_index
+
+
+def test_prefix_search_orders_by_count_then_recency():
+  idx = nota_index.NotaPrefixIndex()
+  idx.set("late ron", 2, 5, "Ocio", "Bar")
+  idx.set("Lavandería", 2, 7, "Casa", "Limpieza")
+  idx.set("pan", 9, 8, "Alimentación", "Panadería")
+  idx.add("late ron", "Ocio", "Copas", 9)
+
+  assert idx.search("L") == [
+    {"nota": "late ron", "n": 3, "categoria": "Ocio", "concepto": "Copas"},
+    {"nota": "Lavandería", "n": 2, "categoria": "Casa", "concepto": "Limpieza"},
+  ]
+  assert [m["nota"] for m in idx.search("LAV")] == ["Lavandería"]
+  assert idx.search("x") == []
+
+  # Quitar un uso antiguo es incremental; el último obliga a releer notas
+  assert idx.remove("late ron", 4) is True
+  assert idx.remove("late ron", 9) is False
+  assert idx.remove("late ron", 5) is True
+  assert idx.search("late") == []
+  assert ("late ron", "late ron") not in idx.keys
+
+
+def test_sugerir_nota_served_from_memory(client, login, user_id, monkeypatch):
+  conn = db_module.get_db()
+  conn.execute(
+    "INSERT INTO gastos (user_id, fecha, importe, categoria, concepto, nota) VALUES (?,?,?,?,?,?)",
+    (user_id, "2026-01-20", 1.0, "Ocio", "Bar", "late ron"),
+  )
+  conn.commit()
+
+  assert client.get("/api/sugerir_nota?pref=la").get_json()["matches"][0]["nota"] == "late ron"
+
+  # Las altas y bajas de este worker actualizan el índice sin reconstruirlo
+  r = client.post("/api/gastos", json={
+    "fecha": "2026-01-21", "importe": 2, "categoria": "Ocio", "concepto": "Copas", "nota": "late ron",
+  })
+  assert r.status_code == 200
+  gasto_id = conn.execute("SELECT MAX(id) FROM gastos").fetchone()[0]
+
+  def no_sql(*args, **kwargs):
+    raise AssertionError("sugerir_nota no debería consultar SQLite")
+
+  with monkeypatch.context() as m:
+    m.setattr(db_module, "db_all", no_sql)
+    m.setattr(db_module, "db_one", no_sql)
+    data = client.get("/api/sugerir_nota?pref=LATE").get_json()
+  assert data["matches"] == [{"nota": "late ron", "n": 2, "categoria": "Ocio", "concepto": "Copas"}]
+
+  # Borrar el último uso: vuelve la categoria/concepto del anterior (desde notas)
+  assert client.delete(f"/api/gastos/{gasto_id}").status_code == 200
+  data = client.get("/api/sugerir_nota?pref=late").get_json()
+  assert data["matches"] == [{"nota": "late ron", "n": 1, "categoria": "Ocio", "concepto": "Bar"}]
+
+
+def test_rebuilds_after_ttl_when_other_workers_wrote(app, user_id, monkeypatch):
+  conn = db_module.get_db()
+  with app.app_context():
+    assert nota_index.lookup(user_id, "caf") == []
+
+    # Escritura de otro proceso: invisible hasta que caduca el TTL
+    conn.execute(
+      "INSERT INTO gastos (user_id, fecha, importe, categoria, concepto, nota) VALUES (?,?,?,?,?,?)",
+      (user_id, "2026-01-20", 1.0, "Ocio", "Bar", "café"),
+    )
+    conn.commit()
+    assert nota_index.lookup(user_id, "caf") == []
+
+    monkeypatch.setattr(nota_index, "NOTA_INDEX_TTL_S", 0)
+    assert [m["nota"] for m in nota_index.lookup(user_id, "caf")] == ["café"]
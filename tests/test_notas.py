@@ -0,0 +1,59 @@
+import sqlite3
+
+import db as db_module
+import schema
+
+
+def _notas(conn, user_id=1):
+  return conn.execute(
+    "SELECT nota, clave, n, last_id, categoria, concepto FROM notas WHERE user_id = ? ORDER BY nota",
+    (user_id,),
+  ).fetchall()
+
+
+def test_triggers_keep_notas_in_sync():
+  conn = sqlite3.connect(":memory:")
+  schema.migrate(conn)
+  ins = "INSERT INTO gastos (user_id, fecha, categoria, concepto, nota, importe) VALUES (1, '2026-01-01', ?, ?, ?, 1)"
+  a = conn.execute(ins, ("Ocio", "Bar", " Late ron")).lastrowid
+  b = conn.execute(ins, ("Ocio", "Copas", " Late ron")).lastrowid
+  conn.execute(ins, ("Otros", "", ""))
+  assert _notas(conn) == [(" Late ron", "late ron", 2, b, "Ocio", "Copas")]
+
+  # Borrar el último uso recupera el anterior; editar la nota mueve el uso
+  conn.execute("DELETE FROM gastos WHERE id = ?", (b,))
+  assert _notas(conn) == [(" Late ron", "late ron", 1, a, "Ocio", "Bar")]
+  conn.execute("UPDATE gastos SET nota = 'pan', categoria = 'Comida' WHERE id = ?", (a,))
+  assert _notas(conn) == [("pan", "pan", 1, a, "Comida", "Bar")]
+
+
+def test_migration_backfills_existing_gastos(app, user_id):
+  conn = db_module.get_db()
+  assert schema.get_version(conn) == schema.SCHEMA_VERSION
+  for nota, cat in (("Mercadona", "Súper"), ("Mercadona", "Alimentación"), ("", "Otros")):
+    conn.execute(
+      "INSERT INTO gastos (user_id, fecha, importe, categoria, concepto, nota) VALUES (?,?,?,?,?,?)",
+      (user_id, "2026-01-20", 1.0, cat, None, nota),
+    )
+  conn.execute("DELETE FROM notas")
+  conn.execute(schema.NOTAS_BACKFILL_SQL.format(and_user=""))
+  rows = _notas(conn, user_id)
+  assert [(r[0], r[2], r[4], r[5]) for r in rows] == [("Mercadona", 2, "Alimentación", "")]
+
+
+def test_sugerir_uses_exact_note_first(client, login, user_id):
+  conn = db_module.get_db()
+  for nota, concepto in (("MERCADONA 123", "Supermercado"), ("MERCADONA 123", "Supermercado"), ("mercadona", "Bebidas")):
+    conn.execute(
+      "INSERT INTO gastos (user_id, fecha, importe, categoria, concepto, nota) VALUES (?,?,?,?,?,?)",
+      (user_id, "2026-01-20", 1.0, "Alimentación", concepto, nota),
+    )
+  conn.commit()
+
+  # Nota idéntica (sin distinguir mayúsculas): la de la tabla notas
+  data = client.get("/api/sugerir?nota=MERCADONA").get_json()
+  assert data["sugerencia"] == {"categoria": "Alimentación", "concepto": "Bebidas", "score": 1}
+
+  # Nota nueva: parecidas por trigramas
+  data = client.get("/api/sugerir?nota=mercadona 77").get_json()
+  assert data["sugerencia"]["concepto"] == "Supermercado"
@@ -0,0 +1,47 @@
+import pytest
+from flask import g
+
+import db as db_module
+
+SLOW_SQL = (
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 50000000) "
+    "SELECT COUNT(*) FROM c"
+)
+
+
+def test_deadline_interrupts_long_statement(app):
+    with app.test_request_context("/api/gastos"):
+        g.query_deadline = 0  # ya vencido
+        with pytest.raises(db_module.QueryTimeout):
+            db_module.db_all(SLOW_SQL)
+        g.pop("query_deadline")
+
+        # sin presupuesto la conexión vuelve a funcionar con normalidad
+        assert db_module.db_one("SELECT 1")[0] == 1
+
+
+@pytest.fixture()
+def exhausted_budgets(monkeypatch):
+    monkeypatch.setattr(db_module, "PROGRESS_STEPS", 1)
+    budgets = {name: 0.0001 for name in db_module.QUERY_BUDGETS_MS}
+    monkeypatch.setattr(db_module, "QUERY_BUDGETS_MS", budgets)
+
+
+def test_gastos_returns_503_when_budget_exceeded(client, login, exhausted_budgets):
+    before = db_module.deadline_stats()["gastos"]["aborts"]
+
+    r = client.get("/api/gastos?q=super")
+    assert r.status_code == 503
+    assert r.headers.get("Retry-After")
+    assert r.get_json()["ok"] is False
+
+    assert db_module.deadline_stats()["gastos"]["aborts"] == before + 1
+
+
+def test_sugerir_degrades_when_budget_exceeded(client, login, exhausted_budgets):
+    r = client.get("/api/sugerir?nota=mercadona")
+    assert r.status_code == 200
+    data = r.get_json()
+    assert data["ok"] is True
+    assert data["degraded"] is True
+    assert data["matches"] == []
@@ -0,0 +1,57 @@
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+import db as db_module
+
+
+def test_readonly_pool_rejects_writes():
+    d = tempfile.mkdtemp(prefix="gastos_ro_")
+    path = os.path.join(d, "ro.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.commit()
+    conn.close()
+
+    pool = db_module.ConnectionPool(path, max_size=1, readonly=True)
+    ro = pool.acquire()
+    try:
+        assert ro.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+        assert ro.execute("PRAGMA query_only").fetchone()[0] == 1
+        with pytest.raises(sqlite3.OperationalError):
+            ro.execute("INSERT INTO t VALUES (2)")
+    finally:
+        pool.release(ro)
+        pool.close_all()
+
+
+@pytest.fixture()
+def read_calls(app, monkeypatch):
+    calls = []
+    conn = db_module.get_db()
+
+    def _get_read_db(*args, **kwargs):
+        calls.append(1)
+        return conn
+
+    monkeypatch.setattr(db_module, "get_read_db", _get_read_db)
+    return calls
+
+
+def test_get_endpoints_use_read_connection(client, login, read_calls):
+    for url in ("/api/gastos", "/api/resumen", "/api/categorias",
+                "/api/sugerir?nota=abc", "/api/sugerir_nota?pref=a"):
+        before = len(read_calls)
+        r = client.get(url)
+        assert r.status_code == 200
+        assert len(read_calls) > before, url
+
+
+def test_post_endpoints_use_read_write_connection(client, login, read_calls):
+    payload = {"fecha": "2026-01-21", "importe": 1.5, "categoria": "Otros", "concepto": "Varios"}
+    r = client.post("/api/gastos", json=payload)
+    assert r.status_code == 200
+    assert read_calls == []
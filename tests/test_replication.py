@@ -0,0 +1,151 @@
+import io
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+import db as db_module
+import replication
+from app import create_app
+
+
+@pytest.fixture()
+def two_dirs(monkeypatch):
+    primary_dir = tempfile.mkdtemp(prefix="gastos_primary_")
+    replica_dir = tempfile.mkdtemp(prefix="gastos_replica_")
+    main = os.path.join(primary_dir, "gastos.db")
+    monkeypatch.setattr(db_module, "DB_PATH", main)
+    monkeypatch.setattr(db_module, "READ_DB_PATH", main)
+    monkeypatch.setattr(db_module, "REPLICA_DIR", replica_dir)
+    monkeypatch.setattr(db_module, "PRIMARY_URL", "http://primary.test")
+
+    primary = create_app()
+    primary.config.update(TESTING=True, SECRET_KEY="test-secret")
+    return primary, replica_dir
+
+
+def _insert(app, nota, user_id=1):
+    # Escritura directa en el fichero del primario (el proceso puede estar en modo réplica)
+    conn = sqlite3.connect(db_module.DB_PATH)
+    try:
+        conn.execute(
+            "INSERT INTO gastos (user_id, fecha, categoria, nota, importe) VALUES (?, '2026-01-05', 'Otros', ?, 2)",
+            (user_id, nota),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _replica_count(replica_dir):
+    conn = sqlite3.connect(os.path.join(replica_dir, "gastos.db"))
+    try:
+        return conn.execute("SELECT COUNT(*) FROM gastos").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_replicator_ships_only_changed_files(two_dirs):
+    primary, replica_dir = two_dirs
+    rep = replication.Replicator(replica_dir, pages=1, sleep=0)
+
+    _insert(primary, "uno")
+    assert rep.sync_once() == 1
+    assert _replica_count(replica_dir) == 1
+
+    assert rep.sync_once() == 0
+    assert rep.status["skipped"] >= 1
+
+    _insert(primary, "dos")
+    assert rep.sync_once() == 1
+    assert _replica_count(replica_dir) == 2
+    rep.stop()
+
+
+class _FakeResponse(io.BytesIO):
+    def __init__(self, body, code=200, headers=None):
+        super().__init__(body)
+        self.code = code
+        self.headers = headers or {"Content-Type": "application/json"}
+
+    def getcode(self):
+        return self.code
+
+
+def test_replica_serves_reads_and_forwards_writes(two_dirs, monkeypatch):
+    primary, replica_dir = two_dirs
+    rep = replication.Replicator(replica_dir, pages=-1, sleep=0)
+    _insert(primary, "uno")
+    rep.sync_once()
+
+    monkeypatch.setattr(db_module, "DB_ROLE", "replica")
+    replica = create_app()
+    replica.config.update(TESTING=True, SECRET_KEY="test-secret")
+    client = replica.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = 1
+
+    assert [g["nota"] for g in client.get("/api/gastos").get_json()] == ["uno"]
+
+    # nuevo snapshot: el pool de lectura recicla sus conexiones
+    _insert(primary, "dos")
+    rep.sync_once()
+    assert len(client.get("/api/gastos").get_json()) == 2
+
+    forwarded = []
+
+    class _Opener:
+        def open(self, req, timeout=None):
+            forwarded.append(req)
+            return _FakeResponse(b'{"ok": true}')
+
+    monkeypatch.setattr(replication, "_opener", _Opener())
+    r = client.post("/api/gastos", json={"fecha": "2026-01-06", "importe": 1, "categoria": "Otros"})
+    assert r.status_code == 200
+    assert r.get_json() == {"ok": True}
+
+    assert len(forwarded) == 1
+    req = forwarded[0]
+    assert req.full_url == "http://primary.test/api/gastos"
+    assert req.get_method() == "POST"
+    assert b"2026-01-06" in req.data
+    assert "session" in (req.get_header("Cookie") or "")
+    rep.stop()
+
+
+def test_copy_terminates_while_another_connection_writes(two_dirs):
+    primary, replica_dir = two_dirs
+    for i in range(200):
+        _insert(primary, f"nota {i} " + "x" * 200)
+
+    writer = sqlite3.connect(db_module.DB_PATH)
+    src = sqlite3.connect(db_module.DB_PATH)
+    writes = []
+    guard = replication._restart_guard
+
+    def _writing_guard(max_restarts):
+        progress = guard(max_restarts)
+
+        def wrapped(status, remaining, total):
+            # Un commit por paso: sin límite la copia reiniciaría siempre
+            if len(writes) < 50:
+                writer.execute("INSERT INTO gastos (user_id, fecha, nota, importe) VALUES (1, '2026-01-07', 'w', 1)")
+                writer.commit()
+                writes.append(remaining)
+            progress(status, remaining, total)
+
+        return wrapped
+
+    target = os.path.join(replica_dir, "gastos.db")
+    try:
+        replication._restart_guard = _writing_guard
+        replication.copy_database(src, target, pages=1, sleep=0, max_restarts=2)
+    finally:
+        replication._restart_guard = guard
+        src.close()
+        writer.close()
+
+    # Se abandonó la copia por pasos tras pocos reinicios y la pasada única vio todos los commits
+    assert 1 < len(writes) < 50
+    assert _replica_count(replica_dir) == 200 + len(writes)
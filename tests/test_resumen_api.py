@@ -23,3 +23,43 @@ def test_resumen_reflects_inserted_rows(client, login, user_id):
   assert r.status_code == 200
   data = r.get_json()
   assert isinstance(data, dict)
+
+
+def test_resumen_month_filter(client, login, user_id):
+  conn = db_module.get_db()
+  for fecha, importe in (("2026-01-05", 10.0), ("2026-01-20", 5.5), ("2026-02-01", 100.0)):
+    conn.execute(
+      "INSERT INTO gastos (user_id, fecha, importe, categoria, concepto, nota) VALUES (?,?,?,?,?,?)",
+      (user_id, fecha, importe, "Otros", "Varios", "x"),
+    )
+  conn.commit()
+
+  data = client.get("/api/resumen?mes=2026-01").get_json()
+  assert data["total"] == 15.5
+  assert data["por_categoria"] == [{"categoria": "Otros", "total": 15.5}]
+
+
+def test_resumen_sums_are_exact_cents(client, login, user_id):
+  for importe in ("0.1", "0.2", 19.99, 0.01):
+    r = client.post("/api/gastos", json={"fecha": "2026-03-02", "importe": importe, "categoria": "Otros"})
+    assert r.status_code == 200
+
+  data = client.get("/api/resumen?mes=2026-03").get_json()
+  assert data["total"] == 20.3
+  assert data["por_categoria"][0]["total"] == 20.3
+
+
+def test_raw_inserts_get_cents_from_trigger(app, user_id):
+  conn = db_module.get_db()
+  cur = conn.execute(
+    "INSERT INTO gastos (user_id, fecha, importe, categoria) VALUES (?, '2026-03-03', 1.15, 'Otros')",
+    (user_id,),
+  )
+  conn.commit()
+  row = conn.execute("SELECT importe_cents FROM gastos WHERE id = ?", (cur.lastrowid,)).fetchone()
+  assert row[0] == 115
+
+  conn.execute("UPDATE gastos SET importe = 2.5 WHERE id = ?", (cur.lastrowid,))
+  conn.commit()
+  row = conn.execute("SELECT importe_cents FROM gastos WHERE id = ?", (cur.lastrowid,)).fetchone()
+  assert row[0] == 250
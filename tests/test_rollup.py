@@ -0,0 +1,101 @@
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+import db as db_module
+import rollup
+import schema
+from app import create_app
+
+
+def _conn():
+    conn = sqlite3.connect(":memory:")
+    schema.migrate(conn)
+    return conn
+
+
+def _rollup(conn, user_id=1):
+    return conn.execute(
+        "SELECT mes, categoria, concepto, n, total_cents FROM gastos_rollup WHERE user_id = ? ORDER BY 1, 2, 3",
+        (user_id,),
+    ).fetchall()
+
+
+def test_triggers_keep_rollup_exact():
+    conn = _conn()
+    ins = "INSERT INTO gastos (user_id, fecha, categoria, concepto, importe) VALUES (1, ?, ?, 'x', ?)"
+    conn.execute(ins, ("2026-01-02", "A", 1.5))
+    conn.execute(ins, ("2026-01-20", "A", 2.25))
+    conn.execute(ins, ("2026-02-01", "B", 10))
+    assert _rollup(conn) == [("2026-01", "A", "x", 2, 375), ("2026-02", "B", "x", 1, 1000)]
+
+    # mover de mes y categoría, cambiar importe, borrar
+    conn.execute("UPDATE gastos SET fecha = '2026-02-03', categoria = 'B' WHERE importe = 1.5")
+    conn.execute("UPDATE gastos SET importe = 3 WHERE importe = 2.25")
+    conn.execute("DELETE FROM gastos WHERE importe = 10")
+    assert _rollup(conn) == [("2026-01", "A", "x", 1, 300), ("2026-02", "B", "x", 1, 150)]
+    assert rollup.verify(conn) == []
+
+
+def test_verify_detects_and_rebuild_fixes_drift():
+    conn = _conn()
+    conn.execute("INSERT INTO gastos (user_id, fecha, categoria, concepto, importe_cents) VALUES (1, '2026-01-02', 'A', 'x', 100)")
+    conn.execute("UPDATE gastos_rollup SET total_cents = 1")
+    conn.execute("INSERT INTO gastos_rollup VALUES (2, '2026-01', 'Z', 'z', 1, 5)")
+    conn.commit()
+
+    diffs = rollup.verify(conn)
+    assert {(d["user_id"], d["expected"], d["actual"]) for d in diffs} == {
+        (1, (1, 100), (1, 1)),
+        (2, None, (1, 5)),
+    }
+    assert len(rollup.verify(conn, user_id=2)) == 1
+
+    rollup.rebuild(conn)
+    assert rollup.verify(conn) == []
+    assert _rollup(conn) == [("2026-01", "A", "x", 1, 100)]
+
+
+def test_categorias_and_resumen_read_rollup(client, login, user_id):
+    for concepto, importe in (("Supermercado", "12.10"), ("Supermercado", "0.90"), ("Bebidas", 3)):
+        r = client.post("/api/gastos", json={
+            "fecha": "2026-01-10", "importe": importe, "categoria": "Alimentación", "concepto": concepto,
+        })
+        assert r.status_code == 200
+
+    cats = {(c["categoria"], c["subcategoria"]): c["n"] for c in client.get("/api/categorias").get_json()}
+    assert cats[("Alimentación", "Supermercado")] == 2
+    assert cats[("Alimentación", "Bebidas")] == 1
+
+    data = client.get("/api/resumen?mes=2026-01").get_json()
+    assert data == {"total": 16.0, "por_categoria": [{"categoria": "Alimentación", "total": 16.0}]}
+    assert client.get("/api/resumen?mes=2026-02").get_json() == {"total": 0, "por_categoria": []}
+
+
+@pytest.fixture()
+def file_db(monkeypatch):
+    d = tempfile.mkdtemp(prefix="gastos_rollup_")
+    path = os.path.join(d, "gastos.db")
+    monkeypatch.setattr(db_module, "DB_PATH", path)
+    monkeypatch.setattr(db_module, "READ_DB_PATH", path)
+    conn = sqlite3.connect(path)
+    schema.migrate(conn)
+    conn.execute("INSERT INTO gastos (user_id, fecha, categoria, concepto, importe_cents) VALUES (1, '2026-01-02', 'A', 'x', 100)")
+    conn.execute("DELETE FROM gastos_rollup")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_rollup_cli(file_db):
+    runner = create_app().test_cli_runner()
+
+    result = runner.invoke(args=["rollup", "verify"])
+    assert result.exit_code != 0
+    assert "1 diferencias" in result.output
+
+    result = runner.invoke(args=["rollup", "verify", "--fix"])
+    assert result.exit_code == 0, result.output
+    assert runner.invoke(args=["rollup", "verify"]).exit_code == 0
@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import tempfile
+
+import schema
+
+
+def _fresh_conn():
+    d = tempfile.mkdtemp(prefix="gastos_schema_")
+    conn = sqlite3.connect(os.path.join(d, "schema.db"))
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def test_migrate_fresh_db_reaches_latest_version():
+    conn = _fresh_conn()
+    applied = schema.migrate(conn)
+
+    assert applied == [v for v, _, _ in schema.MIGRATIONS]
+    assert schema.get_version(conn) == schema.SCHEMA_VERSION
+    assert "has_imported_csv" in schema._columns(conn, "users")
+    assert "source" in schema._columns(conn, "gastos")
+    conn.close()
+
+
+def test_current_db_costs_one_pragma_read():
+    conn = _fresh_conn()
+    schema.migrate(conn)
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    assert schema.migrate(conn) == []
+    conn.set_trace_callback(None)
+
+    assert statements == ["PRAGMA user_version"]
+    conn.close()
+
+
+def test_only_pending_migrations_run(monkeypatch):
+    conn = _fresh_conn()
+    schema.migrate(conn)
+    base = schema.SCHEMA_VERSION
+
+    def _add_table(c, shard):
+        c.execute("CREATE TABLE extra (x INTEGER)")
+
+    monkeypatch.setattr(schema, "MIGRATIONS", schema.MIGRATIONS + [(base + 1, "extra", _add_table)])
+    monkeypatch.setattr(schema, "SCHEMA_VERSION", base + 1)
+
+    assert schema.migrate(conn) == [base + 1]
+    assert schema.get_version(conn) == base + 1
+    conn.close()
+
+
+def test_failed_migration_rolls_back_everything(monkeypatch):
+    conn = _fresh_conn()
+    schema.migrate(conn)
+    base = schema.SCHEMA_VERSION
+
+    def _broken(c, shard):
+        c.execute("CREATE TABLE half_done (x INTEGER)")
+        c.execute("THIS IS NOT SQL")
+
+    monkeypatch.setattr(schema, "MIGRATIONS", schema.MIGRATIONS + [(base + 1, "broken", _broken)])
+    monkeypatch.setattr(schema, "SCHEMA_VERSION", base + 1)
+
+    try:
+        schema.migrate(conn)
+    except sqlite3.OperationalError:
+        pass
+    else:
+        raise AssertionError("la migración rota debería fallar")
+
+    assert schema.get_version(conn) == base
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "half_done" not in tables
+    conn.close()
+
+
+def test_migrate_refuses_open_transaction():
+    conn = _fresh_conn()
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.execute("INSERT INTO t VALUES (1)")
+    assert conn.in_transaction
+
+    try:
+        schema.migrate(conn)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("migrate() no debe hacer commit del trabajo del llamador")
+    assert schema.get_version(conn) == 0
+    conn.close()
+
+
+def test_users_email_index_left_pending_is_retried():
+    conn = _fresh_conn()
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, email TEXT, password_hash TEXT NOT NULL)")
+    conn.executemany("INSERT INTO users (username, email, password_hash) VALUES (?, 'dup@x.com', 'h')", [("a",), ("b",)])
+    conn.commit()
+
+    schema.migrate(conn)
+    assert schema.get_version(conn) == schema.SCHEMA_VERSION
+    indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "idx_users_email" not in indexes
+
+    conn.execute("UPDATE users SET email = 'b@x.com' WHERE username = 'b'")
+    conn.commit()
+    schema._retry_pending_indexes(conn)
+    indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "idx_users_email" in indexes
+    conn.close()
+
+
+def test_migration_lock_is_one_file_next_to_main_db(monkeypatch):
+    import db as db_module
+
+    d = tempfile.mkdtemp(prefix="gastos_lock_")
+    monkeypatch.setattr(db_module, "DB_PATH", os.path.join(d, "gastos.db"))
+    conn = _fresh_conn()
+    schema.migrate(conn)
+    conn.close()
+
+    assert os.listdir(d) == [".migrate.lock"]
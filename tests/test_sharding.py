@@ -0,0 +1,169 @@
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+import db as db_module
+from app import create_app
+
+
+@pytest.fixture()
+def shard_env(monkeypatch):
+    d = tempfile.mkdtemp(prefix="gastos_shards_")
+    main = os.path.join(d, "main.db")
+    monkeypatch.setattr(db_module, "DB_PATH", main)
+    monkeypatch.setattr(db_module, "READ_DB_PATH", main)
+    monkeypatch.setattr(db_module, "SHARD_MODE", "user")
+    monkeypatch.setattr(db_module, "SHARD_DIR", os.path.join(d, "shards"))
+    return d
+
+
+@pytest.fixture()
+def sharded_app(shard_env):
+    app = create_app()
+    app.config.update(TESTING=True, SECRET_KEY="test-secret")
+    return app
+
+
+def _count(path, user_id=None):
+    conn = sqlite3.connect(path)
+    try:
+        if user_id is None:
+            return conn.execute("SELECT COUNT(*) FROM gastos").fetchone()[0]
+        return conn.execute("SELECT COUNT(*) FROM gastos WHERE user_id = ?", (user_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _post_as(app, user_id, nota):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+    r = client.post("/api/gastos", json={
+        "fecha": "2026-01-21", "importe": 3.5, "categoria": "Otros", "concepto": "Varios", "nota": nota,
+    })
+    assert r.status_code == 200
+    return client
+
+
+def test_shard_path_modes(monkeypatch, shard_env):
+    assert db_module.shard_path(None) == db_module.DB_PATH
+    assert db_module.shard_path(7).endswith(os.path.join("shards", "user_7.db"))
+
+    monkeypatch.setattr(db_module, "SHARD_MODE", "hash")
+    monkeypatch.setattr(db_module, "SHARD_BUCKETS", 4)
+    assert db_module.shard_path(5).endswith("bucket_001.db")
+    assert db_module.shard_path(9) == db_module.shard_path(5)
+
+
+def test_writes_go_to_user_shards(sharded_app):
+    c1 = _post_as(sharded_app, 1, "cafe")
+    _post_as(sharded_app, 2, "taxi")
+
+    assert _count(db_module.shard_path(1)) == 1
+    assert _count(db_module.shard_path(2)) == 1
+    assert _count(db_module.DB_PATH) == 0
+
+    data = c1.get("/api/gastos").get_json()
+    assert [g["nota"] for g in data] == ["cafe"]
+
+
+def test_split_command_moves_rows(monkeypatch, shard_env):
+    monkeypatch.setattr(db_module, "SHARD_MODE", "none")
+    app = create_app()
+    with app.app_context():
+        for uid, nota in ((1, "a"), (1, "b"), (2, "c")):
+            db_module.db_exec(
+                "INSERT INTO gastos (user_id, fecha, categoria, nota, importe) VALUES (?, '2026-01-01', 'Otros', ?, 1)",
+                (uid, nota),
+            )
+
+    monkeypatch.setattr(db_module, "SHARD_MODE", "user")
+    result = app.test_cli_runner().invoke(args=["shards", "split", "--delete-source"])
+    assert result.exit_code == 0, result.output
+
+    assert _count(db_module.shard_path(1), 1) == 2
+    assert _count(db_module.shard_path(2), 2) == 1
+    assert _count(db_module.DB_PATH) == 0
+
+    # idempotente
+    result = app.test_cli_runner().invoke(args=["shards", "split"])
+    assert result.exit_code == 0
+    assert _count(db_module.shard_path(1), 1) == 2
+
+
+def test_shards_only_hold_gastos(sharded_app):
+    _post_as(sharded_app, 1, "cafe")
+    conn = sqlite3.connect(db_module.shard_path(1))
+    try:
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+    assert "gastos" in tables
+    assert "users" not in tables
+
+
+def test_reads_never_create_shards(sharded_app, monkeypatch):
+    import warmup as warmup_module
+    from warmup import warmup
+
+    monkeypatch.setattr(warmup_module, "ENABLED", True)
+
+    client = sharded_app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = 42
+    assert client.get("/api/gastos").get_json() == []
+    assert client.get("/api/resumen").status_code == 200
+
+    warmup(sharded_app)
+
+    assert not os.path.exists(db_module.shard_path(42))
+    assert not os.path.exists(db_module.shard_path(-1))
+
+
+def test_group_writer_migrates_new_shard(sharded_app, monkeypatch):
+    monkeypatch.setattr(db_module, "WRITE_MODE", "group")
+    monkeypatch.setattr(db_module, "_writers", {})
+
+    client = _post_as(sharded_app, 7, "primera")
+    assert _count(db_module.shard_path(7)) == 1
+    assert [g["nota"] for g in client.get("/api/gastos").get_json()] == ["primera"]
+
+
+def test_stale_shard_is_migrated_before_reads(shard_env, monkeypatch):
+    import schema
+
+    # Shard de una versión anterior: tabla gastos sin la columna source, user_version 0
+    path = os.path.join(shard_env, "shards", "user_5.db")
+    os.makedirs(os.path.dirname(path))
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE gastos (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, fecha TEXT, "
+        "categoria TEXT, concepto TEXT, importe REAL, nota TEXT)"
+    )
+    conn.execute("INSERT INTO gastos (user_id, fecha, categoria, concepto, importe, nota) "
+                 "VALUES (5, '2026-01-02', 'Otros', '', 1, 'viejo')")
+    conn.commit()
+    conn.close()
+
+    app = create_app()
+    app.config.update(TESTING=True, SECRET_KEY="test-secret")
+    conn = sqlite3.connect(path)
+    assert schema.get_version(conn) == schema.SCHEMA_VERSION
+    conn.close()
+
+    # Y si aparece tras el arranque, la primera lectura también lo migra
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA user_version = 0")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(db_module, "_migrated_paths", set())
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = 5
+    assert [g["nota"] for g in client.get("/api/gastos").get_json()] == ["viejo"]
+    conn = sqlite3.connect(path)
+    assert schema.get_version(conn) == schema.SCHEMA_VERSION
+    conn.close()
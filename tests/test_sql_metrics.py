@@ -0,0 +1,40 @@
+import sql_metrics
+
+
+def test_queries_are_recorded_with_call_site(client, login):
+    sql_metrics.reset()
+    r = client.get("/api/gastos")
+    assert r.status_code == 200
+
+    stats = [s for s in sql_metrics.snapshot() if "FROM gastos" in s["sql"]]
+    assert stats, "la consulta de /api/gastos debería registrarse"
+    st = stats[0]
+    assert st["calls"] >= 1
+    assert any(site.startswith("gastos.py:") for site in st["sites"])
+
+
+def test_slow_query_captures_plan(client, login, monkeypatch):
+    sql_metrics.reset()
+    monkeypatch.setattr(sql_metrics, "SLOW_MS", 0)
+
+    r = client.get("/api/resumen")
+    assert r.status_code == 200
+
+    slow = [s for s in sql_metrics.snapshot() if s["slow"]]
+    assert slow
+    assert all(s["plan"] for s in slow)
+    assert "plan:" in sql_metrics.format_report()
+
+
+def test_stats_endpoint_requires_token(client, monkeypatch):
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+    assert client.get("/_internal/stats").status_code == 404
+
+    monkeypatch.setenv("METRICS_TOKEN", "s3cret")
+    assert client.get("/_internal/stats?token=nope").status_code == 404
+    assert client.get("/_internal/stats?token=s3cret").status_code == 404
+
+    r = client.get("/_internal/stats", headers={"X-Metrics-Token": "s3cret"})
+    assert r.status_code == 200
+    data = r.get_json()
+    assert {"pool", "writer", "sql"} <= set(data.keys())
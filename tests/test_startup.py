@@ -0,0 +1,44 @@
+import logging
+import sys
+import tempfile
+
+import startup_profile
+from api_routes.blueprint import LazyView
+from warmup import warmup
+
+
+def test_csv_import_route_is_lazy(app):
+    view = app.view_functions["api.api_import_csv"]
+    assert isinstance(view, LazyView)
+    assert view.import_name == "api_routes.import_csv.api_import_csv"
+
+
+def test_startup_profile_times_imports_and_phases(monkeypatch):
+    d = tempfile.mkdtemp(prefix="gastos_startup_")
+    with open(f"{d}/_startup_probe_mod.py", "w") as fh:
+        fh.write("import time\ntime.sleep(0.01)\nVALUE = 42\n")
+    monkeypatch.syspath_prepend(d)
+    monkeypatch.setattr(startup_profile, "ENABLED", True)
+
+    startup_profile.install()
+    try:
+        with startup_profile.phase("probe"):
+            import _startup_probe_mod
+    finally:
+        startup_profile.uninstall()
+        sys.modules.pop("_startup_probe_mod", None)
+
+    assert _startup_probe_mod.VALUE == 42
+    res = startup_profile.results()
+    probe = [i for i in res["imports"] if i["module"] == "_startup_probe_mod"]
+    assert probe and probe[0]["self_ms"] >= 10
+    assert any(p["phase"] == "probe" and p["ms"] >= 10 for p in res["phases"])
+
+
+def test_warmup_runs_hot_endpoints(app, caplog, monkeypatch):
+    import warmup as warmup_module
+
+    monkeypatch.setattr(warmup_module, "ENABLED", True)
+    with caplog.at_level(logging.ERROR, logger="warmup"):
+        warmup(app)
+    assert not [r for r in caplog.records if r.name == "warmup"]
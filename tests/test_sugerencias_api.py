@@ -38,3 +38,73 @@ def test_sugerir_uses_user_history(client, login, user_id):
     if data.get("sugerencia") is not None:
         assert isinstance(data["sugerencia"], str)
         assert len(data["sugerencia"]) >= 1
+
+
+def test_sugerir_matches_near_notes(client, login, user_id):
+    conn = db_module.get_db()
+    for nota in ("MERCADONA 123", "Mercadona 998", "Mercado central"):
+        conn.execute(
+            "INSERT INTO gastos (user_id, fecha, importe, categoria, concepto, nota) VALUES (?,?,?,?,?,?)",
+            (user_id, "2026-01-20", 1.0, "Alimentación", "Supermercado" if "dona" in nota.lower() else "Mercado", nota),
+        )
+    conn.commit()
+
+    data = client.get("/api/sugerir?nota=Mercadona").get_json()
+    assert data["sugerencia"] == {"categoria": "Alimentación", "concepto": "Supermercado", "score": 2}
+    assert [m["concepto"] for m in data["matches"]] == ["Supermercado", "Mercado"]
+
+    # Una errata también encuentra la nota
+    data = client.get("/api/sugerir?nota=mercadna").get_json()
+    assert data["sugerencia"]["concepto"] == "Supermercado"
+
+
+def test_sugerir_batch_dedupes_and_resolves_all_sources(client, login, user_id, monkeypatch):
+    conn = db_module.get_db()
+    for nota, cat, con in (
+        ("MERCADONA 123", "Alimentación", "Supermercado"),
+        ("Bar Manolo", "Ocio", "Bares"),
+        ("Bar Pepe", "Ocio", "Bares"),
+        ("Gasolinera Repsol", "Transporte", "Gasolina"),
+    ):
+        conn.execute(
+            "INSERT INTO gastos (user_id, fecha, importe, categoria, concepto, nota) VALUES (?,?,?,?,?,?)",
+            (user_id, "2026-01-20", 1.0, cat, con, nota),
+        )
+    conn.commit()
+
+    import trigram_index
+    looked_up = []
+    real_suggest_many = trigram_index.suggest_many
+    monkeypatch.setattr(trigram_index, "suggest_many",
+                        lambda u, texts, limit=1: looked_up.append(list(texts)) or real_suggest_many(u, texts, limit))
+
+    notas = ["mercadona 123", "Bar Sur", "Bar Sur", "gasolinra", "zz", "Zapateria Luis"]
+    r = client.post("/api/sugerir/batch", json={"notas": notas})
+    assert r.status_code == 200
+    sug = r.get_json()["sugerencias"]
+
+    assert set(sug) == {"mercadona 123", "Bar Sur", "gasolinra", "zz", "Zapateria Luis"}
+    # Nota ya usada (notas), palabras conocidas (modelo), errata (trigramas)
+    assert sug["mercadona 123"] == {"categoria": "Alimentación", "concepto": "Supermercado", "score": 1}
+    assert sug["Bar Sur"] == {"categoria": "Ocio", "concepto": "Bares", "score": 2}
+    assert sug["gasolinra"]["concepto"] == "Gasolina"
+    assert sug["zz"] is None and sug["Zapateria Luis"] is None
+    # Solo lo que no resolvieron notas ni el modelo pasa por los trigramas, una vez
+    assert looked_up == [["gasolinra", "Zapateria Luis"]]
+
+
+def test_sugerir_batch_validates_body(client, login, monkeypatch):
+    assert client.post("/api/sugerir/batch", json={}).status_code == 400
+    assert client.post("/api/sugerir/batch", json={"notas": [1, 2]}).status_code == 400
+
+    from api_routes import sugerencias
+    monkeypatch.setattr(sugerencias, "SUGGEST_BATCH_MAX", 2)
+    r = client.post("/api/sugerir/batch", json={"notas": ["a", "b", "b", "c"]})
+    assert r.status_code == 400
+    r = client.post("/api/sugerir/batch", json={"notas": ["abc", "abc", "bcd"]})
+    assert r.status_code == 200
+
+
+def test_sugerir_batch_requires_login(client):
+    r = client.post("/api/sugerir/batch", json={"notas": ["x"]})
+    assert r.status_code == 302
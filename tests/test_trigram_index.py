@@ -0,0 +1,74 @@
+import time
+
+import db as db_module
+import trigram_index
+
+
+def _add(conn, user_id, nota, categoria="Alimentación", concepto="Supermercado"):
+  cur = conn.execute(
+    "INSERT INTO gastos (user_id, fecha, importe, categoria, concepto, nota) VALUES (?,?,?,?,?,?)",
+    (user_id, "2026-01-10", 1.0, categoria, concepto, nota),
+  )
+  conn.commit()
+  return cur.lastrowid
+
+
+def test_normalize_and_trigrams():
+  assert trigram_index.normalize("MERCADONA 123 Café") == "mercadona cafe"
+  assert trigram_index.trigrams("ab") == {"  a", " ab", "ab "}
+
+
+def test_search_tolerates_typos_and_ranks_by_similarity_then_count():
+  idx = trigram_index.TrigramIndex()
+  idx.add("MERCADONA 123", "Alimentación", "Supermercado", 3, 10)
+  idx.add("Mercadona Valencia", "Alimentación", "Supermercado", 1, 12)
+  idx.add("mercado central", "Alimentación", "Mercado", 5, 11)
+  idx.add("Gasolinera Repsol", "Transporte", "Gasolina", 9, 13)
+
+  matches, truncated = idx.search("mercadna")
+  assert not truncated
+  assert [(m["categoria"], m["concepto"], m["n"]) for m in matches] == [
+    ("Alimentación", "Supermercado", 4),
+    ("Alimentación", "Mercado", 5),
+  ]
+  assert matches[0]["similarity"] > matches[1]["similarity"]
+
+  assert idx.search("xyz")[0] == []
+  assert idx.search("12")[0] == []
+
+
+def test_search_stops_at_deadline():
+  idx = trigram_index.TrigramIndex()
+  idx.add("mercadona", "A", "B", 1, 1)
+  matches, truncated = idx.search("mercadona", deadline=time.perf_counter() - 1)
+  assert truncated and matches == []
+
+
+def test_index_follows_inserts_and_deletes(app, user_id):
+  conn = db_module.get_db()
+  with app.app_context():
+    _add(conn, user_id, "Mercadona")
+    assert trigram_index.suggest(user_id, "mercadona")[0][0]["n"] == 1
+
+    # Altas: incremental sobre el mismo índice
+    index = trigram_index._sync(user_id)[0]
+    _add(conn, user_id, "MERCADONA 0042")
+    new_id = _add(conn, user_id, "Farmacia", "Salud", "Farmacia")
+    assert trigram_index._sync(user_id)[0] is index
+    assert trigram_index.suggest(user_id, "mercadona")[0][0]["n"] == 2
+    assert trigram_index.suggest(user_id, "farmazia")[0][0]["categoria"] == "Salud"
+
+    # Bajas: se reconstruye
+    conn.execute("DELETE FROM gastos WHERE id = ?", (new_id,))
+    conn.commit()
+    assert trigram_index._sync(user_id)[0] is not index
+    assert trigram_index.suggest(user_id, "farmacia")[0] == []
+
+
+def test_cache_is_lru_bounded(app, user_id, monkeypatch):
+  monkeypatch.setattr(trigram_index, "SUGGEST_CACHE_USERS", 2)
+  trigram_index.clear()
+  with app.app_context():
+    for uid in (user_id, user_id + 1, user_id + 2):
+      trigram_index.suggest(uid, "algo")
+  assert list(trigram_index._cache) == [user_id + 1, user_id + 2]
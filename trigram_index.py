@@ -0,0 +1,239 @@
+"""
+Per-user trigram index over the distinct notes of gastos, for typo-tolerant
+category suggestions (/api/sugerir, CSV import).
+
+- Notes are normalized (lowercase, no accents, no pure-number tokens such as
+  "MERCADONA 123" -> "mercadona") and split into pg_trgm style trigrams.
+- A note matches when at least SUGGEST_MIN_SIMILARITY of the query's
+  trigrams appear in it, so partial words and small typos still match.
+- Built lazily from the user's rows in the notas table (each note with its
+  latest categoria/concepto and use count) and kept in an LRU of
+  SUGGEST_CACHE_USERS users. Each lookup checks a cheap freshness key
+  (last gasto id + row count from gastos_rollup): after inserts only the
+  notes used since are re-read, anything else (deletes, edits) rebuilds
+  the user's index.
+- Lookups stop at the request's query budget (g.query_deadline) or at
+  SUGGEST_MAX_MS and return what they have, flagged as truncated.
+"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from flask import g, has_app_context
+
+import db
+
+SUGGEST_MIN_SIMILARITY = float(os.environ.get("SUGGEST_MIN_SIMILARITY", "0.5"))
+SUGGEST_CACHE_USERS = int(os.environ.get("SUGGEST_CACHE_USERS", "64"))
+SUGGEST_MAX_NOTES = int(os.environ.get("SUGGEST_MAX_NOTES", "20000"))
+SUGGEST_MAX_MS = float(os.environ.get("SUGGEST_MAX_MS", "50"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+_FRESHNESS_SQL = """
+    SELECT
+      (SELECT file FROM pragma_database_list WHERE name = 'main') AS db_file,
+      (SELECT COALESCE(MAX(id), 0) FROM gastos WHERE user_id = ?) AS last_id,
+      (SELECT COALESCE(SUM(n), 0) FROM gastos_rollup WHERE user_id = ?) AS n
+"""
+
+# Notas usadas después de un id (0 = todas) según la tabla notas
+_NOTES_SQL = """
+    SELECT nota, categoria, concepto, n, last_id
+    FROM notas
+    WHERE user_id = ? AND last_id > ?
+    ORDER BY last_id DESC
+    LIMIT ?
+"""
+
+_NEW_ROWS_SQL = "SELECT COUNT(*) AS n FROM gastos WHERE user_id = ? AND id > ?"
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(t for t in _TOKEN_RE.findall(text) if not t.isdigit())
+
+
+def trigrams(text: str) -> set:
+    """
+    Trigrams of every word of `text` (already normalized), padded like
+    pg_trgm: "ab" -> {"  a", " ab", "ab "}.
+    """
+    out = set()
+    for word in text.split():
+        padded = f"  {word} "
+        out.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return out
+
+
+class TrigramIndex:
+    """
+    Trigram -> notes posting lists for one user. Not thread-safe on its
+    own; the module cache serializes access per user.
+    """
+
+    def __init__(self):
+        self.notes = []        # [{(categoria, concepto): [n, last_id]}] por texto normalizado
+        self._by_text = {}     # nota normalizada -> posición en notes
+        self._notas = {}       # nota -> (posición, categoria, concepto, n) ya sumados en notes
+        self.postings = {}     # trigram -> [posición en notes]
+        self.key = None        # (db_file, last_id, n) de la última sincronización
+
+    def add(self, nota: str, categoria: str, concepto: str, n: int, last_id: int) -> None:
+        """
+        Set the stats of `nota` (a row of the notas table; replaces earlier ones).
+        """
+        text = normalize(nota)
+        if not text:
+            return
+        pos = self._by_text.get(text)
+        if pos is None:
+            tris = trigrams(text)
+            pos = len(self.notes)
+            self.notes.append({})
+            self._by_text[text] = pos
+            for t in tris:
+                self.postings.setdefault(t, []).append(pos)
+        old = self._notas.get(nota)
+        if old is not None:
+            old_pos, old_cat, old_con, old_n = old
+            pair = self.notes[old_pos].get((old_cat, old_con))
+            if pair is not None:
+                pair[0] -= old_n
+                if pair[0] <= 0:
+                    del self.notes[old_pos][(old_cat, old_con)]
+        key = (categoria or "", concepto or "")
+        pair = self.notes[pos].setdefault(key, [0, 0])
+        pair[0] += int(n)
+        pair[1] = max(pair[1], int(last_id))
+        self._notas[nota] = (pos, key[0], key[1], int(n))
+
+    def search(self, text: str, limit: int = 5, deadline: float = None):
+        """
+        Top (categoria, concepto) pairs for `text`. Returns (matches, truncated);
+        matches are dicts with categoria, concepto, n and similarity (0..1).
+        """
+        q = trigrams(normalize(text))
+        if not q:
+            return [], False
+
+        hits = {}
+        truncated = False
+        # Las listas más cortas primero: si se corta por tiempo, lo ya
+        # contado es lo más selectivo
+        for t in sorted(q, key=lambda t: len(self.postings.get(t, ()))):
+            if deadline is not None and time.perf_counter() > deadline:
+                truncated = True
+                break
+            for pos in self.postings.get(t, ()):
+                hits[pos] = hits.get(pos, 0) + 1
+
+        pairs = {}
+        for pos, common in hits.items():
+            sim = common / len(q)
+            if sim < SUGGEST_MIN_SIMILARITY:
+                continue
+            for key, (n, last_id) in self.notes[pos].items():
+                best = pairs.setdefault(key, [0.0, 0, 0])
+                best[0] = max(best[0], sim)
+                best[1] += n
+                best[2] = max(best[2], last_id)
+
+        ranked = sorted(pairs.items(), key=lambda kv: (-round(kv[1][0], 2), -kv[1][1], -kv[1][2]))
+        matches = [
+            {"categoria": cat, "concepto": con, "n": n, "similarity": round(sim, 3)}
+            for (cat, con), (sim, n, _last) in ranked[:limit]
+        ]
+        return matches, truncated
+
+
+_cache = OrderedDict()   # user_id -> TrigramIndex
+_cache_lock = threading.Lock()
+_user_locks = {}
+
+
+def _load(index: TrigramIndex, user_id: int, after_id: int) -> None:
+    rows = db.db_all(_NOTES_SQL, (user_id, after_id, SUGGEST_MAX_NOTES), user_id=user_id)
+    # De más antigua a más reciente: las posiciones siguen el orden de uso
+    for r in reversed(rows or []):
+        index.add(r["nota"], r["categoria"], r["concepto"], r["n"], r["last_id"])
+
+
+def freshness_key(user_id: int) -> tuple:
+    """
+    (db_file, last gasto id, number of gastos) for the user: changes on any
+    insert or delete. Also used by nota_index.
+    """
+    fresh = db.db_one(_FRESHNESS_SQL, (user_id, user_id), user_id=user_id)
+    return fresh["db_file"], int(fresh["last_id"]), int(fresh["n"])
+
+
+def _sync(user_id: int):
+    """
+    (index, lock) for the user, brought up to date with one freshness query.
+    Search the index only while holding the lock.
+    """
+    key = freshness_key(user_id)
+
+    with _cache_lock:
+        index = _cache.get(user_id)
+        if index is not None:
+            _cache.move_to_end(user_id)
+        lock = _user_locks.setdefault(user_id, threading.Lock())
+
+    with lock:
+        if index is not None and index.key == key:
+            return index, lock
+
+        if index is not None and index.key[0] == key[0] and key[1] > index.key[1]:
+            # Solo altas desde la última vez (el total cuadra): añadir las filas nuevas
+            added = db.db_one(_NEW_ROWS_SQL, (user_id, index.key[1]), user_id=user_id)
+            if index.key[2] + int(added["n"]) == key[2]:
+                _load(index, user_id, index.key[1])
+                index.key = key
+                return index, lock
+
+        index = TrigramIndex()
+        _load(index, user_id, 0)
+        index.key = key
+
+    with _cache_lock:
+        _cache[user_id] = index
+        _cache.move_to_end(user_id)
+        while len(_cache) > SUGGEST_CACHE_USERS:
+            evicted, _ = _cache.popitem(last=False)
+            _user_locks.pop(evicted, None)
+    return index, lock
+
+
+def suggest(user_id: int, text: str, limit: int = 5):
+    """
+    (matches, truncated) for `text` from the user's history; see TrigramIndex.search.
+    """
+    deadline = time.perf_counter() + SUGGEST_MAX_MS / 1000.0
+    if has_app_context() and g.get("query_deadline"):
+        deadline = min(deadline, g.query_deadline)
+    index, lock = _sync(user_id)
+    with lock:
+        return index.search(text, limit=limit, deadline=deadline)
+
+
+def suggest_many(user_id: int, texts, limit: int = 1) -> dict:
+    """
+    {text: matches} for many texts with one freshness check (CSV import,
+    batch suggestions). No time cap: callers are not on the keystroke path.
+    """
+    index, lock = _sync(user_id)
+    with lock:
+        return {t: index.search(t, limit=limit)[0] for t in texts}
+
+
+def clear() -> None:
+    with _cache_lock:
+        _cache.clear()
+        _user_locks.clear()
@@ -1,2 +1,21 @@
-from app import app
+import startup_profile
 
+# Antes de importar la app, para medir también los imports
+startup_profile.install()
+
+with startup_profile.phase("import app"):
+    from app import app  # noqa: E402
+
+from warmup import warmup  # noqa: E402
+
+with startup_profile.phase("warmup"):
+    warmup(app)
+
+startup_profile.report()
+
+# Primario con REPLICA_DIR: un worker por máquina envía snapshots a la réplica
+from replication import start_background_replicator  # noqa: E402
+from backups import start_background_backups  # noqa: E402
+
+start_background_replicator()
+start_background_backups()